@@ -2,14 +2,25 @@ import pyaudio
 import numpy as np
 import threading
 import time
+from analysis_worker import AnalysisSnapshot, AnalysisWorkerThread
+from ring_buffer import RingBuffer
+from shared_ring import SharedRingBuffer
+from resampler import StreamingResampler
+from versioned import VersionedValue
+from silence_gate import SILENCE
 
 '''
 This class is a template class for a thread that reads in audio from PyAudio.
 '''
 
+# how many times take_analysis_snapshot retries a copy the writer overwrote before giving up on this run
+SNAPSHOT_RETRIES = 100
+
 
 class AudioThreadWithBufferPorted(threading.Thread):
-    def __init__(self, name, rate, starting_chunk_size, process_func, args_before=(), args_after=()):
+    def __init__(self, name, rate, starting_chunk_size, process_func, args_before=(), args_after=(),
+                 analysis_hop=None, channels=1, replay=None, shared_name=None, resample_rate=None,
+                 silence_gate=None):
         """
         Initializes an AudioThread.
         Parameters:
@@ -18,6 +29,17 @@ class AudioThreadWithBufferPorted(threading.Thread):
             process_func: the function to be called as a callback when new audio is received from PyAudio
             args_before: a tuple of arguments for process_func to be put before the sound array
             args_after: a tuple of arguments for process_func to be put after the sound array
+            analysis_hop: if None, process_func is called inside the PyAudio callback for every chunk.
+                Otherwise, the callback only stores the audio and process_func is run by an AnalysisWorkerThread
+                at most once every analysis_hop seconds.
+            channels: the number of input channels, which are downmixed to mono
+            replay: an optional ReplaySource to read audio from instead of opening a PyAudio input stream
+            shared_name: if set, the audio buffer is created in shared memory under this name so other processes
+                can attach to it with SharedRingBuffer.attach
+            resample_rate: if set, every chunk is also resampled to this rate (as float32 in [-1, 1]) into a
+                second buffer, read with get_resampled_snapshot or take_analysis_snapshot
+            silence_gate: an optional SilenceGate; while it reports silence, process_func is not run and SILENCE is
+                published once instead
         Returns: nothing
         """
         super(AudioThreadWithBufferPorted, self).__init__()
@@ -29,7 +51,7 @@ class AudioThreadWithBufferPorted(threading.Thread):
         self.p = None  # PyAudio vals
         self.stream = None
         self.FORMAT = pyaudio.paInt16
-        self.CHANNELS = 1
+        self.CHANNELS = channels
         self.RATE = rate
         self.starting_chunk_size = starting_chunk_size
         self.CHUNK = self.starting_chunk_size * self.CHANNELS
@@ -37,16 +59,49 @@ class AudioThreadWithBufferPorted(threading.Thread):
         self.on_threshold = 0.001
         self.input_on = False
         self.last_time_on = 0.0
+        self.samples_since_on = float("inf")    # samples received since the last chunk above on_threshold
+        self.silence_gate = silence_gate
+
+        # Scratch buffers reused by every callback so the callback does not allocate
+        self._mono = np.zeros(self.CHUNK, dtype=np.float32)    # downmixed audio in int16 units
+        self._normalized = np.zeros(self.CHUNK, dtype=np.float32)  # downmixed audio in [-1, 1]
+        self._mono_int = np.zeros(self.CHUNK, dtype=self.dtype)
 
         self.stop_request = False
-        self.data = None
+        self.stop_timeout = 5.0     # seconds stop() waits for a running analysis before closing the buffer
+        self.results = VersionedValue()     # versioned results of process_func
+        self.last_chunk_time = 0.0  # time the most recent chunk was appended to the buffer
+        # the write cursors of the buffer and the resampled buffer, and the capture time, after the last whole chunk
+        self.chunk_cut = (0, 0, 0.0)
+        self.analysis_snapshot = None   # the AnalysisSnapshot the running process_func call reads
+        self.replay = replay
 
         self.pred_length = 4    # number of seconds of audio the buffer should store
         self.desired_buffer_size = self.pred_length * self.RATE * self.CHANNELS     # desired buffer size in samples
         # round to nearest multiple of self.CHUNK
         self.buffer_size = self.desired_buffer_size + self.CHUNK - (self.desired_buffer_size % self.CHUNK)
-        self.audio_buffer = np.zeros(self.buffer_size, dtype=self.dtype)  # set a zero array
-        self.buffer_index = 0   # current last sample stored in buffer
+        # one extra chunk of headroom so a full buffer_size snapshot can be taken while a chunk is being written
+        if shared_name is None:
+            self.audio_buffer = RingBuffer(self.buffer_size + self.CHUNK, dtype=self.dtype)
+        else:
+            self.audio_buffer = SharedRingBuffer(self.buffer_size + self.CHUNK, dtype=self.dtype, rate=self.RATE,
+                                                 name=shared_name)
+
+        self.resample_rate = resample_rate
+        self.resampler = None
+        self.resampled_buffer = None
+        if self.resample_rate is not None:
+            self.resampler = StreamingResampler(self.RATE, self.resample_rate)
+            resampled_size = self.pred_length * self.resample_rate
+            # headroom of one resampled chunk, like the capture-rate buffer
+            resampled_chunk = -(-self.CHUNK * self.resample_rate // self.RATE) + 1
+            self.resampled_buffer = RingBuffer(resampled_size + resampled_chunk, dtype=np.float32)
+
+        self.analysis_hop = analysis_hop
+        self.analysis_worker = None
+        if self.analysis_hop is not None:
+            self.analysis_worker = AnalysisWorkerThread(name=f"{name}_analysis", audio_thread=self,
+                                                        hop=self.analysis_hop)
 
     def set_args_before(self, a):
         """
@@ -67,10 +122,17 @@ class AudioThreadWithBufferPorted(threading.Thread):
     def run(self):
         """
         When the thread is started, this function is called which opens the PyAudio object
-        and keeps the thread alive.
+        and keeps the thread alive. If a ReplaySource is set, it is fed into the buffer instead and
+        the thread ends when the source is exhausted.
         Parameters: nothing
         Returns: nothing
         """
+        if self.analysis_worker is not None:
+            self.analysis_worker.start()
+        if self.replay is not None:
+            self.replay.feed(self)
+            self.stop()
+            return
         self.p = pyaudio.PyAudio()
         self.stream = self.p.open(format=self.FORMAT,
                                   channels=self.CHANNELS,
@@ -89,9 +151,19 @@ class AudioThreadWithBufferPorted(threading.Thread):
         Parameters: nothing
         Returns: nothing
         """
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
+        if self.analysis_worker is not None:
+            self.analysis_worker.stop_request = True
+            # an analysis run may still be reading the buffer, so let it finish before the buffer is closed
+            if self.analysis_worker.is_alive() and self.analysis_worker is not threading.current_thread():
+                self.analysis_worker.join(timeout=self.stop_timeout)
+                if self.analysis_worker.is_alive():
+                    print(f"{self.analysis_worker.name} did not finish within {self.stop_timeout} s")
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.p.terminate()
+        if isinstance(self.audio_buffer, SharedRingBuffer):
+            self.audio_buffer.close()
 
     def audio_on(self, audio):
         """
@@ -99,61 +171,161 @@ class AudioThreadWithBufferPorted(threading.Thread):
         Parameters: audio: the audio input
         Returns: nothing
         """
-        val_sum = 0.0
-        for val in audio:
-            val_sum += val * val
-        val_sum /= len(audio)
-        if val_sum > self.on_threshold:
+        self.update_input_on(np.dot(audio, audio) / len(audio), len(audio))
+
+    def update_input_on(self, mean_square, n_samples=0):
+        """
+        Sets the instance variable saying whether the input is playing or not from the mean square of the audio.
+        Parameters:
+            mean_square: the mean square of the normalized audio input
+            n_samples: the number of samples the mean square was computed over
+        Returns: nothing
+        """
+        if mean_square > self.on_threshold:
             self.last_time_on = time.time()
             self.input_on = True
+            self.samples_since_on = 0
         else:
+            self.samples_since_on += n_samples
             if time.time() - self.last_time_on > 5.0:
                 self.input_on = False
 
+    def gate_analysis(self):
+        """
+        Asks the silence gate whether the next analysis run should be skipped, and publishes SILENCE once
+        when the input goes silent.
+        Parameters: nothing
+        Returns: True if process_func should not be run
+        """
+        if self.silence_gate is None:
+            return False
+        was_silent = self.silence_gate.silent
+        if self.silence_gate.should_analyse(self.samples_since_on / self.RATE):
+            return False
+        if not was_silent:
+            self.results.publish(SILENCE, timestamp=self.last_chunk_time)
+        return True
+
+    @property
+    def data(self):
+        """
+        Returns: the most recent result of process_func (None until the first result is published)
+        """
+        return self.results.value
+
+    @property
+    def buffer_index(self):
+        """
+        Returns: the number of samples currently stored in the buffer (at most buffer_size)
+        """
+        return min(self.audio_buffer.write_cursor, self.buffer_size)
+
     def get_last_samples(self, n):
         """
         Returns the last n samples from the buffer.
+        The result may be a view into the buffer, so it can change while it is being read.
         Parameters: n: number of samples
         Returns: the last n samples from the buffer (as a numpy array)
         """
-        return self.audio_buffer[max(self.buffer_index - n, 0):self.buffer_index]
+        return self.audio_buffer.get_last(min(n, self.buffer_size))
+
+    def get_snapshot(self, n):
+        """
+        Returns a consistent copy of the last n samples from the buffer, which never contains a half-written chunk.
+        Parameters: n: number of samples
+        Returns:
+            samples: the last n samples from the buffer (as a numpy array)
+            cursor: the total number of samples received when the snapshot was taken
+        """
+        return self.audio_buffer.snapshot(min(n, self.buffer_size))
+
+    def get_resampled_snapshot(self, n):
+        """
+        Returns a consistent copy of the last n samples of the resampled buffer (requires resample_rate).
+        Parameters: n: number of samples at resample_rate
+        Returns:
+            samples: the last n resampled samples (as a float32 numpy array in [-1, 1])
+            cursor: the total number of resampled samples produced when the snapshot was taken
+        """
+        return self.resampled_buffer.snapshot(min(n, self.pred_length * self.resample_rate))
+
+    def take_analysis_snapshot(self):
+        """
+        Copies the last pred_length seconds of the buffer, and of the resampled buffer, both ending after the same
+        chunk, and keeps them in analysis_snapshot, so every view process_func takes of the audio describes the
+        same audio. The copy is retried on a newer chunk if the writer overwrote any of the copied samples, up to
+        SNAPSHOT_RETRIES times, yielding to the writer in between.
+        Parameters: nothing
+        Returns: the AnalysisSnapshot
+        Raises: RuntimeError if the writer overwrote every copy
+        """
+        for attempt in range(SNAPSHOT_RETRIES + 1):
+            if attempt:
+                time.sleep(0)   # let the writer finish its chunk instead of spinning against it
+            cursor, resampled_cursor, capture_time = self.chunk_cut
+            samples = self.audio_buffer.snapshot_at(min(self.pred_length * self.RATE, self.buffer_size), cursor)
+            if samples is None:
+                continue
+            resampled = None
+            if self.resampled_buffer is not None:
+                resampled = self.resampled_buffer.snapshot_at(self.pred_length * self.resample_rate,
+                                                              resampled_cursor)
+                if resampled is None:
+                    continue
+            self.analysis_snapshot = AnalysisSnapshot(samples, cursor, resampled, resampled_cursor, capture_time)
+            return self.analysis_snapshot
+        raise RuntimeError(f"{self.name}: the audio was overwritten during {SNAPSHOT_RETRIES + 1} snapshot copies")
 
     def callback(self, in_data, frame_count, time_info, flag):
         """
         This function is called whenever PyAudio recieves new audio. It calls process_func to process the sound data
-        and stores the result in the field "data".
+        and publishes the result in the field "results".
         This function should never be called directly.
         Parameters: none user-exposed
         Returns: nothing of importance to the user
         """
+        self.ingest(in_data)
+        return None, pyaudio.paContinue
+
+    def ingest(self, in_data):
+        """
+        Downmixes a chunk of raw interleaved int16 audio, appends it to the buffer and runs or schedules process_func.
+        Called by the PyAudio callback and by a ReplaySource.
+        Parameters: in_data: the raw audio bytes
+        Returns: nothing
+        """
         # Downsample audio to mono
         numpy_array = np.frombuffer(in_data, dtype=self.dtype)
-        data = np.zeros(self.starting_chunk_size, dtype=np.float64)
-        for i in range(0, self.CHANNELS):
-            data += numpy_array[i:self.CHUNK:self.CHANNELS]
-        data /= np.float64(self.CHANNELS)
-        self.audio_on(data/np.float64(2**15))
-        data = self.dtype(data)
-        # self.data = self.process_func(*self.args_before, data, *self.args_after)
+        n = min(len(numpy_array) // self.CHANNELS, self.CHUNK)
+        mono = self._mono[:n]
+        if self.CHANNELS == 1:
+            np.copyto(mono, numpy_array[:n])
+        else:
+            np.sum(numpy_array[:n * self.CHANNELS].reshape(n, self.CHANNELS), axis=1, dtype=np.float32, out=mono)
+            mono *= np.float32(1.0 / self.CHANNELS)
+
+        # Normalize to [-1, 1] and update the input gate
+        normalized = self._normalized[:n]
+        np.multiply(mono, np.float32(1.0 / 2**15), out=normalized)
+        self.update_input_on(np.dot(normalized, normalized) / n, n)
+
+        # Convert back to int16 (truncating, like a cast)
+        data = self._mono_int[:n]
+        np.copyto(data, mono, casting='unsafe')
 
         # Add audio to buffer
-        if not self.buffer_index + len(data) <= self.buffer_size:
-            # Overflow: Reset or handle as per your requirement
-            # self.buffer_index = 0
-            self.audio_buffer[:self.buffer_size - len(data)] = self.audio_buffer[len(data):self.buffer_size]
-            self.buffer_index -= len(data)
-        self.audio_buffer[self.buffer_index:self.buffer_index + len(data)] = data
-        self.buffer_index += len(data)
-
-        # Run process_func
-        self.data = self.process_func(*self.args_before, self.get_last_samples(self.pred_length * self.RATE),
-                                      *self.args_after)
-
-        # This is where process_func in threaded_parent_with_buffer.py is called from
-        # if self.wav_index + self.CHUNK <= len(self.wav_data):
-        # self.data = self.process_func(self, data, self.wav_data[self.wav_index:self.wav_index + self.CHUNK])
-        #    self.wav_index += self.CHUNK
-        # else:
-        #    self.wav_index = 0
-        # self.data = self.process_func(self, data, self.wav_data[self.wav_index:self.wav_index + self.CHUNK])
-        return None, pyaudio.paContinue
\ No newline at end of file
+        self.audio_buffer.write(data)
+        if self.resampler is not None:
+            self.resampled_buffer.write(self.resampler.process(normalized))
+        self.last_chunk_time = time.time()
+        self.chunk_cut = (self.audio_buffer.write_cursor,
+                          0 if self.resampled_buffer is None else self.resampled_buffer.write_cursor,
+                          self.last_chunk_time)
+
+        # Run process_func, or hand the buffer over to the analysis worker
+        if self.analysis_worker is not None:
+            self.analysis_worker.notify()
+        elif not self.gate_analysis():
+            snapshot = self.take_analysis_snapshot()
+            self.results.publish(self.process_func(*self.args_before, snapshot.samples, *self.args_after),
+                                 timestamp=snapshot.capture_time)
@@ -0,0 +1,128 @@
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+'''
+This class is a thread class that runs the expensive analysis (Basic Pitch, openSMILE) of an audio thread
+outside of the PyAudio callback.
+'''
+
+# Copies of an audio thread's buffers that end after the same chunk, which one analysis run reads: the capture-rate
+# samples and the write cursor they end at, the resampled samples (None without resample_rate) and their write
+# cursor, and the capture time of the chunk
+AnalysisSnapshot = namedtuple("AnalysisSnapshot", ["samples", "cursor", "resampled", "resampled_cursor",
+                                                   "capture_time"])
+
+
+class AnalysisWorkerThread(threading.Thread):
+    def __init__(self, name, audio_thread, hop=0.25):
+        """
+        Initializes an AnalysisWorkerThread.
+        Parameters:
+            name: the name of the thread
+            audio_thread: the AudioThreadWithBufferPorted whose buffer is analysed and whose "results" are published to
+            hop: the minimum number of seconds between two analysis runs
+        Returns: nothing
+        """
+        super(AnalysisWorkerThread, self).__init__()
+        self.name = name
+        self.daemon = True
+        self.audio_thread = audio_thread
+        self.hop = hop
+        self.new_audio = threading.Event()
+        self.processed = threading.Condition()
+        self.processed_cursor = 0   # write cursor of the audio the last run (published, gated or failed) ended at
+        self.stop_request = False
+
+        self.runs = 0   # number of completed analysis runs
+        self.last_duration = 0.0    # seconds spent in the last analysis run
+        self.last_run_time = 0.0
+        self.last_gated = False     # whether the last run was skipped by the audio thread's silence gate
+        self.failures = 0   # number of analysis runs process_func raised in
+        self.last_error = None  # the exception of the last failed run
+
+    def notify(self):
+        """
+        Signals the worker that new audio has been appended to the buffer.
+        This is the only thing the audio callback does on behalf of the analysis, so it must stay cheap.
+        Parameters: nothing
+        Returns: nothing
+        """
+        self.new_audio.set()
+
+    def analyse(self):
+        """
+        Runs process_func of the audio thread once on a snapshot of the most recent audio (see
+        take_analysis_snapshot) and publishes the result, stamped with the capture time of the newest chunk in
+        the snapshot, in the "results" field of the audio thread.
+        While the audio thread's silence gate reports silence, process_func is skipped. If process_func raises, the
+        error is logged and nothing is published for this snapshot; the worker goes on with the next one, so the
+        stages waiting on it are not stalled by a single bad run. If no snapshot can be taken, the run is retried
+        on the next hop.
+        Parameters: nothing
+        Returns: nothing
+        """
+        audio = self.audio_thread
+        try:
+            snapshot = audio.take_analysis_snapshot()
+        except RuntimeError as e:
+            self.failed(e, "no snapshot of the audio could be taken")
+            self.new_audio.set()
+            return
+        self.last_gated = audio.gate_analysis()
+        if not self.last_gated:
+            start = time.time()
+            try:
+                result = audio.process_func(*audio.args_before, snapshot.samples, *audio.args_after)
+            except Exception as e:
+                self.failed(e, f"the analysis of the audio up to {snapshot.cursor} failed")
+            else:
+                self.last_duration = time.time() - start
+                self.runs += 1
+                audio.results.publish(result, timestamp=snapshot.capture_time)
+        with self.processed:
+            self.processed_cursor = snapshot.cursor
+            self.processed.notify_all()
+
+    def failed(self, error, message):
+        """
+        Logs a failed analysis run and counts it.
+        Parameters:
+            error: the exception the run raised
+            message: what failed
+        Returns: nothing
+        """
+        self.failures += 1
+        self.last_error = error
+        print(f"{self.name}: {message}")
+        traceback.print_exc()
+
+    def wait_processed(self, cursor):
+        """
+        Blocks until the audio up to at least the given write cursor has been analysed (its result published, or
+        the run skipped by the silence gate or failed), or until the worker is stopped.
+        Parameters: cursor: the write cursor to wait for
+        Returns: nothing
+        """
+        with self.processed:
+            while self.processed_cursor < cursor and not self.stop_request and self.is_alive():
+                self.processed.wait(timeout=1.0)
+
+    def run(self):
+        """
+        When the thread is started, this function is called which waits for new audio and runs the analysis
+        at most once every hop seconds.
+        Parameters: nothing
+        Returns: nothing
+        """
+        while not self.stop_request:
+            if not self.new_audio.wait(timeout=1.0) or self.stop_request:
+                continue
+            wait = self.hop - (time.time() - self.last_run_time)
+            # a skipped run cost nothing, so the first chunk after silence is analysed without waiting
+            if wait > 0 and not self.last_gated:
+                time.sleep(wait)
+            self.new_audio.clear()
+            self.last_run_time = time.time()
+            self.analyse()
@@ -25,3 +25,6 @@ __description__ = "Basic Pitch, a lightweight yet powerful audio-to-MIDI convert
 __url__ = "https://github.com/spotify/basic-pitch"
 
 ICASSP_2022_MODEL_PATH = pathlib.Path(__file__).parent / "saved_models/icassp_2022/nmp"
+# converted copies of the same model, written by `python -m basic_pitch_modified.backends --convert ...`
+ICASSP_2022_TFLITE_PATH = pathlib.Path(__file__).parent / "saved_models/icassp_2022/nmp.tflite"
+ICASSP_2022_ONNX_PATH = pathlib.Path(__file__).parent / "saved_models/icassp_2022/nmp.onnx"
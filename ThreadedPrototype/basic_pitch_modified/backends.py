@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Alternative CPU inference backends (TFLite, ONNX Runtime) for the Basic Pitch model.
+
+import argparse
+import pathlib
+import time
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from basic_pitch_modified import ICASSP_2022_MODEL_PATH, ICASSP_2022_ONNX_PATH, ICASSP_2022_TFLITE_PATH
+from basic_pitch_modified.constants import AUDIO_N_SAMPLES
+
+OUTPUT_KEYS = ("note", "onset", "contour")
+QUANTIZATIONS = (None, "float16", "int8")
+
+
+class TFLiteModel:
+    """Run a converted Basic Pitch model with the TFLite interpreter.
+
+    Uses tflite_runtime when it is installed (no full TensorFlow import), otherwise tf.lite.
+
+    Args:
+        model_path: Path to the .tflite file.
+        num_threads: Number of CPU threads the interpreter may use.
+    """
+
+    def __init__(self, model_path: Union[pathlib.Path, str], num_threads: Optional[int] = None) -> None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self.runner = self.interpreter.get_signature_runner()
+        (self.input_name,) = self.runner.get_input_details().keys()
+
+    def __call__(self, audio_windowed: Any) -> Dict[str, np.ndarray]:
+        output = self.runner(**{self.input_name: np.asarray(audio_windowed, dtype=np.float32)})
+        return {key: output[key] for key in OUTPUT_KEYS}
+
+
+class ONNXModel:
+    """Run a converted Basic Pitch model with ONNX Runtime on the CPU.
+
+    Args:
+        model_path: Path to the .onnx file.
+        num_threads: Number of intra-op threads ONNX Runtime may use.
+    """
+
+    def __init__(self, model_path: Union[pathlib.Path, str], num_threads: Optional[int] = None) -> None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # tf2onnx keeps the saved model's structured output names, possibly with a ":0" suffix
+        self.output_names = {}
+        for output in self.session.get_outputs():
+            key = output.name.split(":")[0]
+            if key not in OUTPUT_KEYS:
+                raise ValueError(f"🚨 Unexpected output {output.name} in {model_path}, expected {OUTPUT_KEYS}.")
+            self.output_names[key] = output.name
+
+    def __call__(self, audio_windowed: Any) -> Dict[str, np.ndarray]:
+        names = [self.output_names[key] for key in OUTPUT_KEYS]
+        outputs = self.session.run(names, {self.input_name: np.asarray(audio_windowed, dtype=np.float32)})
+        return dict(zip(OUTPUT_KEYS, outputs))
+
+
+def load_model(model_path: Union[pathlib.Path, str] = ICASSP_2022_MODEL_PATH, num_threads: Optional[int] = None) -> Any:
+    """Load the Basic Pitch model with the backend matching the path.
+
+    Args:
+        model_path: A .tflite file, an .onnx file, or a TensorFlow SavedModel directory.
+        num_threads: Number of CPU threads for the TFLite and ONNX backends.
+
+    Returns:
+        A callable mapping a batch of windows (n_windows, AUDIO_N_SAMPLES, 1) to a dictionary
+        with the notes, onsets and contours.
+    """
+    model_path = pathlib.Path(model_path)
+    if model_path.suffix == ".tflite":
+        return TFLiteModel(model_path, num_threads)
+    if model_path.suffix == ".onnx":
+        return ONNXModel(model_path, num_threads)
+    from tensorflow import saved_model  # only the SavedModel backend needs full TensorFlow
+
+    return saved_model.load(str(model_path))
+
+
+def convert_to_tflite(
+    output_path: Union[pathlib.Path, str] = ICASSP_2022_TFLITE_PATH,
+    saved_model_path: Union[pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
+    quantization: Optional[str] = None,
+) -> pathlib.Path:
+    """Convert the SavedModel to TFLite.
+
+    Args:
+        output_path: Where to write the .tflite file.
+        saved_model_path: The SavedModel to convert.
+        quantization: None, "float16" (float16 weights) or "int8" (dynamic range int8 weights).
+
+    Returns:
+        The output path.
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"🚨 quantization must be one of {QUANTIZATIONS}, got {quantization}.")
+    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_path))
+    if quantization is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    output_path = pathlib.Path(output_path)
+    output_path.write_bytes(converter.convert())
+    return output_path
+
+
+def convert_to_onnx(
+    output_path: Union[pathlib.Path, str] = ICASSP_2022_ONNX_PATH,
+    saved_model_path: Union[pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
+    quantization: Optional[str] = None,
+    opset: int = 13,
+) -> pathlib.Path:
+    """Convert the SavedModel to ONNX with tf2onnx.
+
+    Args:
+        output_path: Where to write the .onnx file.
+        saved_model_path: The SavedModel to convert.
+        quantization: None, "float16" (float16 weights, needs onnxconverter-common)
+            or "int8" (dynamic int8 quantization with onnxruntime).
+        opset: The ONNX opset to target.
+
+    Returns:
+        The output path.
+    """
+    import subprocess
+    import sys
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"🚨 quantization must be one of {QUANTIZATIONS}, got {quantization}.")
+    output_path = pathlib.Path(output_path)
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "tf2onnx.convert",
+            "--saved-model",
+            str(saved_model_path),
+            "--output",
+            str(output_path),
+            "--opset",
+            str(opset),
+        ],
+        check=True,
+    )
+    if quantization == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(output_path), str(output_path), weight_type=QuantType.QInt8)
+    elif quantization == "float16":
+        import onnx
+        from onnxconverter_common import float16
+
+        model = float16.convert_float_to_float16(onnx.load(str(output_path)), keep_io_types=True)
+        onnx.save(model, str(output_path))
+    return output_path
+
+
+def benchmark(model: Any, n_windows: int = 3, n_runs: int = 20) -> float:
+    """Mean latency of one model call on n_windows windows of noise, in milliseconds (after one warm-up call)."""
+    audio_windowed = np.random.uniform(-1, 1, size=(n_windows, AUDIO_N_SAMPLES, 1)).astype(np.float32)
+    model(audio_windowed)
+    start = time.time()
+    for _ in range(n_runs):
+        model(audio_windowed)
+    return (time.time() - start) / n_runs * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert the Basic Pitch model and compare backend latency.")
+    parser.add_argument("--convert", choices=["tflite", "onnx"], help="Convert the SavedModel to this format.")
+    parser.add_argument("--quantization", choices=["float16", "int8"], default=None)
+    parser.add_argument("--output", default=None, help="Output path of the converted model.")
+    parser.add_argument(
+        "--benchmark", nargs="*", default=None, help="Model paths to time (defaults to every available backend)."
+    )
+    parser.add_argument("--windows", type=int, default=3, help="Windows per call when benchmarking.")
+    args = parser.parse_args()
+
+    if args.convert == "tflite":
+        print(f"Wrote {convert_to_tflite(args.output or ICASSP_2022_TFLITE_PATH, quantization=args.quantization)}")
+    elif args.convert == "onnx":
+        print(f"Wrote {convert_to_onnx(args.output or ICASSP_2022_ONNX_PATH, quantization=args.quantization)}")
+
+    if args.benchmark is not None:
+        paths = args.benchmark or [
+            p for p in (ICASSP_2022_MODEL_PATH, ICASSP_2022_TFLITE_PATH, ICASSP_2022_ONNX_PATH) if p.exists()
+        ]
+        for path in paths:
+            start = time.time()
+            model = load_model(path)
+            load_time = time.time() - start
+            latency = benchmark(model, args.windows)
+            print(f"{path}: load {load_time:.2f} s, {latency:.1f} ms per call ({args.windows} windows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Fixed-shape compiled calls of the Basic Pitch model for live use.
+
+import time
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import tensorflow as tf
+
+from basic_pitch_modified.constants import AUDIO_N_SAMPLES
+
+
+class BucketedModel:
+    """Call the Basic Pitch model only with a small, fixed set of batch sizes.
+
+    The number of windows per call changes while the live buffer fills up, and every new input
+    shape makes TensorFlow trace another concrete function, which stalls for seconds. Here each
+    bucket has its own tf.function with a fixed input_signature; a batch is zero-padded up to the
+    smallest bucket that fits it (or split into batches of the largest bucket) and the padding is
+    dropped from the outputs. warm_up() traces every bucket ahead of time, so no call made after
+    it should trace again.
+
+    Args:
+        model: A loaded Basic Pitch saved model.
+        buckets: The batch sizes to compile.
+    """
+
+    def __init__(self, model: Any, buckets: Sequence[int] = (1, 2, 4)) -> None:
+        self.model = model
+        self.buckets = sorted(buckets)
+        self.trace_counts: Dict[int, int] = {b: 0 for b in self.buckets}
+        self.warm_up_times: Dict[int, float] = {}
+        self.functions = {b: self._compile(b) for b in self.buckets}
+
+    def _compile(self, batch_size: int) -> Any:
+        def call(audio_windowed: tf.Tensor) -> Dict[str, tf.Tensor]:
+            # this Python body only runs while TensorFlow traces the function
+            self.trace_counts[batch_size] += 1
+            return self.model(audio_windowed)
+
+        signature = [tf.TensorSpec(shape=(batch_size, AUDIO_N_SAMPLES, 1), dtype=tf.float32)]
+        return tf.function(call, input_signature=signature)
+
+    def warm_up(self) -> Dict[int, float]:
+        """Trace and run every bucket once on silence.
+
+        Returns:
+            The time each bucket took, in seconds.
+        """
+        for batch_size in self.buckets:
+            start = time.time()
+            self.functions[batch_size](tf.zeros((batch_size, AUDIO_N_SAMPLES, 1), dtype=tf.float32))
+            self.warm_up_times[batch_size] = time.time() - start
+        return self.warm_up_times
+
+    def __call__(self, audio_windowed: Any) -> Dict[str, np.ndarray]:
+        """Run the model on a batch of windows of shape (n_windows, AUDIO_N_SAMPLES, 1).
+
+        Returns:
+            A dictionary of model outputs with n_windows entries along the first axis.
+        """
+        audio_windowed = np.asarray(audio_windowed, dtype=np.float32)
+        n_windows = audio_windowed.shape[0]
+        largest = self.buckets[-1]
+        outputs: Dict[str, list] = {}
+        for start in range(0, n_windows, largest):
+            batch = audio_windowed[start : start + largest]
+            n = batch.shape[0]
+            bucket = next(b for b in self.buckets if b >= n)
+            if bucket > n:
+                batch = np.concatenate([batch, np.zeros((bucket - n,) + batch.shape[1:], dtype=np.float32)])
+            output = self.functions[bucket](tf.convert_to_tensor(batch))
+            for key, value in output.items():
+                outputs.setdefault(key, []).append(value.numpy()[:n])
+        return {key: np.concatenate(values) for key, values in outputs.items()}
+
+    def report(self) -> str:
+        """A one-line summary of trace counts and warm-up times per bucket."""
+        return ", ".join(
+            f"batch {b}: {self.trace_counts[b]} trace(s), warm-up {self.warm_up_times.get(b, 0.0):.2f} s"
+            for b in self.buckets
+        )
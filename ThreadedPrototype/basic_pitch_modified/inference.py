@@ -22,24 +22,26 @@ import os
 import pathlib
 from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-from tensorflow import Tensor, signal, keras, saved_model
+from tensorflow import Tensor, signal, keras
 import numpy as np
 import librosa
 import pretty_midi
 
-from basic_pitch.constants import (
+from basic_pitch_modified.constants import (
     AUDIO_SAMPLE_RATE,
     AUDIO_N_SAMPLES,
     ANNOTATIONS_FPS,
     FFT_HOP,
 )
-from basic_pitch import ICASSP_2022_MODEL_PATH, note_creation as infer
-from basic_pitch.commandline_printing import (
+from basic_pitch_modified import ICASSP_2022_MODEL_PATH, note_creation as infer
+from basic_pitch_modified.commandline_printing import (
     generating_file_message,
     no_tf_warnings,
     file_saved_confirmation,
     failed_to_save,
 )
+from basic_pitch_modified.backends import load_model
+from basic_pitch_modified.streaming import StreamingInference
 
 
 def window_audio_file(audio_original: Tensor, hop_size: int) -> Tuple[Tensor, List[Dict[str, int]]]:
@@ -127,7 +129,7 @@ def unwrap_output(output: Tensor, audio_original_length: int, n_overlapping_fram
     Returns:
         array (n_times, n_freqs)
     """
-    raw_output = output.numpy()
+    raw_output = np.asarray(output)  # tensors from the saved model, arrays from the TFLite/ONNX backends
     if len(raw_output.shape) != 3:
         return None
 
@@ -339,6 +341,7 @@ def predict(
     Args:
         audio_path: File path for the audio to run inference on.
         model_or_model_path: Path to load the Keras saved model from. Can be local or on GCS.
+            A .tflite or .onnx path runs the converted model with that backend instead (see backends.py).
         onset_threshold: Minimum energy required for an onset to be considered present.
         frame_threshold: Minimum energy requirement for a frame to be considered present.
         minimum_note_length: The minimum allowed note length in milliseconds.
@@ -356,7 +359,7 @@ def predict(
         # someone wants to place this function in a loop,
         # the model doesn't have to be reloaded every function call
         if isinstance(model_or_model_path, (pathlib.Path, str)):
-            model = saved_model.load(str(model_or_model_path))
+            model = load_model(model_or_model_path)
         else:
             model = model_or_model_path
 
@@ -404,7 +407,7 @@ def predict(
 
 def predict_pyaudio(
     audio_original: np.ndarray,
-    model_or_model_path: Union[keras.Model, pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
+    model_or_model_path: Union[keras.Model, StreamingInference, pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
     onset_threshold: float = 0.5,
     frame_threshold: float = 0.3,
     minimum_note_length: float = 127.70,
@@ -414,12 +417,22 @@ def predict_pyaudio(
     melodia_trick: bool = True,
     debug_file: Optional[pathlib.Path] = None,
     midi_tempo: float = 120,
-) -> Tuple[Dict[str, np.array], pretty_midi.PrettyMIDI, List[Tuple[float, float, int, float, Optional[List[int]]]],]:
+    stream_cursor: Optional[int] = None,
+    melodia_frame_budget: Optional[int] = None,
+    include_pitch_bends: bool = True,
+    midi: bool = True,
+) -> Tuple[
+    Dict[str, np.array],
+    Union[pretty_midi.PrettyMIDI, infer.NoteArray],
+    Optional[List[Tuple[float, float, int, float, Optional[List[int]]]]],
+]:
     """Run a single prediction.
 
     Args:
         audio_path: File path for the audio to run inference on.
         model_or_model_path: Path to load the Keras saved model from. Can be local or on GCS.
+            A .tflite or .onnx path runs the converted model with that backend instead (see backends.py).
+            A StreamingInference runs the model only on windows containing new audio.
         onset_threshold: Minimum energy required for an onset to be considered present.
         frame_threshold: Minimum energy requirement for a frame to be considered present.
         minimum_note_length: The minimum allowed note length in milliseconds.
@@ -428,6 +441,12 @@ def predict_pyaudio(
         multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
         melodia_trick: Use the melodia post-processing step.
         debug_file: An optional path to output debug data to. Useful for testing/verification.
+        stream_cursor: With a StreamingInference, the absolute stream position just after the last
+            sample of audio_original. Defaults to the length of audio_original.
+        melodia_frame_budget: Cap on the frames the melodia trick may visit per call. None for no limit.
+        include_pitch_bends: If False, skip pitch bend estimation (for callers that don't use them).
+        midi: If False, return the notes as an infer.NoteArray in place of the midi data, and None for the
+            note events, so no PrettyMIDI objects are created (NoteArray.to_midi() creates them on demand).
     Returns:
         The model output, midi data and note events from a single prediction
     """
@@ -437,12 +456,32 @@ def predict_pyaudio(
         # someone wants to place this function in a loop,
         # the model doesn't have to be reloaded every function call
         if isinstance(model_or_model_path, (pathlib.Path, str)):
-            model = saved_model.load(str(model_or_model_path))
+            model = load_model(model_or_model_path)
         else:
             model = model_or_model_path
 
-        model_output = run_inference_pyaudio(audio_original, model, debug_file)
+        if isinstance(model, StreamingInference):
+            if stream_cursor is None:
+                stream_cursor = audio_original.shape[0]
+            model_output = model.update(audio_original, stream_cursor)
+        else:
+            model_output = run_inference_pyaudio(audio_original, model, debug_file)
         min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+        if not midi:
+            note_array = infer.model_output_to_note_array(
+                model_output,
+                onset_thresh=onset_threshold,
+                frame_thresh=frame_threshold,
+                min_note_len=min_note_len,  # convert to frames
+                min_freq=minimum_frequency,
+                max_freq=maximum_frequency,
+                include_pitch_bends=include_pitch_bends,
+                melodia_trick=melodia_trick,
+                vectorized=True,
+                melodia_frame_budget=melodia_frame_budget,
+            )
+            return model_output, note_array, None
+
         midi_data, note_events = infer.model_output_to_notes(
             model_output,
             onset_thresh=onset_threshold,
@@ -450,9 +489,12 @@ def predict_pyaudio(
             min_note_len=min_note_len,  # convert to frames
             min_freq=minimum_frequency,
             max_freq=maximum_frequency,
+            include_pitch_bends=include_pitch_bends,
             multiple_pitch_bends=multiple_pitch_bends,
             melodia_trick=melodia_trick,
             midi_tempo=midi_tempo,
+            vectorized=True,
+            melodia_frame_budget=melodia_frame_budget,
         )
 
     if debug_file:
@@ -510,6 +552,7 @@ def predict_and_save(
         save_model_outputs: True to save contours, onsets and notes from the model prediction.
         save_notes: True to save note events.
         model_path: Path to load the Keras saved model from. Can be local or on GCS.
+            A .tflite or .onnx path runs the converted model with that backend instead (see backends.py).
         onset_threshold: Minimum energy required for an onset to be considered present.
         frame_threshold: Minimum energy requirement for a frame to be considered present.
         minimum_note_length: The minimum allowed note length in frames.
@@ -520,7 +563,7 @@ def predict_and_save(
         debug_file: An optional path to output debug data to. Useful for testing/verification.
         sonification_samplerate: Sample rate for rendering audio from MIDI.
     """
-    model = saved_model.load(str(model_path))
+    model = load_model(model_path)
 
     for audio_path in audio_path_list:
         print("")
@@ -17,6 +17,7 @@
 
 import pathlib
 from collections import defaultdict
+from functools import lru_cache
 from typing import DefaultDict, Dict, List, Optional, Tuple, Union
 import mir_eval
 import librosa
@@ -24,9 +25,10 @@ import resampy
 import numpy as np
 import pretty_midi
 import scipy
+import scipy.signal
 from scipy.io import wavfile
 
-from basic_pitch.constants import (
+from basic_pitch_modified.constants import (
     AUDIO_SAMPLE_RATE,
     ANNOTATIONS_N_SEMITONES,
     ANNOTATIONS_BASE_FREQUENCY,
@@ -42,6 +44,108 @@ SONIFY_FS = 3000
 N_PITCH_BEND_TICKS = 8192
 MAX_FREQ_IDX = 87
 
+# compact note events: times in seconds, MIDI pitch and velocity
+NOTE_DTYPE = np.dtype([("start", np.float64), ("end", np.float64), ("pitch", np.int16), ("velocity", np.int16)])
+
+
+class NoteArray:
+    """Note events as a structured array, with the pitch bends of all notes in one ragged array.
+
+    A lighter alternative to the PrettyMIDI object and note event tuples for code that only reads
+    the notes; to_midi() builds the same PrettyMIDI object note_events_to_midi would, when needed.
+
+    Args:
+        notes: Structured array of NOTE_DTYPE.
+        bends: The pitch bends of all notes concatenated (in 1/3 semitones), or None without pitch bends.
+        bend_offsets: Note i has the bends bends[bend_offsets[i]:bend_offsets[i + 1]].
+    """
+
+    def __init__(
+        self, notes: np.ndarray, bends: Optional[np.ndarray] = None, bend_offsets: Optional[np.ndarray] = None
+    ) -> None:
+        self.notes = notes
+        self.bends = bends
+        self.bend_offsets = bend_offsets
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    def note_bends(self, i: int) -> Optional[np.ndarray]:
+        """The pitch bends of note i, or None without pitch bends."""
+        if self.bends is None:
+            return None
+        return self.bends[self.bend_offsets[i] : self.bend_offsets[i + 1]]
+
+    def to_midi(self, multiple_pitch_bends: bool = False, midi_tempo: float = 120) -> pretty_midi.PrettyMIDI:
+        """Create a pretty_midi object from the notes, like note_events_to_midi.
+
+        Args:
+            multiple_pitch_bends: If True, allow overlapping notes to have pitch bends
+                (each pitch then gets its own instrument).
+            midi_tempo: The tempo of the MIDI file.
+
+        Returns:
+            pretty_midi.PrettyMIDI() object
+        """
+        notes = self.notes
+        has_bends = np.zeros(len(notes), dtype=bool)
+        if self.bends is not None:
+            has_bends = np.diff(self.bend_offsets) > 0
+        order = np.arange(len(notes))
+        if not multiple_pitch_bends:
+            order = np.lexsort((notes["velocity"], notes["pitch"], notes["end"], notes["start"]))
+            has_bends &= ~overlapping_notes(notes["start"], notes["end"])
+
+        mid = pretty_midi.PrettyMIDI(initial_tempo=midi_tempo)
+        piano_program = pretty_midi.instrument_name_to_program("Electric Piano 1")
+        instruments: DefaultDict[int, pretty_midi.Instrument] = defaultdict(
+            lambda: pretty_midi.Instrument(program=piano_program)
+        )
+        for i in order.tolist():
+            start_time, end_time, note_number, velocity = notes[i].tolist()
+            instrument = instruments[note_number] if multiple_pitch_bends else instruments[0]
+            note = pretty_midi.Note(velocity=velocity, pitch=note_number, start=start_time, end=end_time)
+            instrument.notes.append(note)
+            if not has_bends[i]:
+                continue
+            pitch_bend = self.note_bends(i)
+            pitch_bend_times = np.linspace(start_time, end_time, len(pitch_bend))
+            pitch_bend_midi_ticks = _pitch_bend_midi_ticks(pitch_bend)
+            for pb_time, pb_midi in zip(pitch_bend_times, pitch_bend_midi_ticks):
+                instrument.pitch_bends.append(pretty_midi.PitchBend(pb_midi, pb_time))
+        mid.instruments.extend(instruments.values())
+
+        return mid
+
+    def midi_pitch_bends(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The pitch bends to_midi() (with multiple_pitch_bends=False) adds to its single instrument.
+
+        Returns:
+            The pitch bend times in seconds and their MIDI pitch bend values, in the order to_midi() adds them.
+        """
+        notes = self.notes
+        if self.bends is None:
+            return np.zeros(0), np.zeros(0, dtype=int)
+        has_bends = (np.diff(self.bend_offsets) > 0) & ~overlapping_notes(notes["start"], notes["end"])
+        order = np.lexsort((notes["velocity"], notes["pitch"], notes["end"], notes["start"]))
+        order = order[has_bends[order]]
+        counts = np.diff(self.bend_offsets)[order]
+        bends = np.concatenate([self.note_bends(i) for i in order.tolist()] + [np.zeros(0, dtype=int)])
+        # same values as np.linspace(start, end, count) for every note
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        step = np.repeat((notes["end"][order] - notes["start"][order]) / np.maximum(counts - 1, 1), counts)
+        times = (np.arange(len(bends)) - first) * step + np.repeat(notes["start"][order], counts)
+        last = np.cumsum(counts)[counts > 1] - 1
+        times[last] = notes["end"][order][counts > 1]
+        return times, _pitch_bend_midi_ticks(bends)
+
+
+def _pitch_bend_midi_ticks(pitch_bend: np.ndarray) -> np.ndarray:
+    """Convert pitch bends in 1/3 semitones to MIDI pitch bend values."""
+    pitch_bend_midi_ticks = np.round(pitch_bend * 4096 / CONTOURS_BINS_PER_SEMITONE).astype(int)
+    # This supports pitch bends up to 2 semitones
+    return np.clip(pitch_bend_midi_ticks, -N_PITCH_BEND_TICKS, N_PITCH_BEND_TICKS - 1)
+
 
 def model_output_to_notes(
     output: Dict[str, np.array],
@@ -55,6 +159,8 @@ def model_output_to_notes(
     multiple_pitch_bends: bool = False,
     melodia_trick: bool = True,
     midi_tempo: float = 120,
+    vectorized: bool = False,
+    melodia_frame_budget: Optional[int] = None,
 ) -> Tuple[pretty_midi.PrettyMIDI, List[Tuple[float, float, int, float, Optional[List[int]]]]]:
     """Convert model output to MIDI
 
@@ -74,6 +180,8 @@ def model_output_to_notes(
         include_pitch_bends: If True, include pitch bends.
         multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
         melodia_trick: Use the melodia post-processing step.
+        vectorized: Find the note ends of all onsets at once (same notes, faster on dense material).
+        melodia_frame_budget: Cap on the frames the melodia trick may visit, for real-time use. None for no limit.
 
     Returns:
         midi : pretty_midi.PrettyMIDI object
@@ -93,6 +201,8 @@ def model_output_to_notes(
         min_freq=min_freq,
         max_freq=max_freq,
         melodia_trick=melodia_trick,
+        vectorized=vectorized,
+        melodia_frame_budget=melodia_frame_budget,
     )
     if include_pitch_bends:
         estimated_notes_with_pitch_bend = get_pitch_bends(contours, estimated_notes)
@@ -110,6 +220,60 @@ def model_output_to_notes(
     )
 
 
+def model_output_to_note_array(
+    output: Dict[str, np.array],
+    onset_thresh: float,
+    frame_thresh: float,
+    infer_onsets: bool = True,
+    min_note_len: int = 5,
+    min_freq: Optional[float] = None,
+    max_freq: Optional[float] = None,
+    include_pitch_bends: bool = True,
+    melodia_trick: bool = True,
+    vectorized: bool = False,
+    melodia_frame_budget: Optional[int] = None,
+) -> NoteArray:
+    """Convert model output to a NoteArray, without creating any PrettyMIDI objects.
+
+    Takes the same arguments as model_output_to_notes (multiple_pitch_bends and midi_tempo
+    are arguments of NoteArray.to_midi instead).
+
+    Returns:
+        The notes, with the same times, pitches, velocities and pitch bends as the MIDI
+        model_output_to_notes creates.
+    """
+    frames = output["note"]
+    onsets = output["onset"]
+    contours = output["contour"]
+
+    estimated_notes = output_to_notes_polyphonic(
+        frames,
+        onsets,
+        onset_thresh=onset_thresh,
+        frame_thresh=frame_thresh,
+        infer_onsets=infer_onsets,
+        min_note_len=min_note_len,
+        min_freq=min_freq,
+        max_freq=max_freq,
+        melodia_trick=melodia_trick,
+        vectorized=vectorized,
+        melodia_frame_budget=melodia_frame_budget,
+    )
+    notes = np.zeros(len(estimated_notes), dtype=NOTE_DTYPE)
+    start_idx, end_idx, pitch_midi, amplitude = (
+        (np.array(x) for x in zip(*estimated_notes)) if estimated_notes else (np.zeros(0, dtype=np.int64),) * 4
+    )
+    times_s = model_frames_to_time(contours.shape[0])
+    notes["start"] = times_s[start_idx]
+    notes["end"] = times_s[end_idx]
+    notes["pitch"] = pitch_midi
+    notes["velocity"] = np.round(127 * amplitude)
+    if not include_pitch_bends:
+        return NoteArray(notes)
+    bends, bend_offsets = pitch_bends_flat(contours, start_idx, end_idx, pitch_midi)
+    return NoteArray(notes, bends, bend_offsets)
+
+
 def sonify_midi(midi: pretty_midi.PrettyMIDI, save_path: Union[pathlib.Path, str], sr: Optional[int] = 44100) -> None:
     """Sonify a pretty_midi midi object and save to a file.
 
@@ -173,6 +337,62 @@ def midi_pitch_to_contour_bin(pitch_midi: int) -> np.array:
     return 12.0 * CONTOURS_BINS_PER_SEMITONE * np.log2(pitch_hz / ANNOTATIONS_BASE_FREQUENCY)
 
 
+@lru_cache(maxsize=None)
+def _pitch_bend_window(n_bins_tolerance: int) -> np.ndarray:
+    """The Gaussian frequency weighting around a note's contour bin, computed once per tolerance."""
+    return scipy.signal.windows.gaussian(n_bins_tolerance * 2 + 1, std=5)
+
+
+@lru_cache(maxsize=None)
+def _contour_bin_table() -> np.ndarray:
+    """Nearest contour bin of every MIDI pitch (0-127), from midi_pitch_to_contour_bin."""
+    return np.array([int(np.round(midi_pitch_to_contour_bin(pitch_midi))) for pitch_midi in range(128)])
+
+
+def pitch_bends_flat(
+    contours: np.ndarray,
+    start_idx: np.ndarray,
+    end_idx: np.ndarray,
+    pitch_midi: np.ndarray,
+    n_bins_tolerance: int = 25,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimate the pitch bends of many notes at once.
+
+    Every frame of every note is gathered into one (n_note_frames, 2 * n_bins_tolerance + 1) array
+    of contour bins around the note's pitch (from a lookup table of the bin of each pitch), padded
+    with -inf beyond the edges of the contour matrix, so all bends come out of a single weighted argmax.
+
+    Args:
+        contours: Matrix of estimated pitch contours (n_times, N_FREQ_BINS_CONTOURS).
+        start_idx: Start frame of each note.
+        end_idx: End frame (exclusive) of each note.
+        pitch_midi: MIDI pitch of each note.
+        n_bins_tolerance: Pitch bend estimation range. Defaults to 25.
+
+    Returns:
+        The bends of all notes concatenated (in units of 1/3 semitones), and the offsets where each
+        note's bends start, with a final entry for the end (note i has bends[offsets[i]:offsets[i + 1]]).
+    """
+    start_idx = np.asarray(start_idx, dtype=np.int64)
+    lengths = np.maximum(np.minimum(np.asarray(end_idx, dtype=np.int64), contours.shape[0]) - start_idx, 0)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # frame and contour bins of every note frame
+    note_of_frame = np.repeat(np.arange(len(lengths)), lengths)
+    frame_idx = np.arange(offsets[-1]) - offsets[note_of_frame] + start_idx[note_of_frame]
+    freq_idx = _contour_bin_table()[np.asarray(pitch_midi, dtype=np.int64)][note_of_frame]
+
+    # window (f - n_bins_tolerance ... f + n_bins_tolerance) around every contour bin f, as a view
+    padded = np.full((contours.shape[0], contours.shape[1] + 2 * n_bins_tolerance), -np.inf, dtype=contours.dtype)
+    padded[:, n_bins_tolerance : n_bins_tolerance + contours.shape[1]] = contours
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * n_bins_tolerance + 1, axis=1)
+
+    weighted = windows[frame_idx, freq_idx] * _pitch_bend_window(n_bins_tolerance)
+    bends = np.argmax(weighted, axis=1) - n_bins_tolerance  # this is in units of 1/3 semitones
+    return bends, offsets
+
+
 def get_pitch_bends(
     contours: np.ndarray, note_events: List[Tuple[int, int, int, float]], n_bins_tolerance: int = 25
 ) -> List[Tuple[int, int, int, float, Optional[List[int]]]]:
@@ -189,28 +409,15 @@ def get_pitch_bends(
     Returns:
         note events with pitch bends
     """
-    window_length = n_bins_tolerance * 2 + 1
-    freq_gaussian = scipy.signal.gaussian(window_length, std=5)
-    note_events_with_pitch_bends = []
-    for start_idx, end_idx, pitch_midi, amplitude in note_events:
-        freq_idx = int(np.round(midi_pitch_to_contour_bin(pitch_midi)))
-        freq_start_idx = np.max([freq_idx - n_bins_tolerance, 0])
-        freq_end_idx = np.min([N_FREQ_BINS_CONTOURS, freq_idx + n_bins_tolerance + 1])
-
-        pitch_bend_submatrix = (
-            contours[start_idx:end_idx, freq_start_idx:freq_end_idx]
-            * freq_gaussian[
-                np.max([0, n_bins_tolerance - freq_idx]) : window_length
-                - np.max([0, freq_idx - (N_FREQ_BINS_CONTOURS - n_bins_tolerance - 1)])
-            ]
-        )
-        pb_shift = n_bins_tolerance - np.max([0, n_bins_tolerance - freq_idx])
-
-        bends: Optional[List[int]] = list(
-            np.argmax(pitch_bend_submatrix, axis=1) - pb_shift
-        )  # this is in units of 1/3 semitones
-        note_events_with_pitch_bends.append((start_idx, end_idx, pitch_midi, amplitude, bends))
-    return note_events_with_pitch_bends
+    if not note_events:
+        return []
+    start_idx, end_idx, pitch_midi, _ = zip(*note_events)
+    bends, offsets = pitch_bends_flat(contours, start_idx, end_idx, pitch_midi, n_bins_tolerance)
+    bends = bends.tolist()
+    return [
+        (start_idx, end_idx, pitch_midi, amplitude, bends[offsets[i] : offsets[i + 1]])
+        for i, (start_idx, end_idx, pitch_midi, amplitude) in enumerate(note_events)
+    ]
 
 
 def note_events_to_midi(
@@ -263,19 +470,49 @@ def note_events_to_midi(
     return mid
 
 
+def overlapping_notes(start_times: np.ndarray, end_times: np.ndarray) -> np.ndarray:
+    """Find the notes that overlap in time with another note.
+
+    Sweeps over the notes sorted by start (then end) time, keeping the latest end time seen so far: a
+    note overlaps an earlier note if it starts before that end time, and a later note if the next
+    note starts before its own end. O(n log n) for the sort, O(n) for the sweep.
+
+    Args:
+        start_times: Start time of each note.
+        end_times: End time of each note.
+
+    Returns:
+        A boolean mask, in the order of the input, that is True for the notes that overlap another note.
+    """
+    start_times = np.asarray(start_times)
+    end_times = np.asarray(end_times)
+    order = np.lexsort((end_times, start_times))
+    start = start_times[order]
+    end = end_times[order]
+
+    overlap = np.zeros(len(order), dtype=bool)
+    if len(order) > 1:
+        overlap[:-1] = start[1:] < end[:-1]
+        overlap[1:] |= start[1:] < np.maximum.accumulate(end[:-1])
+
+    mask = np.empty_like(overlap)
+    mask[order] = overlap
+    return mask
+
+
 def drop_overlapping_pitch_bends(
     note_events_with_pitch_bends: List[Tuple[float, float, int, float, Optional[List[int]]]]
 ) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
     """Drop pitch bends from any notes that overlap in time with another note"""
     note_events = sorted(note_events_with_pitch_bends)
-    for i in range(len(note_events) - 1):
-        for j in range(i + 1, len(note_events)):
-            if note_events[j][0] >= note_events[i][1]:  # start j > end i
-                break
-            note_events[i] = note_events[i][:-1] + (None,)  # last field is pitch bend
-            note_events[j] = note_events[j][:-1] + (None,)
-
-    return note_events
+    if not note_events:
+        return note_events
+    start_times, end_times = zip(*((note_event[0], note_event[1]) for note_event in note_events))
+    overlap = overlapping_notes(np.array(start_times), np.array(end_times))
+    return [
+        note_event[:-1] + (None,) if note_overlaps else note_event  # last field is pitch bend
+        for note_event, note_overlaps in zip(note_events, overlap.tolist())
+    ]
 
 
 def get_infered_onsets(onsets: np.array, frames: np.array, n_diff: int = 2) -> np.array:
@@ -344,56 +581,20 @@ def model_frames_to_time(n_frames: int) -> np.ndarray:
     return times
 
 
-def output_to_notes_polyphonic(
+def _onsets_to_notes(
     frames: np.array,
-    onsets: np.array,
-    onset_thresh: float,
+    remaining_energy: np.array,
+    onset_time_idx: np.array,
+    onset_freq_idx: np.array,
     frame_thresh: float,
     min_note_len: int,
-    infer_onsets: bool,
-    max_freq: Optional[float],
-    min_freq: Optional[float],
-    melodia_trick: bool = True,
-    energy_tol: int = 11,
+    energy_tol: int,
 ) -> List[Tuple[int, int, int, float]]:
-    """Decode raw model output to polyphonic note events
-
-    Args:
-        frames: Frame activation matrix (n_times, n_freqs).
-        onsets: Onset activation matrix (n_times, n_freqs).
-        onset_thresh: Minimum amplitude of an onset activation to be considered an onset.
-        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
-        min_note_len: Minimum allowed note length in frames.
-        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
-        max_freq: Maximum allowed output frequency, in Hz.
-        min_freq: Minimum allowed output frequency, in Hz.
-        melodia_trick : Whether to use the melodia trick to better detect notes.
-        energy_tol: Drop notes below this energy.
-
-    Returns:
-        list of tuples [(start_time_frames, end_time_frames, pitch_midi, amplitude)]
-        representing the note events, where amplitude is a number between 0 and 1
+    """Turn onsets (in decoding order) into notes, scanning each onset forward frame by frame.
+    Zeroes the energy used by each note in remaining_energy.
     """
-
     n_frames = frames.shape[0]
 
-    onsets, frames = constrain_frequency(onsets, frames, max_freq, min_freq)
-    # use onsets inferred from frames in addition to the predicted onsets
-    if infer_onsets:
-        onsets = get_infered_onsets(onsets, frames)
-
-    peak_thresh_mat = np.zeros(onsets.shape)
-    peaks = scipy.signal.argrelmax(onsets, axis=0)
-    peak_thresh_mat[peaks] = onsets[peaks]
-
-    onset_idx = np.where(peak_thresh_mat >= onset_thresh)
-    onset_time_idx = onset_idx[0][::-1]  # sort to go backwards in time
-    onset_freq_idx = onset_idx[1][::-1]  # sort to go backwards in time
-
-    remaining_energy = np.zeros(frames.shape)
-    remaining_energy[:, :] = frames[:, :]
-
-    # loop over onsets
     note_events = []
     for note_start_idx, freq_idx in zip(onset_time_idx, onset_freq_idx):
         # if we're too close to the end of the audio, continue
@@ -433,66 +634,322 @@ def output_to_notes_polyphonic(
             )
         )
 
-    if melodia_trick:
-        energy_shape = remaining_energy.shape
-
-        while np.max(remaining_energy) > frame_thresh:
-            i_mid, freq_idx = np.unravel_index(np.argmax(remaining_energy), energy_shape)
-            remaining_energy[i_mid, freq_idx] = 0
-
-            # forward pass
-            i = i_mid + 1
-            k = 0
-            while i < n_frames - 1 and k < energy_tol:
-                if remaining_energy[i, freq_idx] < frame_thresh:
-                    k += 1
+    return note_events
+
+
+def _onsets_to_notes_vectorized(
+    frames: np.array,
+    remaining_energy: np.array,
+    onset_time_idx: np.array,
+    onset_freq_idx: np.array,
+    frame_thresh: float,
+    min_note_len: int,
+    energy_tol: int,
+) -> List[Tuple[int, int, int, float]]:
+    """Same as _onsets_to_notes, but finds the note ends of all onsets at once with _note_ends.
+
+    A note zeroes its own and its neighbouring pitches from its onset on, which can end notes with
+    earlier onsets (decoded later) sooner. For those onsets the scan is resumed where the zeroed
+    frames start, jumping over whole runs of frames; the zeroing itself is applied to
+    remaining_energy once at the end.
+    """
+    n_frames, n_freqs = frames.shape
+    keep = onset_time_idx < n_frames - 1  # too close to the end of the audio
+    onset_time_idx = onset_time_idx[keep]
+    onset_freq_idx = onset_freq_idx[keep]
+    if len(onset_time_idx) == 0:
+        return []
+
+    # only the pitches with onsets are scanned; column c of below is pitch onset_pitches[c]
+    n_scan = n_frames - 1
+    onset_pitches, onset_col_idx = np.unique(onset_freq_idx, return_inverse=True)
+    below = remaining_energy[:n_scan, onset_pitches] < frame_thresh
+    ends = _note_ends(below, onset_time_idx, onset_col_idx, energy_tol)
+
+    # run boundaries per column, to rescan in jumps: the next frame at or after each frame that is
+    # above / below the threshold (n_scan if none), and the last frame at or before it that is above (-1 if none)
+    rows = np.arange(n_scan)[:, np.newaxis]
+    next_above = np.full((n_scan + 1, len(onset_pitches)), n_scan)
+    next_above[:n_scan] = np.where(below, n_scan, rows)
+    next_above = np.minimum.accumulate(next_above[::-1], axis=0)[::-1]
+    next_below = np.full((n_scan + 1, len(onset_pitches)), n_scan)
+    next_below[:n_scan] = np.where(below, rows, n_scan)
+    next_below = np.minimum.accumulate(next_below[::-1], axis=0)[::-1]
+    prev_above = np.maximum.accumulate(np.where(below, -1, rows), axis=0)
+
+    def rescan(note_start_idx: int, freq_idx: int, col: int) -> int:
+        """Redo the scan of one onset on its column with the zeroed frames counted as below the threshold."""
+        intervals = zeroed[freq_idx]
+        # no zeroed frame lies before zeroed_from, so neither does the first run of energy_tol low frames
+        i = max(zeroed_from[freq_idx], note_start_idx + 1)
+        k = i - max(prev_above[i - 1, col] + 1, note_start_idx + 1)
+        while i < n_scan and k < energy_tol:
+            zeroed_end = max([end for start, end in intervals if start <= i < end], default=i)
+            if zeroed_end > i:
+                step_to = zeroed_end
+            else:
+                next_zeroed = min([start for start, _ in intervals if start > i], default=n_scan)
+                if below[i, col]:
+                    step_to = min(next_above[i, col], next_zeroed)
                 else:
                     k = 0
+                    i = min(next_below[i, col], next_zeroed)
+                    continue
+            step_to = min(step_to, n_scan)
+            k += step_to - i
+            i = step_to
+        # the run of low frames started k frames back; the frame scan stops at its energy_tol-th frame
+        return i - k
+
+    zeroed_from = [n_frames + energy_tol] * n_freqs  # first frame zeroed by an accepted note, per pitch (past any scan)
+    zeroed: DefaultDict[int, List[Tuple[int, int]]] = defaultdict(list)
+    notes = []
+    for note_start_idx, freq_idx, col, i in zip(
+        onset_time_idx.tolist(), onset_freq_idx.tolist(), onset_col_idx.tolist(), ends.tolist()
+    ):
+        # the scan looked at frames note_start_idx + 1 to i + energy_tol; redo it if a note zeroed any of them
+        if zeroed_from[freq_idx] < i + energy_tol:
+            if frame_thresh > 0:
+                i = rescan(note_start_idx, freq_idx, col)
+            else:
+                # zeroed frames are not below a threshold <= 0, so they can only make a note longer
+                column = below[:, col].copy()
+                for start, end in zeroed[freq_idx]:
+                    column[start:end] = False
+                i = int(_note_ends(column[:, np.newaxis], np.array([note_start_idx]), np.array([0]), energy_tol)[0])
 
-                remaining_energy[i, freq_idx] = 0
-                if freq_idx < MAX_FREQ_IDX:
-                    remaining_energy[i, freq_idx + 1] = 0
-                if freq_idx > 0:
-                    remaining_energy[i, freq_idx - 1] = 0
+        # if the note is too short, skip it
+        if i - note_start_idx <= min_note_len:
+            continue
 
-                i += 1
+        for f in range(max(freq_idx - 1, 0), min(freq_idx + 1, MAX_FREQ_IDX) + 1):
+            zeroed_from[f] = min(zeroed_from[f], note_start_idx)
+            zeroed[f].append((note_start_idx, i))
+        notes.append((note_start_idx, i, freq_idx))
+
+    if not notes:
+        return []
+
+    # zero the energy used by all notes at once: +1 where a note starts, -1 where it ends, summed over time
+    starts, note_ends, pitches = (np.array(x, dtype=np.int64) for x in zip(*notes))
+    used = np.zeros((n_frames + 1, n_freqs + 2), dtype=np.int64)  # one padding column on each side
+    for offset in range(3):
+        np.add.at(used, (starts, pitches + offset), 1)
+        np.add.at(used, (note_ends, pitches + offset), -1)
+    remaining_energy[np.cumsum(used, axis=0)[:n_frames, 1:-1] > 0] = 0
+
+    # same value as np.mean (pairwise sum, divided in float64, cast back) without its per-call overhead
+    mean_type = frames.dtype.type
+    return [
+        (start, end, freq_idx + MIDI_OFFSET, mean_type(np.add.reduce(frames[start:end, freq_idx]) / (end - start)))
+        for start, end, freq_idx in notes
+    ]
 
-            i_end = i - 1 - k  # go back to frame above threshold
 
-            # backward pass
-            i = i_mid - 1
-            k = 0
-            while i > 0 and k < energy_tol:
-                if remaining_energy[i, freq_idx] < frame_thresh:
-                    k += 1
-                else:
-                    k = 0
+def _note_ends(below: np.ndarray, start_idx: np.ndarray, freq_idx: np.ndarray, energy_tol: int) -> np.ndarray:
+    """Find where notes end for many onsets at once.
 
-                remaining_energy[i, freq_idx] = 0
-                if freq_idx < MAX_FREQ_IDX:
-                    remaining_energy[i, freq_idx + 1] = 0
-                if freq_idx > 0:
-                    remaining_energy[i, freq_idx - 1] = 0
+    Gives the same result as scanning forward from each onset frame by frame until energy_tol
+    consecutive frames are below the threshold (or the scan range ends), then stepping back to the
+    last frame above it.
 
-                i -= 1
+    Args:
+        below: Boolean matrix (n_scan_frames, n_freqs), True where a frame is below the threshold.
+            Only frames the scan may visit (all but the last frame) are included.
+        start_idx: Onset frame of each note.
+        freq_idx: Frequency bin of each note.
+        energy_tol: Number of consecutive frames below the threshold that end a note.
 
-            i_start = i + 1 + k  # go back to frame above threshold
-            assert i_start >= 0, "{}".format(i_start)
-            assert i_end < n_frames
+    Returns:
+        The end frame (exclusive) of each note.
+    """
+    n_scan, n_freqs = below.shape
+    counts = np.zeros((n_scan + 1, n_freqs), dtype=np.int64)
+    np.cumsum(below, axis=0, out=counts[1:])
 
-            if i_end - i_start <= min_note_len:
-                # note is too short, skip it
-                continue
+    # next_run[i, f]: first frame >= i that starts energy_tol frames below the threshold (n_scan if none)
+    n_run_starts = max(n_scan - energy_tol + 1, 0)
+    run_starts = counts[energy_tol : energy_tol + n_run_starts] - counts[:n_run_starts] == energy_tol
+    next_run = np.full((n_scan + 1, n_freqs), n_scan, dtype=np.int64)
+    next_run[:n_run_starts] = np.where(run_starts, np.arange(n_run_starts)[:, np.newaxis], n_scan)
+    next_run = np.minimum.accumulate(next_run[::-1], axis=0)[::-1]
 
-            # add the note
-            amplitude = np.mean(frames[i_start:i_end, freq_idx])
-            note_events.append(
-                (
-                    i_start,
-                    i_end,
-                    freq_idx + MIDI_OFFSET,
-                    amplitude,
-                )
+    # without such a run, the scan stops at the end and steps back over the trailing frames below threshold
+    last_above = np.max(np.where(below, -1, np.arange(n_scan)[:, np.newaxis]), axis=0, initial=-1)
+    trailing_below = n_scan - 1 - last_above
+
+    scan_start = start_idx + 1
+    ends = next_run[scan_start, freq_idx]
+    return np.where(ends < n_scan, ends, n_scan - np.minimum(trailing_below[freq_idx], n_scan - scan_start))
+
+
+def _melodia_notes(
+    frames: np.array,
+    remaining_energy: np.array,
+    frame_thresh: float,
+    min_note_len: int,
+    energy_tol: int,
+    frame_budget: Optional[int] = None,
+) -> List[Tuple[int, int, int, float]]:
+    """The melodia trick: trace notes outwards from the highest remaining energy peaks.
+
+    The peaks above frame_thresh are sorted once by descending energy (ties in np.argmax order) and
+    visited in that order. Energy only ever drops to zero, so a peak zeroed by an earlier note is
+    simply skipped, and each visited peak is the one np.argmax(remaining_energy) would return.
+
+    Args:
+        frames: Frame activation matrix (n_times, n_freqs).
+        remaining_energy: Frame activations not used by a note yet. Zeroed in place as notes are traced.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        energy_tol: Number of consecutive frames below frame_thresh that end a note.
+        frame_budget: Stop tracing new notes once the passes have visited this many frames. None for no limit.
+
+    Returns:
+        list of tuples [(start_time_frames, end_time_frames, pitch_midi, amplitude)]
+    """
+    n_frames = frames.shape[0]
+    peak_idx = np.flatnonzero(remaining_energy > frame_thresh)
+    peak_idx = peak_idx[np.argsort(-remaining_energy.ravel()[peak_idx], kind="stable")]
+    peak_time_idx, peak_freq_idx = np.unravel_index(peak_idx, remaining_energy.shape)
+
+    note_events = []
+    frames_visited = 0
+    for i_mid, freq_idx in zip(peak_time_idx.tolist(), peak_freq_idx.tolist()):
+        if remaining_energy[i_mid, freq_idx] <= frame_thresh:
+            continue  # zeroed by an earlier note
+        if frame_budget is not None and frames_visited >= frame_budget:
+            break
+        remaining_energy[i_mid, freq_idx] = 0
+
+        # forward pass
+        i = i_mid + 1
+        k = 0
+        while i < n_frames - 1 and k < energy_tol:
+            if remaining_energy[i, freq_idx] < frame_thresh:
+                k += 1
+            else:
+                k = 0
+
+            remaining_energy[i, freq_idx] = 0
+            if freq_idx < MAX_FREQ_IDX:
+                remaining_energy[i, freq_idx + 1] = 0
+            if freq_idx > 0:
+                remaining_energy[i, freq_idx - 1] = 0
+
+            i += 1
+
+        frames_visited += i - (i_mid + 1)
+        i_end = i - 1 - k  # go back to frame above threshold
+
+        # backward pass
+        i = i_mid - 1
+        k = 0
+        while i > 0 and k < energy_tol:
+            if remaining_energy[i, freq_idx] < frame_thresh:
+                k += 1
+            else:
+                k = 0
+
+            remaining_energy[i, freq_idx] = 0
+            if freq_idx < MAX_FREQ_IDX:
+                remaining_energy[i, freq_idx + 1] = 0
+            if freq_idx > 0:
+                remaining_energy[i, freq_idx - 1] = 0
+
+            i -= 1
+
+        frames_visited += (i_mid - 1) - i
+        i_start = i + 1 + k  # go back to frame above threshold
+        assert i_start >= 0, "{}".format(i_start)
+        assert i_end < n_frames
+
+        if i_end - i_start <= min_note_len:
+            # note is too short, skip it
+            continue
+
+        # add the note
+        amplitude = np.mean(frames[i_start:i_end, freq_idx])
+        note_events.append(
+            (
+                i_start,
+                i_end,
+                freq_idx + MIDI_OFFSET,
+                amplitude,
             )
+        )
+
+    return note_events
+
+
+def output_to_notes_polyphonic(
+    frames: np.array,
+    onsets: np.array,
+    onset_thresh: float,
+    frame_thresh: float,
+    min_note_len: int,
+    infer_onsets: bool,
+    max_freq: Optional[float],
+    min_freq: Optional[float],
+    melodia_trick: bool = True,
+    energy_tol: int = 11,
+    vectorized: bool = False,
+    melodia_frame_budget: Optional[int] = None,
+) -> List[Tuple[int, int, int, float]]:
+    """Decode raw model output to polyphonic note events
+
+    Args:
+        frames: Frame activation matrix (n_times, n_freqs).
+        onsets: Onset activation matrix (n_times, n_freqs).
+        onset_thresh: Minimum amplitude of an onset activation to be considered an onset.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
+        max_freq: Maximum allowed output frequency, in Hz.
+        min_freq: Minimum allowed output frequency, in Hz.
+        melodia_trick : Whether to use the melodia trick to better detect notes.
+        energy_tol: Drop notes below this energy.
+        vectorized: Find the note ends of all onsets at once with array operations instead of
+            scanning each onset frame by frame. The notes are identical.
+        melodia_frame_budget: Stop the melodia trick once its passes have visited this many frames
+            (the note being traced is finished first). None for no limit.
+
+    Returns:
+        list of tuples [(start_time_frames, end_time_frames, pitch_midi, amplitude)]
+        representing the note events, where amplitude is a number between 0 and 1
+    """
+
+    n_frames = frames.shape[0]
+
+    onsets, frames = constrain_frequency(onsets, frames, max_freq, min_freq)
+    # use onsets inferred from frames in addition to the predicted onsets
+    if infer_onsets:
+        onsets = get_infered_onsets(onsets, frames)
+
+    peak_thresh_mat = np.zeros(onsets.shape)
+    peaks = scipy.signal.argrelmax(onsets, axis=0)
+    peak_thresh_mat[peaks] = onsets[peaks]
+
+    onset_idx = np.where(peak_thresh_mat >= onset_thresh)
+    onset_time_idx = onset_idx[0][::-1]  # sort to go backwards in time
+    onset_freq_idx = onset_idx[1][::-1]  # sort to go backwards in time
+
+    remaining_energy = np.zeros(frames.shape)
+    remaining_energy[:, :] = frames[:, :]
+
+    # loop over onsets
+    if vectorized:
+        note_events = _onsets_to_notes_vectorized(
+            frames, remaining_energy, onset_time_idx, onset_freq_idx, frame_thresh, min_note_len, energy_tol
+        )
+    else:
+        note_events = _onsets_to_notes(
+            frames, remaining_energy, onset_time_idx, onset_freq_idx, frame_thresh, min_note_len, energy_tol
+        )
+
+    if melodia_trick:
+        note_events += _melodia_notes(
+            frames, remaining_energy, frame_thresh, min_note_len, energy_tol, frame_budget=melodia_frame_budget
+        )
 
     return note_events
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Append-only note events from successive live analysis updates.
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from basic_pitch_modified.note_creation import (
+    MIDI_OFFSET,
+    NOTE_DTYPE,
+    NoteArray,
+    output_to_notes_polyphonic,
+    pitch_bends_flat,
+)
+from basic_pitch_modified.streaming import stream_frames_to_time
+
+N_MIDI_PITCHES = 128
+
+
+class StreamingNoteTracker:
+    """Turn the notes decoded from overlapping live analysis windows into one append-only stream of notes.
+
+    Every update decodes the posteriorgram of the whole analysis window (the last few seconds), so a
+    note that lasts longer than the hop between updates is seen several times, and once its start has
+    left the window it shows up again as a truncated note. The tracker works on absolute frame indices
+    of the stream instead: a decoded note that may still change in later windows (see _settled) is kept as
+    an open note and matched to its continuation in the next update (or, once its onset has left the window
+    and it is no longer decoded, followed on the note activations). A note is finalized once it has settled,
+    and finalized notes are never changed or emitted twice; decoded notes that overlap a finalized note of
+    the same pitch are re-detections of it and are dropped. Without infer_onsets the finalized notes are the
+    ones output_to_notes_polyphonic finds in the whole stream; inferred onsets depend on the largest frame
+    difference in the window, so with them the notes can differ where that differs from the whole stream.
+
+    Pitch bends are kept for notes whose whole length is in the window that finalizes them; notes that
+    started before it get no bends (a partial bend curve would be stretched over the whole note).
+
+    Args:
+        onset_thresh, frame_thresh, min_note_len, infer_onsets, min_freq, max_freq, melodia_trick,
+        melodia_frame_budget, energy_tol: Passed on to output_to_notes_polyphonic (min_note_len in frames).
+        include_pitch_bends: If True, estimate the pitch bends of finalized notes.
+        onset_tolerance: How many frames the start of a note may move between updates and still be the same note.
+        history: How many seconds finalized notes are kept after they end (at least the longest duration
+            recent_notes has been asked for), so memory does not grow with the length of the stream.
+    """
+
+    def __init__(
+        self,
+        onset_thresh: float = 0.5,
+        frame_thresh: float = 0.3,
+        min_note_len: int = 11,
+        infer_onsets: bool = True,
+        min_freq: Optional[float] = None,
+        max_freq: Optional[float] = None,
+        melodia_trick: bool = True,
+        melodia_frame_budget: Optional[int] = None,
+        energy_tol: int = 11,
+        include_pitch_bends: bool = True,
+        onset_tolerance: int = 2,
+        history: float = 30.0,
+    ) -> None:
+        self.decode_kwargs = dict(
+            onset_thresh=onset_thresh,
+            frame_thresh=frame_thresh,
+            min_note_len=min_note_len,
+            infer_onsets=infer_onsets,
+            min_freq=min_freq,
+            max_freq=max_freq,
+            melodia_trick=melodia_trick,
+            energy_tol=energy_tol,
+            vectorized=True,
+            melodia_frame_budget=melodia_frame_budget,
+        )
+        self.frame_thresh = frame_thresh
+        self.min_note_len = min_note_len
+        self.energy_tol = energy_tol
+        self.include_pitch_bends = include_pitch_bends
+        self.onset_tolerance = onset_tolerance
+        self.history = history
+
+        # open notes by pitch: [start frame, end frame, velocity]
+        self.open: Dict[int, List[int]] = {}
+        # end frame of the last finalized note of each pitch
+        self.finalized_end = np.full(N_MIDI_PITCHES, -1, dtype=np.int64)
+        self.frame_end = 0  # absolute end (exclusive) of the last window
+
+        # finalized notes in the order they were finalized, with times since the stream start, and the open notes;
+        # the first _dropped finalized notes have ended more than history seconds ago and are no longer kept
+        self._notes = np.zeros(0, dtype=NOTE_DTYPE)
+        self._bends: List[np.ndarray] = []
+        self._dropped = 0
+        self._open_notes = NoteArray(np.zeros(0, dtype=NOTE_DTYPE))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._dropped + len(self._notes)
+
+    def update(self, output: Dict[str, np.ndarray], frame_offset: int) -> NoteArray:
+        """Decode the latest analysis window and finalize the notes that have ended.
+
+        Args:
+            output: The model output of the window ('note', 'onset' and 'contour' of shape (n_times, n_freqs)),
+                which output_to_notes_polyphonic modifies in place.
+            frame_offset: The absolute frame index of the first frame of the window (StreamingInference.frame_offset).
+
+        Returns:
+            The notes finalized by this update, with times in seconds since the start of the stream.
+        """
+        n_frames = output["note"].shape[0]
+        frame_end = frame_offset + n_frames
+        decoded = output_to_notes_polyphonic(output["note"], output["onset"], **self.decode_kwargs)
+        settled = self._settled(decoded, n_frames)
+
+        finalized: List[Tuple[int, int, int, int]] = []
+
+        def finalize(start: int, end: int, velocity: int, pitch: int) -> None:
+            finalized.append((start, end, velocity, pitch))
+            self.finalized_end[pitch] = end
+
+        matched = set()
+        for start, end, pitch, amplitude in sorted(decoded, key=lambda note: (note[2], note[0])):
+            is_settled = (start, pitch) in settled
+            start += frame_offset
+            end += frame_offset
+            velocity = int(np.round(127 * amplitude))
+            if start < self.finalized_end[pitch]:
+                continue  # the tail of a note that was already finalized
+            note = self.open.get(pitch)
+            if note is not None and pitch not in matched:
+                if end >= note[0] and start <= max(note[0], frame_offset) + self.onset_tolerance:
+                    # the continuation of the open note; its start and velocity are only known while its start is
+                    # visible (its onset may move, e.g. to a later onset once the note from that is long enough to keep)
+                    matched.add(pitch)
+                    note[1] = end
+                    if start > frame_offset:
+                        note[0] = start
+                        note[2] = velocity
+                    if is_settled:
+                        finalize(*self.open.pop(pitch), pitch)
+                    continue
+                if start > note[0]:
+                    # a new onset. If the onset of the open note is still in the window the decoder dropped it,
+                    # else it ended where this one starts, and is dropped if that leaves it too short
+                    del self.open[pitch]
+                    if note[0] <= frame_offset and min(note[1], start) - note[0] > self.min_note_len:
+                        finalize(note[0], min(note[1], start), note[2], pitch)
+            if pitch in matched and pitch in self.open:
+                continue  # a later note of the pitch of a note that is still open, decoded again once that is finalized
+            if is_settled:
+                finalize(start, end, velocity, pitch)
+            elif pitch not in self.open:
+                self.open[pitch] = [start, end, velocity]
+                matched.add(pitch)
+
+        for pitch in [p for p in self.open if p not in matched]:
+            note = self.open[pitch]
+            if note[0] > frame_offset:
+                # its onset is still in the window, so the decoder dropped it (e.g. a note that started since on a
+                # neighbouring pitch took its energy)
+                del self.open[pitch]
+                continue
+            if note[1] < self.frame_end - self.energy_tol:
+                # it had ended in the last window and was only held for the notes that could still cut it
+                finalize(*self.open.pop(pitch), pitch)
+                continue
+            # an open note whose onset has left the window is not decoded again: follow it on the note activations
+            end, ended = self._follow(output["note"][:, pitch - MIDI_OFFSET], note[1] - frame_offset)
+            note[1] = max(note[1], end + frame_offset)
+            if ended:
+                finalize(*self.open.pop(pitch), pitch)
+
+        finalized.sort()
+        new_notes = self._note_array(finalized, output["contour"], frame_offset)
+        open_notes = self._note_array(sorted((*note, pitch) for pitch, note in self.open.items()))
+        with self._lock:
+            self.frame_end = frame_end
+            self._open_notes = open_notes
+            self._notes = np.concatenate([self._notes, new_notes.notes])
+            if new_notes.bends is not None:
+                self._bends.extend(new_notes.note_bends(i) for i in range(len(new_notes)))
+            self._drop_old_notes()
+        return new_notes
+
+    def _drop_old_notes(self) -> None:
+        """Drop the oldest finalized notes that ended more than history seconds before the end of the stream."""
+        old = self._notes["end"] < stream_frames_to_time(self.frame_end) - self.history
+        n_old = len(old) if old.all() else int(np.argmin(old))
+        if n_old:
+            self._notes = self._notes[n_old:]
+            del self._bends[:n_old]
+            self._dropped += n_old
+
+    def _settled(self, decoded: List[Tuple[int, int, int, float]], n_frames: int) -> set:
+        """The decoded notes that later windows will decode the same, as (start, pitch) in window frames.
+
+        A note that reaches within energy_tol frames of the end of the window may continue. The decoder also zeroes
+        the activations of pitch +-1 from the start of each note it keeps, going backwards in time, so a note that
+        ran into such a note from a later onset ends where it does only as long as that note is kept: if the later
+        note is still unsettled (e.g. a new onset in the next window makes it too short and the decoder drops it),
+        so is this one.
+        """
+        # a note from an onset this close to the end is too short to decode yet, but can cut a note that reaches it
+        settled_end = n_frames - 2 * self.energy_tol - self.min_note_len
+        settled = set()
+        unsettled: List[Tuple[int, int]] = []
+        for start, end, pitch, _ in sorted(decoded, key=lambda note: -note[0]):
+            if end < settled_end and not any(
+                abs(other_pitch - pitch) <= 1 and start < other_start < end + self.energy_tol
+                for other_start, other_pitch in unsettled
+            ):
+                settled.add((start, pitch))
+            else:
+                unsettled.append((start, pitch))
+        return settled
+
+    def _follow(self, activation: np.ndarray, from_idx: int) -> Tuple[int, bool]:
+        """Find where a note that sounds up to from_idx ends, like the onset decoding does: at the first run of
+        energy_tol frames below frame_thresh.
+
+        Returns:
+            The end frame of the note in the window, and whether that run is complete (else the note may continue).
+        """
+        from_idx = max(from_idx, 0)
+        below = activation[from_idx:] < self.frame_thresh
+        runs = np.convolve(below, np.ones(self.energy_tol, dtype=np.int64), mode="valid")
+        ended = np.flatnonzero(runs == self.energy_tol)
+        if len(ended):
+            return from_idx + int(ended[0]), True
+        above = np.flatnonzero(~below)
+        return from_idx + (int(above[-1]) + 1 if len(above) else 0), False
+
+    def _note_array(
+        self, notes: List[Tuple[int, int, int, int]], contours: Optional[np.ndarray] = None, frame_offset: int = 0
+    ) -> NoteArray:
+        """Convert (start frame, end frame, velocity, pitch) tuples into a NoteArray with stream times.
+
+        With the contours of the window starting at frame_offset, the notes that lie entirely in it get pitch bends.
+        """
+        frames = np.array([note[:2] for note in notes], dtype=np.int64).reshape(-1, 2)
+        note_array = np.zeros(len(notes), dtype=NOTE_DTYPE)
+        note_array["start"] = stream_frames_to_time(frames[:, 0])
+        note_array["end"] = stream_frames_to_time(frames[:, 1])
+        note_array["velocity"] = [note[2] for note in notes]
+        note_array["pitch"] = [note[3] for note in notes]
+        if contours is None or not self.include_pitch_bends:
+            return NoteArray(note_array)
+        start_idx = np.maximum(frames[:, 0] - frame_offset, 0)
+        end_idx = np.where(frames[:, 0] >= frame_offset, frames[:, 1] - frame_offset, start_idx)
+        bends, bend_offsets = pitch_bends_flat(contours, start_idx, end_idx, note_array["pitch"])
+        return NoteArray(note_array, bends, bend_offsets)
+
+    def notes_since(self, index: int = 0) -> Tuple[NoteArray, int]:
+        """The finalized notes from the index-th on, for consumers that process the notes incrementally.
+
+        Args:
+            index: The number of notes the consumer has already seen.
+
+        Returns:
+            The new notes in the order they were finalized (without the ones older than history), and the index to
+            pass next time.
+        """
+        with self._lock:
+            start = max(index - self._dropped, 0)
+            notes = self._notes[start:]
+            bends = self._bends[start:] if self.include_pitch_bends else None
+            n = self._dropped + len(self._notes)
+        if bends is None:
+            return NoteArray(notes), n
+        return _with_bends(notes, bends), n
+
+    def recent_notes(self, duration: float) -> NoteArray:
+        """The finalized and open notes sounding in the last duration seconds, sorted by start time.
+
+        Open notes end where they were last decoded and have no pitch bends.
+        """
+        with self._lock:
+            self.history = max(self.history, duration)
+            since = stream_frames_to_time(self.frame_end) - duration
+            keep = self._notes["end"] >= since
+            notes = np.concatenate([self._notes[keep], self._open_notes.notes])
+            if self.include_pitch_bends:
+                bends = [b for b, k in zip(self._bends, keep.tolist()) if k]
+                bends += [np.zeros(0, dtype=np.int64)] * len(self._open_notes)
+        order = np.argsort(notes["start"], kind="stable")
+        if not self.include_pitch_bends:
+            return NoteArray(notes[order])
+        return _with_bends(notes[order], [bends[i] for i in order.tolist()])
+
+
+def _with_bends(notes: np.ndarray, bends: List[np.ndarray]) -> NoteArray:
+    """A NoteArray of notes with the given per-note pitch bends."""
+    bend_offsets = np.concatenate([[0], np.cumsum([len(b) for b in bends], dtype=np.int64)])
+    return NoteArray(notes, np.concatenate(bends + [np.zeros(0, dtype=np.int64)]), bend_offsets)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Streaming inference for the Basic Pitch model on a live audio buffer.
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from basic_pitch_modified.constants import (
+    AUDIO_SAMPLE_RATE,
+    AUDIO_N_SAMPLES,
+    ANNOT_N_FRAMES,
+    FFT_HOP,
+)
+
+# same windowing as inference.run_inference: 30 overlapping frames between consecutive windows
+N_OVERLAPPING_FRAMES = 30
+OVERLAP_LEN = N_OVERLAPPING_FRAMES * FFT_HOP
+HOP_SIZE = AUDIO_N_SAMPLES - OVERLAP_LEN
+N_OLAP = N_OVERLAPPING_FRAMES // 2
+FRAMES_PER_WINDOW = ANNOT_N_FRAMES - 2 * N_OLAP  # frames each window contributes to the unwrapped output
+
+
+def stream_frames_to_samples(frames: Any) -> np.ndarray:
+    """Absolute sample position in the stream of absolute frame indices of StreamingInference outputs.
+
+    Each window contributes FRAMES_PER_WINDOW frames but only advances by HOP_SIZE samples, so frame j of
+    window k is at k * HOP_SIZE + j * FFT_HOP (the window_offset of model_frames_to_time), not at a fixed
+    number of samples per frame.
+    """
+    window_idx, frame_idx = np.divmod(np.asarray(frames, dtype=np.int64), FRAMES_PER_WINDOW)
+    return window_idx * HOP_SIZE + frame_idx * FFT_HOP
+
+
+def stream_samples_to_frames(samples: Any) -> np.ndarray:
+    """The absolute index of the first frame at or after each absolute sample position (see stream_frames_to_samples).
+
+    The frames at positions before a sample position are the ones before the returned index.
+    """
+    window_idx, offset = np.divmod(np.asarray(samples, dtype=np.int64), HOP_SIZE)
+    # the last frames of a window start before the next window does (FRAMES_PER_WINDOW * FFT_HOP > HOP_SIZE)
+    frame_idx = np.minimum(-(-offset // FFT_HOP), FRAMES_PER_WINDOW)
+    return window_idx * FRAMES_PER_WINDOW + frame_idx
+
+
+def stream_frames_to_time(frames: Any) -> np.ndarray:
+    """Time in seconds since the start of the stream of absolute frame indices of StreamingInference outputs."""
+    return stream_frames_to_samples(frames) / AUDIO_SAMPLE_RATE
+
+
+class StreamingInference:
+    """Run the Basic Pitch model on a live stream, only inferring windows that contain new audio.
+
+    Windows are laid out on the absolute sample position of the stream (the number of samples
+    received since it started) rather than on the start of the current buffer, so a window that
+    was complete at the last update produces the same output now. Outputs of complete windows are
+    cached by window index; only windows that contain audio received since the last update are
+    run through the model, so the cost of an update scales with the new audio, not the buffer length.
+
+    Args:
+        model: A loaded Basic Pitch saved model (or anything callable the same way).
+        history_samples: The length of the buffer the posteriorgram is returned for, in samples.
+    """
+
+    def __init__(self, model: Any, history_samples: int = 4 * AUDIO_SAMPLE_RATE) -> None:
+        self.model = model
+        self.history_samples = history_samples
+        self.cache: Dict[int, Dict[str, np.ndarray]] = {}
+        self.frame_offset = 0  # absolute index of the first frame returned by the last update
+        self.windows_inferred = 0
+        self.windows_reused = 0
+
+    @staticmethod
+    def window_start(window_idx: int) -> int:
+        """Absolute sample position of the first sample of a window (the stream is pre-padded by half an overlap)."""
+        return window_idx * HOP_SIZE - OVERLAP_LEN // 2
+
+    def _window_audio(self, window_idx: int, audio: np.ndarray, cursor: int) -> np.ndarray:
+        """Cut a window out of the buffer, zero-filling the parts outside of it."""
+        window = np.zeros(AUDIO_N_SAMPLES, dtype=np.float32)
+        start = self.window_start(window_idx)
+        buffer_start = cursor - len(audio)
+        lo = max(start, buffer_start)
+        hi = min(start + AUDIO_N_SAMPLES, cursor)
+        if hi > lo:
+            window[lo - start : hi - start] = audio[lo - buffer_start : hi - buffer_start]
+        return window
+
+    def _infer(self, windows: List[np.ndarray]) -> Dict[str, np.ndarray]:
+        """Run the model on a batch of windows and strip the overlapping frames."""
+        output = self.model(np.stack(windows)[:, :, np.newaxis])
+        return {k: np.asarray(output[k])[:, N_OLAP:-N_OLAP, :] for k in output}
+
+    def update(self, audio: np.ndarray, cursor: int) -> Dict[str, np.ndarray]:
+        """Run inference on the latest audio.
+
+        Args:
+            audio: The most recent samples of the stream, at AUDIO_SAMPLE_RATE.
+            cursor: The absolute position of the stream just after the last sample of audio.
+
+        Returns:
+            A dictionary with the unwrapped notes, onsets and contours covering the last
+            history_samples of audio, like inference.run_inference_pyaudio. The absolute index
+            of the first frame is stored in frame_offset.
+        """
+        audio = np.asarray(audio, dtype=np.float32)[-self.history_samples :]
+        # frame indices follow the window layout: a fixed ANNOTATIONS_FPS would drift away from it
+        frame_end = int(stream_samples_to_frames(cursor))
+        frame_start = int(stream_samples_to_frames(cursor - len(audio)))
+        first_window = frame_start // FRAMES_PER_WINDOW
+        last_window = max(frame_end - 1, frame_start) // FRAMES_PER_WINDOW
+
+        # drop windows that have left the buffer
+        for window_idx in [k for k in self.cache if k < first_window]:
+            del self.cache[window_idx]
+
+        window_range = range(first_window, last_window + 1)
+        new_windows = [k for k in window_range if k not in self.cache]
+        outputs = dict(self.cache)
+        if new_windows:
+            batch = self._infer([self._window_audio(k, audio, cursor) for k in new_windows])
+            for i, window_idx in enumerate(new_windows):
+                outputs[window_idx] = {key: value[i] for key, value in batch.items()}
+                # windows still waiting for audio are recomputed next time
+                if self.window_start(window_idx) + AUDIO_N_SAMPLES <= cursor:
+                    self.cache[window_idx] = outputs[window_idx]
+        self.windows_inferred += len(new_windows)
+        self.windows_reused += len(window_range) - len(new_windows)
+
+        self.frame_offset = frame_start
+        lo = frame_start - first_window * FRAMES_PER_WINDOW
+        hi = frame_end - first_window * FRAMES_PER_WINDOW
+        return {
+            key: np.concatenate([outputs[k][key] for k in window_range])[lo:hi]
+            for key in outputs[first_window]
+        }
@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+
+'''
+Microbenchmark of the per-callback cost of AudioThreadWithBufferPorted (downmix, gate, int16 conversion, buffering).
+The analysis itself is handed to the analysis worker, so it is not part of the measured cost.
+Usage: python benchmark_callback.py
+'''
+
+CHUNK = 1024
+RATE = 44100
+ITERATIONS = 2000
+
+
+def legacy_callback(thread, in_data):
+    """
+    The callback body before vectorization (Python loop over samples, fresh float64 array per call), kept for comparison.
+    Parameters:
+        thread: the AudioThreadWithBufferPorted to write into
+        in_data: raw interleaved int16 bytes
+    Returns: nothing
+    """
+    numpy_array = np.frombuffer(in_data, dtype=thread.dtype)
+    data = np.zeros(thread.starting_chunk_size, dtype=np.float64)
+    for i in range(0, thread.CHANNELS):
+        data += numpy_array[i:thread.CHUNK * thread.CHANNELS:thread.CHANNELS]
+    data /= np.float64(thread.CHANNELS)
+    audio = data / np.float64(2 ** 15)
+    val_sum = 0.0
+    for val in audio:
+        val_sum += val * val
+    thread.update_input_on(val_sum / len(audio))
+    thread.audio_buffer.write(thread.dtype(data))
+
+
+def time_per_call(func, iterations):
+    """
+    Returns the mean wall time of func() in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    print(f"chunk={CHUNK} samples, rate={RATE} Hz, budget per callback={CHUNK / RATE * 1e6:.0f} us")
+    print(f"{'channels':>8} {'legacy (us)':>12} {'vectorized (us)':>16}")
+    for channels in (1, 2, 8):
+        thread = AudioThreadWithBufferPorted(name="bench", rate=RATE, starting_chunk_size=CHUNK,
+                                             process_func=None, analysis_hop=1.0, channels=channels)
+        in_data = (np.random.randn(CHUNK * channels) * 3000).astype(np.int16).tobytes()
+        legacy = time_per_call(lambda: legacy_callback(thread, in_data), ITERATIONS // 10)
+        vectorized = time_per_call(lambda: thread.callback(in_data, CHUNK, None, 0), ITERATIONS)
+        print(f"{channels:>8} {legacy:>12.1f} {vectorized:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import time
+import pathlib
+import numpy as np
+import scipy.signal
+from basic_pitch_modified.note_creation import (output_to_notes_polyphonic, get_infered_onsets, _onsets_to_notes,
+                                                _onsets_to_notes_vectorized, _melodia_notes)
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent / "tests"))
+from test_note_creation import synthetic_posteriorgram, argmax_melodia_notes
+
+'''
+Microbenchmark of decoding Basic Pitch posteriorgrams into notes (output_to_notes_polyphonic),
+comparing the frame-by-frame onset scan with the vectorized one on dense, piano-like material.
+Both the onset decoding stage alone and the whole function (without the melodia trick) are timed,
+followed by the melodia trick with a full argmax per note against the sorted-peak version.
+Usage: python benchmark_note_creation.py
+'''
+
+ITERATIONS = 20
+
+
+def time_per_call(func, iterations):
+    """
+    Returns the mean wall time of func() in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e3
+
+
+def main():
+    print(f"{'frames':>6} {'notes':>6} {'decoded':>8} {'stage: loop / vectorized (ms)':>30} "
+          f"{'total: loop / vectorized (ms)':>30}")
+    for n_frames, n_notes in ((344, 60), (344, 200), (1720, 1000)):
+        frames, onsets = synthetic_posteriorgram(0, n_frames=n_frames, n_notes=n_notes)
+
+        def decode(vectorized):
+            return output_to_notes_polyphonic(frames.copy(), onsets.copy(), onset_thresh=0.5, frame_thresh=0.3,
+                                              min_note_len=11, infer_onsets=True, max_freq=None, min_freq=None,
+                                              melodia_trick=False, vectorized=vectorized)
+
+        # the onsets the decoding stage starts from, as output_to_notes_polyphonic finds them
+        inferred = get_infered_onsets(onsets.copy(), frames)
+        peaks = scipy.signal.argrelmax(inferred, axis=0)
+        peak_thresh_mat = np.zeros(inferred.shape)
+        peak_thresh_mat[peaks] = inferred[peaks]
+        onset_time_idx, onset_freq_idx = (idx[::-1] for idx in np.where(peak_thresh_mat >= 0.5))
+
+        def decode_stage(func):
+            return func(frames, frames.astype(np.float64), onset_time_idx, onset_freq_idx, 0.3, 11, 11)
+
+        n_decoded = len(decode(False))
+        stage_loop = time_per_call(lambda: decode_stage(_onsets_to_notes), ITERATIONS)
+        stage_vectorized = time_per_call(lambda: decode_stage(_onsets_to_notes_vectorized), ITERATIONS)
+        loop = time_per_call(lambda: decode(False), ITERATIONS)
+        vectorized = time_per_call(lambda: decode(True), ITERATIONS)
+        print(f"{n_frames:>6} {n_notes:>6} {n_decoded:>8} {stage_loop:>14.2f} / {stage_vectorized:<13.2f} "
+              f"{loop:>14.2f} / {vectorized:<13.2f}")
+
+    print(f"\n{'frames':>6} {'notes':>6} {'melodia notes':>14} {'argmax (ms)':>12} {'sorted peaks (ms)':>18}")
+    for n_frames, n_notes in ((344, 60), (1720, 1000)):
+        frames, _ = synthetic_posteriorgram(0, n_frames=n_frames, n_notes=n_notes)
+        n_melodia = len(_melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11))
+        argmax = time_per_call(lambda: argmax_melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11), 3)
+        ordered = time_per_call(lambda: _melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11), 3)
+        print(f"{n_frames:>6} {n_notes:>6} {n_melodia:>14} {argmax:>12.1f} {ordered:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
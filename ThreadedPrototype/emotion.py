@@ -3,14 +3,17 @@ import math
 import numpy as np
 import time
 import os
-import tensorflow as tf
-from tensorflow import keras
 import threading
 import joblib
-from keras import backend as K
+from versioned import VersionedValue
+from silence_gate import SILENCE
+from model_registry import MODELS
+from startup import STARTUP, lazy_import
+from feature_routing import FeatureRouter
 
 
 def custom_activation(x):
+    K = lazy_import("keras.backend")
     return (K.sigmoid(x) * 8) + 1
 
 
@@ -20,6 +23,13 @@ MODEL_EXT = "model"
 SELECTOR_EXT = "selector"
 FEATURES_DIR = "utils"
 
+MODELS.register("valence_selector", lambda: joblib.load(f"{FEATURES_DIR}/fcnn_valence_lb.{SELECTOR_EXT}"))
+MODELS.register("arousal_selector", lambda: joblib.load(f"{FEATURES_DIR}/fcnn_arousal_lb.{SELECTOR_EXT}"))
+MODELS.register("valence_regressor", lambda: joblib.load(f"{FEATURES_DIR}/valence_svm.{MODEL_EXT}"))
+MODELS.register("arousal_regressor", lambda: joblib.load(f"{FEATURES_DIR}/arousal_svm.{MODEL_EXT}"))
+# the models the emotion thread needs before it comes online
+EMOTION_MODELS = ("valence_selector", "arousal_selector", "valence_regressor", "arousal_regressor")
+
 """
 This thread is responsible for reading the Basic Pitch data from the SinglePyAudio thread (SPA), and storing VA values in self.emo_values.
 """
@@ -39,23 +49,54 @@ class EmotionClassificationThreadSPA(threading.Thread):
         self.name = name
         self.stop_request = False
         self.SPA_Thread = SPA_Thread
-        self.emo_values = None
-        self.valence_selector = joblib.load(f"{FEATURES_DIR}/fcnn_valence_lb.{SELECTOR_EXT}")
-        self.arousal_selector = joblib.load(f"{FEATURES_DIR}/fcnn_arousal_lb.{SELECTOR_EXT}")
+        self.results = VersionedValue()     # versioned (valence, arousal) values
+        if SPA_Thread is not None:
+            SPA_Thread.results.add_consumer(self.name, self.results)
         self.average_count = 0
         self.average = [0.0, 0.0]
+        self.router = None      # routes the audio thread's openSMILE features to the selected model inputs
 
         # self.valence_selector = joblib.load(f"{FEATURES_DIR}/svm_valence.{SELECTOR_EXT}")
         # self.arousal_selector = joblib.load(f"{FEATURES_DIR}/svm_arousal.{SELECTOR_EXT}")
 
-        self.valence_regressor = joblib.load(f"{FEATURES_DIR}/valence_svm.{MODEL_EXT}")
-        self.arousal_regressor = joblib.load(f"{FEATURES_DIR}/arousal_svm.{MODEL_EXT}")
+        # the selectors and regressors come from the model registry, loaded on first use
         #print(f"{MODEL_DIR}/valence{BOUNDED}.{MODEL_EXT}")
         #self.valence_regressor = keras.models.load_model(
         #    f"./{MODEL_DIR}/valence{BOUNDED}.{MODEL_EXT}")  # , custom_objects={'custom_activation':custom_activation})
         #self.arousal_regressor = keras.models.load_model(
         #    f"./{MODEL_DIR}/arousal{BOUNDED}.{MODEL_EXT}")  # , custom_objects={'custom_activation':custom_activation})
 
+    @property
+    def valence_selector(self):
+        return MODELS.get("valence_selector")
+
+    @property
+    def arousal_selector(self):
+        return MODELS.get("arousal_selector")
+
+    @property
+    def valence_regressor(self):
+        return MODELS.get("valence_regressor")
+
+    @property
+    def arousal_regressor(self):
+        return MODELS.get("arousal_regressor")
+
+    def feature_router(self):
+        """
+        Returns: the FeatureRouter of the valence and arousal inputs for the audio thread's feature layout,
+        built once (and again if the layout changes)
+        """
+        layout = self.SPA_Thread.smile_layout
+        if self.router is None or (layout is not None and self.router.layout is not layout):
+            self.router = FeatureRouter.from_selectors(layout, {"valence_selector": self.valence_selector,
+                                                                "arousal_selector": self.arousal_selector})
+        return self.router
+
+    @property
+    def emo_values(self):
+        return self.results.value
+
     def transform_num(self, num):
         output = num
         output -= 0.5
@@ -76,12 +117,29 @@ class EmotionClassificationThreadSPA(threading.Thread):
 
     def run(self):
         time.sleep(3)
+        # the models load in the background while the other stages start; this stage is online once they are ready
+        for model in EMOTION_MODELS:
+            MODELS.get(model)
+        STARTUP.mark("online", self.name)
+        seq = 0
         while not self.stop_request:
-            if not (self.SPA_Thread is None or self.SPA_Thread.data is None):
-                _, smile_features = self.SPA_Thread.data
-
-                va_feats = self.valence_selector.transform(smile_features)
-                ar_feats = self.arousal_selector.transform(smile_features)
+            if self.SPA_Thread is None:
+                time.sleep(1)
+                continue
+            # block until the audio thread publishes a result we have not processed yet
+            new_seq, timestamp, data = self.SPA_Thread.results.wait_newer(seq, timeout=1.0)
+            if new_seq == seq:
+                continue
+            seq = new_seq
+            # the emotion values are kept while the input is silent
+            if data is not None and data is not SILENCE:
+                _, smile_features = data
+
+                # gather the selected features of each model into reused buffers (no selector.transform())
+                router = self.feature_router()
+                router.update(smile_features)
+                va_feats = router.model_input("valence_selector")
+                ar_feats = router.model_input("arousal_selector")
 
                 # if not (opensmile_arousal_features is None or opensmile_valence_features is None):
                 #    print("Emo data found at thread level")
@@ -106,10 +164,7 @@ class EmotionClassificationThreadSPA(threading.Thread):
                 # if v_val is None or a_val is None:
                 #    print("prediction bad")
 
-                self.emo_values = (v_val, a_val)
-
-                if self.emo_values is None:
-                    print("bad data val")
+                self.results.publish((v_val, a_val), timestamp=timestamp)
 
                 # print(self.emo_values)
-            time.sleep(0.2)
+            self.SPA_Thread.results.consumed(self.name, seq)
@@ -0,0 +1,64 @@
+import numpy as np
+from smile_layout import SmileLayout
+
+'''
+This class routes the features the audio thread extracts to the models that take them. The integer columns of
+every model's input are worked out once from the feature selectors (through a SmileLayout); after that, the
+openSMILE features and the extra (MIDI) features are copied into one preallocated feature vector, and every model
+input is gathered from it with np.take into a buffer that is reused on every update. Unlike selector.transform()
+and np.concatenate, this does no sklearn input validation and allocates nothing in the loop.
+Every consumer thread uses its own FeatureRouter, since the buffers are reused.
+'''
+
+
+class FeatureRouter:
+    def __init__(self, layout, names=None):
+        """
+        Initializes a FeatureRouter.
+        Parameters:
+            layout: the SmileLayout of the features the audio thread extracts
+            names: the names of the selectors whose model inputs are routed, all of the layout's by default
+        Returns: nothing
+        """
+        self.layout = layout
+        self.names = list(layout.supports) if names is None else list(names)
+        self.n_smile = len(layout)
+        self.n_extra = max([int(layout.extra_columns[name].max(initial=-1)) + 1 for name in self.names] + [0])
+        # the openSMILE features followed by the extra features
+        self.features = np.zeros((1, self.n_smile + self.n_extra))
+        self.routes = {name: np.concatenate([layout.columns[name], self.n_smile + layout.extra_columns[name]])
+                       for name in self.names}
+        self.buffers = {name: np.empty((1, len(route))) for name, route in self.routes.items()}
+
+    @classmethod
+    def from_selectors(cls, layout, selectors):
+        """
+        Parameters:
+            layout: the SmileLayout of the features the audio thread extracts, or None if it extracts all
+                openSMILE features
+            selectors: the feature selectors to route the model inputs of, by name
+        Returns: a FeatureRouter for the selectors
+        """
+        if layout is None:
+            layout = SmileLayout.from_selectors(selectors, reduced=False)
+        return cls(layout, names=list(selectors))
+
+    def update(self, smile_features, extra=None):
+        """
+        Copies new features into the feature vector.
+        Parameters:
+            smile_features: a numpy array of shape (1, len(layout)) laid out by the layout
+            extra: a numpy array of shape (1, number of extra features), or None to keep the previous ones
+        Returns: nothing
+        """
+        np.copyto(self.features[:, :self.n_smile], smile_features)
+        if extra is not None and self.n_extra:
+            np.copyto(self.features[:, self.n_smile:], extra[:, :self.n_extra])
+
+    def model_input(self, name):
+        """
+        Gathers the input of a model from the feature vector.
+        Parameters: name: the name of the model's selector
+        Returns: a numpy array of shape (1, number of selected features), overwritten by the next call
+        """
+        return np.take(self.features, self.routes[name], axis=1, out=self.buffers[name])
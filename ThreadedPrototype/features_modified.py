@@ -1,94 +1,58 @@
-import tensorflow as tf
-import opensmile
+from pathlib import Path
 from AudioThreadWithBufferPorted import *
-from basic_pitch_modified.inference import predict_pyaudio
+from versioned import VersionedValue
+from silence_gate import SilenceGate, SILENCE
+from midi_features import get_midi_features
 from basic_pitch_modified import ICASSP_2022_MODEL_PATH
+from basic_pitch_modified.constants import AUDIO_SAMPLE_RATE
+from basic_pitch_modified.streaming import StreamingInference
+from basic_pitch_modified.note_tracking import StreamingNoteTracker
+from basic_pitch_modified.backends import load_model
+from model_registry import MODELS
+from startup import STARTUP, lazy_import
+from streaming_smile import StreamingSmile
+from smile_layout import SmileLayout, verification_signal, verify_layout
 
-BASIC_PITCH_MODEL = tf.saved_model.load(str(ICASSP_2022_MODEL_PATH))
 
-'''
-This class is a thread class that predicts the genre of input notes in real time.
-'''
+def load_basic_pitch(model_path):
+    """
+    Loads a Basic Pitch model ready for live inference. Converted models (.tflite / .onnx) run on the TFLite /
+    ONNX Runtime CPU backends, which need no tracing; a SavedModel gets fixed batch shapes, traced before the show
+    starts, so inference never stalls on retracing.
+    Parameters: model_path: a SavedModel directory or a converted .tflite / .onnx file
+    Returns: the model
+    """
+    if Path(model_path).suffix in (".tflite", ".onnx"):
+        print("Basic Pitch backend:", model_path)
+        return load_model(model_path)
+    BucketedModel = lazy_import("basic_pitch_modified.bucketed").BucketedModel
+    basic_pitch_model = BucketedModel(load_model(model_path))
+    basic_pitch_model.warm_up()
+    print("Basic Pitch warm-up:", basic_pitch_model.report())
+    return basic_pitch_model
 
 
-class ModifiedMIDIFeatureThread(threading.Thread):
-    def get_midi_features(midi_obj):
-        """
-        Extracts specific features from a PrettyMIDI object given its path using the pretty_midi library.
-        Handle any potential errors with MIDI files appropriately.
+def basic_pitch_model_name(model_path=None):
+    """
+    Registers a Basic Pitch model in the model registry.
+    Parameters: model_path: the model to load, defaults to the ICASSP 2022 SavedModel
+    Returns: the name the model is registered as
+    """
+    if model_path is None:
+        return "basic_pitch"
+    name = f"basic_pitch:{model_path}"
+    MODELS.register(name, lambda: load_basic_pitch(model_path))
+    return name
 
-        Parameters:
-            midi_obj: the PrettyMIDI object
 
-        Returns:
-            list of float: The extracted features.
-        """
-        # tempo: the estimated tempo of the audio file
-        try:
-            tempo = midi_obj.estimate_tempo()
-        except ValueError:
-            tempo = 120
-
-        # num_sig_changes: the number of time signature changes in the audio file
-        num_sig_changes = len(midi_obj.time_signature_changes)
-
-        # resolution: the time resolution of the audio file (in ticks per beat)
-        resolution = midi_obj.resolution
-
-        # Extract time signature information
-        ts_changes = midi_obj.time_signature_changes
-        ts_1, ts_2 = 4, 4
-        if len(ts_changes) > 0:
-            ts_1 = ts_changes[0].numerator
-            ts_2 = ts_changes[0].denominator
-
-        # Extract melody-related features
-        # melody: a pitch class histogram of the audio file
-        melody = midi_obj.get_pitch_class_histogram()
-        # melody_complexity: the number of unique pitch classes in the melody
-        melody_complexity = np.sum(melody > 0)
-        # melody_range: the range of pitch classes in the melody
-        melody_range = np.max(melody) - np.min(melody)
-        # chroma: a chroma representation of the audio file
-        chroma = midi_obj.get_chroma()
-        # pitch_class_hist: the sum of the chroma matrix along the pitch axis
-        pitch_class_hist = np.sum(chroma, axis=1)
-
-        features = ModifiedMIDIFeatureThread.normalize_features([tempo, num_sig_changes, resolution, ts_1,
-                                                                 ts_2, melody_complexity, melody_range] + list(
-            pitch_class_hist))
-
-        features = np.asarray(features)
-        features = np.expand_dims(features, axis=0)
-
-        return features
-
-    def normalize_features(features):
-        """
-        Normalizes the features to the range [-1, 1].
+MODELS.register("basic_pitch", lambda: load_basic_pitch(ICASSP_2022_MODEL_PATH))
 
-        Parameters:
-            features (list of float): The array of features.
+'''
+This class is a thread class that predicts the genre of input notes in real time.
+'''
 
-        Returns:
-            list of float: Normalized features.
-        """
-        # Normalize each feature based on its specific range
-        tempo = (features[0] - 150) / 300
-        num_sig_changes = (features[1] - 2) / 10
-        resolution = (features[2] - 260) / 400
-        time_sig_1 = (features[3] - 3) / 8
-        time_sig_2 = (features[4] - 3) / 8
-        melody_complexity = (features[5] - 0) / 10
-        melody_range = (features[6] - 0) / 80
-
-        # Normalize pitch class histogram
-        pitch_class_hist = [((f - 0) / 100) for f in features[7:-1]]
-
-        # Return the normalized feature vector
-        return [tempo, num_sig_changes, resolution, time_sig_1, time_sig_2, melody_complexity,
-                melody_range] + pitch_class_hist
 
+class ModifiedMIDIFeatureThread(threading.Thread):
     """
     This function is called when a GenrePredictorThread is created. It sets the BasicPitchThread to grab MIDI data from.
     Parameters:
@@ -101,59 +65,155 @@ class ModifiedMIDIFeatureThread(threading.Thread):
         super(ModifiedMIDIFeatureThread, self).__init__()
         self.SinglePyAudioThread = SinglePyAudioThread
         self.name = name
-        self.midi_features = None
+        self.results = VersionedValue()     # versioned MIDI features
         self.stop_request = False
+        SinglePyAudioThread.results.add_consumer(self.name, self.results)
+
+    @property
+    def midi_features(self):
+        return self.results.value
 
     """
-    When the thread is started, this function is called which repeatedly grabs the most recent
-    MIDI data from the BasicPitchThread, predicts its genre, and stores it in the data field.
+    When the thread is started, this function is called which waits for each new result of the
+    SinglePyAudioThread, extracts its MIDI features, and publishes them in the results field.
     Parameters: nothing
     Returns: nothing
     """
 
     def run(self):
+        seq = 0
         while not self.stop_request:
-            if not self.SinglePyAudioThread.data is None:
-                midi_data, _ = self.SinglePyAudioThread.data
-                if (not midi_data is None) and (len(midi_data.instruments) != 0):
-                    self.midi_features = ModifiedMIDIFeatureThread.get_midi_features(midi_data)
-                time.sleep(0.2)
-            else:
-                time.sleep(1)
+            # block until the audio thread publishes a result we have not processed yet
+            new_seq, timestamp, data = self.SinglePyAudioThread.results.wait_newer(seq, timeout=1.0)
+            if new_seq == seq:
+                continue
+            seq = new_seq
+            if data is not None and data is not SILENCE:
+                note_array, _ = data
+                if (not note_array is None) and (len(note_array) != 0):
+                    # the PrettyMIDI features of note_array.to_midi(), without building the PrettyMIDI object
+                    features = np.expand_dims(get_midi_features(note_array), axis=0)
+                    self.results.publish(features, timestamp=timestamp)
+            self.SinglePyAudioThread.results.consumed(self.name, seq)
 
 
 class SinglePyAudioThread(AudioThreadWithBufferPorted):
-    basic_pitch_model = tf.saved_model.load(str(ICASSP_2022_MODEL_PATH))
-
     def process(self, signal):
         if np.shape(signal)[0] < 4096:
             return None
-
-        _, midi_data, _ = predict_pyaudio(
-            signal,
-            SinglePyAudioThread.basic_pitch_model
-        )
+        if self.basic_pitch_stream is None:
+            self.load_analysis()
+
+        # signal and the resampled audio are copies of the buffers that end after the same chunk, so the notes and
+        # the openSMILE features describe the same audio
+        snapshot = self.analysis_snapshot
+
+        # Basic Pitch runs at its native rate on the incrementally resampled buffer,
+        # and only on the windows that contain audio received since the last update
+        model_output = self.basic_pitch_stream.update(snapshot.resampled, snapshot.resampled_cursor)
+        # notes that span several updates are carried over instead of being decoded again from scratch;
+        # consumers that want every note exactly once read self.note_tracker.notes_since()
+        self.note_tracker.update(model_output, self.basic_pitch_stream.frame_offset)
+        # notes as compact arrays; a PrettyMIDI object is only built by consumers that need one (note_array.to_midi())
+        note_array = self.note_tracker.recent_notes(self.pred_length)
 
         # get smile features
-        smile_feats = self.smile.process_signal(signal, self.RATE)
-        # convert from df to list
-        smile_feats = smile_feats.values.tolist()
-        # convert from 2d list to 1d list
-        smile_feats = sum(smile_feats, [])
-        # convert to numpy array
-        smile_feats = np.asarray(smile_feats).reshape(
-            (1, 988))  # there are 988 emobase features. 1 row = 1 audio clip, each column is a feature
-
-        return (midi_data, smile_feats)
+        if self.smile_stream is not None:
+            # emobase LLDs of the new audio only, with the functionals of the buffer maintained incrementally
+            smile_feats = self.smile_stream.update(signal, snapshot.cursor)
+        else:
+            # openSMILE takes samples in [-1, 1], like the audio files the models were trained on
+            smile_feats = self.smile.process_signal(np.asarray(signal, dtype=np.float32) / 2 ** 15, self.RATE)
+            # convert from df to list
+            smile_feats = smile_feats.values.tolist()
+            # convert from 2d list to 1d list
+            smile_feats = sum(smile_feats, [])
+            # convert to numpy array
+            smile_feats = np.asarray(smile_feats).reshape(
+                (1, -1))  # 988 emobase features. 1 row = 1 audio clip, each column is a feature
+
+        return (note_array, smile_feats)
+
+    def load_analysis(self):
+        """
+        Sets up Basic Pitch and openSMILE when the analysis first runs, so the audio thread captures audio while
+        the models load; the stage is online once this returns.
+        Parameters: nothing
+        Returns: nothing
+        """
+        # loaded once per process through the model registry (and possibly preloaded in the background)
+        self.basic_pitch_compiled = MODELS.get(self.basic_pitch_model_name)
+        if self.streaming_smile and self.F_SET is None and self.F_LEVEL is None:
+            # the emobase functionals, updated incrementally: all 988, or only the ones the selectors keep
+            try:
+                self.smile_layout = self.load_smile_layout()
+            except ValueError as e:
+                print(f"{e}; running openSMILE on the whole buffer instead")
+                self.smile_layout = None
+            else:
+                features = None if self.smile_layout is None else self.smile_layout.indices
+                self.smile_stream = StreamingSmile(sampling_rate=self.RATE, window_seconds=self.pred_length,
+                                                   features=features)
+        if self.smile_stream is None:
+            opensmile = lazy_import("opensmile")
+            self.smile = opensmile.Smile(
+                feature_set=opensmile.FeatureSet.emobase if self.F_SET is None else self.F_SET,
+                feature_level=opensmile.FeatureLevel.Functionals if self.F_LEVEL is None else self.F_LEVEL,
+                sampling_rate=44100,
+            )
+        self.basic_pitch_stream = StreamingInference(self.basic_pitch_compiled,
+                                                     history_samples=4 * AUDIO_SAMPLE_RATE)
+        STARTUP.mark("online", self.name)
+
+    def load_smile_layout(self):
+        """
+        Lays out the reduced openSMILE extraction of the feature selectors, and verifies it against openSMILE.
+        Parameters: nothing
+        Returns: the SmileLayout, or None without feature selectors
+        Raises: ValueError if the model inputs of the reduced extraction do not match openSMILE's
+        """
+        if not self.feature_selectors:
+            return None
+        selectors = {name: MODELS.get(name) for name in self.feature_selectors}
+        layout = SmileLayout.from_selectors(selectors)
+        compared = verify_layout(layout, selectors, verification_signal(self.RATE), self.RATE)
+        print(f"Reduced openSMILE extraction: {len(layout)} of {layout.n_features} features "
+              f"(verified against openSMILE, {compared} model inputs)")
+        return layout
 
     def __init__(self, name, starting_chunk_size,
-                 F_SET=opensmile.FeatureSet.emobase,
-                 F_LEVEL=opensmile.FeatureLevel.Functionals):
-        self.smile = opensmile.Smile(
-            feature_set=F_SET,
-            feature_level=F_LEVEL,
-            sampling_rate=44100,
-        )
+                 F_SET=None,
+                 F_LEVEL=None,
+                 analysis_hop=0.25,
+                 replay=None,
+                 basic_pitch_model_path=None,
+                 include_pitch_bends=True,
+                 silence_timeout=2.0,
+                 feature_selectors=None,
+                 streaming_smile=False):
+        # PrettyMIDI.get_chroma applies pitch bends, so the MIDI features use them; turn off to skip estimating them
+        self.include_pitch_bends = include_pitch_bends
+        # openSMILE's feature set and level, emobase functionals by default
+        self.F_SET = F_SET
+        self.F_LEVEL = F_LEVEL
+        # compute the emobase functionals incrementally with StreamingSmile instead of openSMILE on the whole buffer;
+        # close to openSMILE except for the named start-up differences (see streaming_smile.opensmile_mismatches),
+        # which include features the models select, so it is opt-in
+        self.streaming_smile = streaming_smile
+        self.basic_pitch_model_name = basic_pitch_model_name(basic_pitch_model_path)
+        # registry names of the selectors of the models that take the openSMILE features; with streaming_smile, only
+        # the features they keep are extracted, laid out by self.smile_layout (None: all of them, in openSMILE's order)
+        self.feature_selectors = feature_selectors
+        self.smile_layout = None
+        # set up by load_analysis() on the first analysis run
+        self.basic_pitch_compiled = None
+        self.basic_pitch_stream = None
+        self.smile = None
+        self.smile_stream = None
+        self.note_tracker = StreamingNoteTracker(include_pitch_bends=include_pitch_bends)
 
         super().__init__(name, rate=44100, starting_chunk_size=starting_chunk_size, process_func=self.process,
-                         args_before=(), args_after=())
+                         args_before=(), args_after=(), analysis_hop=analysis_hop,
+                         replay=replay, resample_rate=AUDIO_SAMPLE_RATE,
+                         # no Basic Pitch / openSMILE on silence between movements; None analyses everything
+                         silence_gate=None if silence_timeout is None else SilenceGate(silence_timeout))
@@ -1,16 +1,24 @@
 import numpy as np
-import pretty_midi
-import tensorflow as tf
-import opensmile
 import joblib
 import time
 import threading
+from versioned import VersionedValue
+from silence_gate import SILENCE
+from model_registry import MODELS
+from startup import STARTUP, lazy_import
+from feature_routing import FeatureRouter
 
 MODEL_DIR = "utils"
 MODEL_EXT = "keras"
 SELECTOR_EXT = "selector"
 FEATURES_DIR = "utils"
 
+MODELS.register("genre_selector", lambda: joblib.load(f"{FEATURES_DIR}/genre_features.{SELECTOR_EXT}"))
+MODELS.register("genre_model",
+                lambda: lazy_import("tensorflow").keras.models.load_model(f"{MODEL_DIR}/genre_model.{MODEL_EXT}"))
+# the models the genre thread needs before it comes online
+GENRE_MODELS = ("genre_selector", "genre_model")
+
 def get_subgenre(num):
     genre_list = ['20th Century', 'Romantic', 'Classical', 'Baroque']
     return genre_list[num]
@@ -33,28 +41,61 @@ class ModifiedGenrePredictorThread(threading.Thread):
         self.name = name
         self.MF_Thread = MF_Thread
         self.SPA_Thread = SPA_Thread
-        self.genre_output = None
+        self.results = VersionedValue()     # versioned subgenre names
         self.stop_request = False
+        MF_Thread.results.add_consumer(self.name, self.results)
+        self.router = None      # routes the openSMILE and MIDI features to the selected model input
+
+    @property
+    def selector(self):
+        return MODELS.get("genre_selector")
+
+    @property
+    def genre_model(self):
+        return MODELS.get("genre_model")
+
+    def feature_router(self):
+        """
+        Returns: the FeatureRouter of the genre model's input for the audio thread's feature layout,
+        built once (and again if the layout changes)
+        """
+        layout = self.SPA_Thread.smile_layout
+        if self.router is None or (layout is not None and self.router.layout is not layout):
+            self.router = FeatureRouter.from_selectors(layout, {"genre_selector": self.selector})
+        return self.router
 
-        self.selector = joblib.load(f"{FEATURES_DIR}/genre_features.{SELECTOR_EXT}")
-        self.genre_model = tf.keras.models.load_model(f"{MODEL_DIR}/genre_model.{MODEL_EXT}")
+    @property
+    def genre_output(self):
+        return self.results.value
     
     """
-    When the thread is started, this function is called which repeatedly grabs the most recent
-    MIDI data from the BasicPitchThread, predicts its genre, and stores it in the data field.
+    When the thread is started, this function is called which waits for each new set of
+    MIDI features, predicts its genre, and publishes it in the results field.
     Parameters: nothing
     Returns: nothing
     """
     def run(self):
+        # the models load in the background while the other stages start; this stage is online once they are ready
+        for model in GENRE_MODELS:
+            MODELS.get(model)
+        STARTUP.mark("online", self.name)
+        seq = 0
         while not self.stop_request:
-            if not (self.MF_Thread.midi_features is None or self.SPA_Thread.data is None):
-                _, smile_features = self.SPA_Thread.data
-                midi_features = self.MF_Thread.midi_features
+            # block until the MIDI feature thread publishes features we have not processed yet
+            new_seq, timestamp, midi_features = self.MF_Thread.results.wait_newer(seq, timeout=1.0)
+            if new_seq == seq:
+                continue
+            seq = new_seq
+            spa_data = self.SPA_Thread.data
+            if not (midi_features is None or spa_data is None or spa_data is SILENCE):
+                _, smile_features = spa_data
                 
-                audio_features = np.concatenate((smile_features, midi_features), axis=1)
-                audio_features = self.selector.transform(audio_features)
+                # gather the selected openSMILE and MIDI features into a reused buffer (no concatenate / transform())
+                router = self.feature_router()
+                router.update(smile_features, extra=midi_features)
+                audio_features = router.model_input("genre_selector")
                 
                 subgenre_num = self.genre_model.predict(audio_features)
-                self.genre_output = get_subgenre(np.argmax(subgenre_num))
-            time.sleep(0.5)
+                self.results.publish(get_subgenre(np.argmax(subgenre_num)), timestamp=timestamp)
+            self.MF_Thread.results.consumed(self.name, seq)
             
\ No newline at end of file
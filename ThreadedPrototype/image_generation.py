@@ -1,14 +1,11 @@
-from diffusers import DiffusionPipeline, DPMSolverMultistepScheduler, StableDiffusionImg2ImgPipeline
-import torch
-from realesrgan import RealESRGANer
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from basicsr.utils.download_util import load_file_from_url
 import numpy
 from PIL import Image
 import threading
 import prompting
 import time
 import numpy as np
+from model_registry import MODELS
+from startup import STARTUP, lazy_import
 
 DEFAULT_NEGATIVE_PROMPT = "ugly, tiling, poorly drawn hands, poorly drawn feet, poorly drawn face, out of frame, mutation, mutated, extra limbs, extra legs, extra arms, disfigured, deformed, cross-eye, body out of frame, blurry, bad art, bad anatomy, blurred, text, watermark, grainy, low resolution, cropped, beginner, amateur, oversaturated"
 MODEL_ID = "stabilityai/stable-diffusion-2-1-base"
@@ -23,12 +20,14 @@ def get_pipe(img2img):
     Returns:
         pipe: pipeline object
     """
+    torch = lazy_import("torch")
+    diffusers = lazy_import("diffusers")
     if (img2img):
-        pipe = StableDiffusionImg2ImgPipeline.from_pretrained(IMG2IMG_ID, torch_dtype=torch.float16)
+        pipe = diffusers.StableDiffusionImg2ImgPipeline.from_pretrained(IMG2IMG_ID, torch_dtype=torch.float16)
     else:
-        pipe = DiffusionPipeline.from_pretrained(MODEL_ID, torch_dtype=torch.float16, revision="fp16")
+        pipe = diffusers.DiffusionPipeline.from_pretrained(MODEL_ID, torch_dtype=torch.float16, revision="fp16")
 
-    pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+    pipe.scheduler = diffusers.DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
     pipe = pipe.to("cuda")
 
     return pipe
@@ -44,6 +43,9 @@ def get_upsampler(model_str='x2'):
     Returns:
     upsampler object
     """
+    RRDBNet = lazy_import("basicsr.archs.rrdbnet_arch").RRDBNet
+    load_file_from_url = lazy_import("basicsr.utils.download_util").load_file_from_url
+    RealESRGANer = lazy_import("realesrgan").RealESRGANer
     if (model_str == 'x2'):
         model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=2)
         netscale = 2
@@ -57,6 +59,22 @@ def get_upsampler(model_str='x2'):
     return upsampler
 
 
+MODELS.register("diffusion_pipe", lambda: get_pipe(img2img=False))
+MODELS.register("diffusion_pipe_img2img", lambda: get_pipe(img2img=True))
+MODELS.register("upsampler_x2", lambda: get_upsampler('x2'))
+MODELS.register("upsampler_x4", lambda: get_upsampler('x4'))
+
+
+def image_models(img2img=False, upsampler_model_str='x2'):
+    """
+    Parameters:
+        img2img: whether the image-to-image pipeline is used
+        upsampler_model_str (str): x2 or x4
+    Returns: the registry names of the diffusion pipeline and the upsampler the image thread needs
+    """
+    return ("diffusion_pipe_img2img" if img2img else "diffusion_pipe"), f"upsampler_{upsampler_model_str}"
+
+
 '''
 This class is a thread class that generates images procedurally in real time.
 '''
@@ -90,10 +108,13 @@ class ImageGenerationThread(threading.Thread):
         super(ImageGenerationThread, self).__init__()
         self.name = name
         self.img2img = img2img
-        self.pipe = get_pipe(self.img2img)
+        # the pipeline and upsampler load through the model registry, possibly in the background; run() waits for them
+        self.pipe = None
         self.seed = seed
         self.strength = strength
         self.Prompt_Thread = Prompt_Thread
+        if Prompt_Thread is not None:
+            Prompt_Thread.results.add_consumer(self.name)
         self.negative_prompt = DEFAULT_NEGATIVE_PROMPT
         self.inference = inference
         self.guidance_scale = guidance_scale
@@ -101,15 +122,10 @@ class ImageGenerationThread(threading.Thread):
         self.audio_thread = audio_thread
         self.blank_image = blank_image
 
-        if seed is None:
-            self.generator = torch.Generator("cuda")
-        else:
-            self.generator = torch.Generator("cuda").manual_seed(seed)
+        self.generator = None
 
         self.upsampler_model_str = upsampler_model_str
         self.upsampler = upsampler
-        if self.upsampler == None:
-            self.upsampler = get_upsampler(upsampler_model_str)
         self.output = blank_image
         self.uninit = True
         self.display_func = display_func
@@ -127,8 +143,28 @@ class ImageGenerationThread(threading.Thread):
     Returns: nothing
     """
 
+    def load_models(self):
+        """
+        Gets the diffusion pipeline and the upsampler from the model registry and creates the seeded generator.
+        Parameters: nothing
+        Returns: nothing
+        """
+        pipe_name, upsampler_name = image_models(self.img2img, self.upsampler_model_str)
+        self.pipe = MODELS.get(pipe_name)
+        if self.upsampler is None:
+            self.upsampler = MODELS.get(upsampler_name)
+        torch = lazy_import("torch")
+        if self.seed is None:
+            self.generator = torch.Generator("cuda")
+        else:
+            self.generator = torch.Generator("cuda").manual_seed(self.seed)
+
     def run(self):
+        self.load_models()
+        STARTUP.mark("online", self.name)
         while not self.stop_request:
+            # the version of the prompt this pass renders (or blanks the screen for)
+            prompt_seq = None if self.Prompt_Thread is None else self.Prompt_Thread.results.seq
             if not self.Prompt_Thread is None and not (
                     self.Prompt_Thread.prompt is None or self.Prompt_Thread.prompt == "" or self.Prompt_Thread.prompt == "Blank screen"):
 
@@ -178,6 +214,8 @@ class ImageGenerationThread(threading.Thread):
             else:
                 print("No prompt or thread")
                 self.output = self.blank_image
+            if prompt_seq is not None:
+                self.Prompt_Thread.results.consumed(self.name, prompt_seq)
             time.sleep(1)
 
 
@@ -1,8 +1,8 @@
 import math
 import threading
-import cv2
 import time
 import numpy as np
+from startup import STARTUP, lazy_import
 
 """
 This class is a thread class that generates prompts procedurally in real time.
@@ -23,7 +23,7 @@ class ImageDisplayThreadWithAmpTracking(threading.Thread):
                  blend_time=1,
                  bloom_decay_time=0.5,
                  bloom_threshold=-0.5,
-                 font=cv2.FONT_HERSHEY_TRIPLEX):
+                 font=None):    # defaults to cv2.FONT_HERSHEY_TRIPLEX
         super(ImageDisplayThreadWithAmpTracking, self).__init__()
         self.name = name
         self.blank_image = np.zeros((1024, 1024, 3))
@@ -57,6 +57,7 @@ class ImageDisplayThreadWithAmpTracking(threading.Thread):
 
 
     def get_image(self):
+        cv2 = lazy_import("cv2")
         if self.blending is False:
             # Static image (no blending)
             # Check if image needs to be updated
@@ -159,6 +160,11 @@ class ImageDisplayThreadWithAmpTracking(threading.Thread):
     """
 
     def run(self):
+        # OpenCV is imported by this thread, while the other stages start
+        cv2 = lazy_import("cv2")
+        if self.font is None:
+            self.font = cv2.FONT_HERSHEY_TRIPLEX
+        STARTUP.mark("online", self.name)
         while not self.stop_request and (
                 self.prompt_thread is None or self.prompt_thread.prompt is None or self.image_thread is None or self.image_thread.output is None):
             time.sleep(0.5)
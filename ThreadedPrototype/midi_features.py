@@ -0,0 +1,164 @@
+import numpy as np
+from basic_pitch_modified.note_creation import N_PITCH_BEND_TICKS
+
+'''
+This module computes the MIDI features of the genre model (the PrettyMIDI features of note_array.to_midi()) directly
+from a NoteArray with NumPy, without building a PrettyMIDI object. The duration-weighted pitch class histogram
+(the row sums of PrettyMIDI's 100 fps chroma) is summed note by note instead of from a synthesized piano roll,
+pitch bends included, and the tempo is the same inter-onset-interval clustering estimate_tempo() uses, so the
+features match the PrettyMIDI ones in order and normalization.
+'''
+
+# the PrettyMIDI object NoteArray.to_midi() builds has no time signature changes and the default resolution
+NUM_SIG_CHANGES = 0
+RESOLUTION = 220
+TIME_SIGNATURE = (4, 4)
+
+# normalize_features: (feature - offset) / scale for tempo, number of time signature changes, resolution,
+# both time signature numbers, melody complexity, melody range and the first 11 pitch class histogram bins
+FEATURE_OFFSETS = np.array([150, 2, 260, 3, 3, 0, 0] + [0] * 11, dtype=np.float64)
+FEATURE_SCALES = np.array([300, 10, 400, 8, 8, 10, 80] + [100] * 11, dtype=np.float64)
+
+N_MIDI_PITCHES = 128
+
+
+def estimate_tempo(onsets, default_tempo=120):
+    """
+    Estimates the tempo from note onsets like PrettyMIDI.estimate_tempo() (Dixon 2001): inter-onset intervals
+    between 50 ms and 2 s are doubled into the 0.2 s range and greedily clustered, the tempo of the largest
+    cluster wins.
+    Parameters:
+        onsets: the note start times in seconds, in any order
+        default_tempo: the tempo returned when there are no usable inter-onset intervals
+    Returns: the tempo in beats per minute
+    """
+    ioi = np.diff(np.sort(onsets))
+    ioi = ioi[(ioi > .05) & (ioi < 2)]
+    short = ioi < .2
+    while short.any():
+        ioi[short] *= 2
+        short = ioi < .2
+    if len(ioi) == 0:
+        return default_tempo
+
+    # the clustering depends on the order of the intervals, so it stays a loop (over plain floats)
+    clusters = []
+    counts = []
+    for interval in ioi.tolist():
+        if any(abs(cluster - interval) < .025 for cluster in clusters):
+            # PrettyMIDI takes np.argmin(clusters - interval), i.e. the smallest cluster mean, not the nearest
+            k = clusters.index(min(clusters))
+            clusters[k] = (counts[k] * clusters[k] + interval) / (counts[k] + 1)
+            counts[k] += 1
+        else:
+            clusters.append(interval)
+            counts.append(1.)
+    best = np.argsort(np.array(counts))[::-1][0]
+    return 60. / clusters[best]
+
+
+def pitch_class_histogram(pitches):
+    """
+    Computes the normalized pitch class histogram of the notes (PrettyMIDI.get_pitch_class_histogram()).
+    Parameters: pitches: the MIDI pitches of the notes
+    Returns: a numpy array of 12 note counts that sums to 1 (or zeros without notes)
+    """
+    histogram = np.bincount(np.asarray(pitches) % 12, minlength=12).astype(np.float64)
+    return histogram / (histogram.sum() + (histogram.sum() == 0))
+
+
+def _fold(pitch_values):
+    """
+    Sums values per MIDI pitch (last axis) into the 12 pitch classes.
+    """
+    folded = np.zeros(pitch_values.shape[:-1] + (12,))
+    for pitch_class in range(12):
+        folded[..., pitch_class] = pitch_values[..., pitch_class::12].sum(axis=-1)
+    return folded
+
+
+def chroma_sum(note_array, fs=100):
+    """
+    Computes the row sums of the chroma matrix PrettyMIDI.get_chroma(fs) gives for note_array.to_midi(): every
+    note adds its velocity to each of its piano roll columns, and pitch bends move the columns they cover up or
+    down by whole semitones and interpolate them linearly by the remaining fraction of a semitone.
+    Parameters:
+        note_array: the NoteArray
+        fs: the piano roll frame rate
+    Returns: a numpy array of the 12 pitch class sums (velocity times duration in frames)
+    """
+    notes = note_array.notes
+    start_col = (notes["start"] * fs).astype(int)
+    end_col = (notes["end"] * fs).astype(int)
+    velocity = notes["velocity"].astype(np.float64)
+    pitch = notes["pitch"].astype(int)
+    chroma = np.bincount(pitch % 12, weights=velocity * np.maximum(end_col - start_col, 0), minlength=12)
+
+    bend_times, bend_ticks = note_array.midi_pitch_bends()
+    if len(bend_times) == 0:
+        return chroma
+    order = np.argsort(bend_times, kind="stable")
+    bend_times, bend_ticks = bend_times[order], bend_ticks[order]
+    # each bend holds until the next one, the last one until the end of the instrument
+    end_time = max(notes["end"].max(), bend_times[-1])
+    columns = (np.append(bend_times, end_time) * fs).astype(int)
+    bent = (bend_ticks != 0) & (columns[1:] > columns[:-1])
+    if not bent.any():
+        return chroma
+    seg_start, seg_end, ticks = columns[:-1][bent], columns[1:][bent], bend_ticks[bent]
+
+    # piano roll mass per segment and pitch
+    overlap = np.minimum(seg_end[:, None], end_col) - np.maximum(seg_start[:, None], start_col)
+    weights = np.maximum(overlap, 0) * velocity
+    mass = np.zeros((len(ticks), N_MIDI_PITCHES))
+    for p in np.unique(pitch).tolist():
+        mass[:, p] = weights[:, pitch == p].sum(axis=1)
+
+    # the bend is linear in the piano roll columns, so it can be applied to the mass of the segment
+    semitones = 2 * ticks / N_PITCH_BEND_TICKS
+    whole = (np.sign(semitones) * np.floor(np.abs(semitones))).astype(int)
+    fraction = np.abs(semitones - whole)[:, None]
+    shifted = np.zeros_like(mass)
+    for k in np.unique(whole).tolist():
+        rows = whole == k
+        if k > 0:
+            shifted[rows, k:] = mass[rows, :-k]
+        elif k < 0:
+            shifted[rows, :k] = mass[rows, -k:]
+        else:
+            shifted[rows] = mass[rows]
+    up = ticks > 0
+    shifted[up, 1:] = (1 - fraction[up]) * shifted[up, 1:] + fraction[up] * shifted[up, :-1]
+    down = ~up
+    shifted[down, :-1] = (1 - fraction[down]) * shifted[down, :-1] + fraction[down] * shifted[down, 1:]
+    return chroma + _fold(shifted.sum(axis=0) - mass.sum(axis=0))
+
+
+def normalize_features(features):
+    """
+    Normalizes the features to about [-1, 1] like the PrettyMIDI features, dropping the last pitch class bin.
+    Parameters: features: the 19 raw features (7 scalars followed by the 12 pitch class sums)
+    Returns: a numpy array of the 18 normalized features
+    """
+    return (np.asarray(features, dtype=np.float64)[:-1] - FEATURE_OFFSETS) / FEATURE_SCALES
+
+
+def get_midi_features(note_array, fs=100, default_tempo=120):
+    """
+    Extracts the genre model's MIDI features from a NoteArray, in the order of the PrettyMIDI features: tempo,
+    number of time signature changes, resolution, time signature, melody complexity and range, pitch class sums.
+    Parameters:
+        note_array: the NoteArray
+        fs: the frame rate of the chroma the pitch class histogram is summed from
+        default_tempo: the tempo used when it cannot be estimated (fewer than two usable onsets)
+    Returns: a numpy array of the 18 normalized features
+    """
+    notes = note_array.notes
+    tempo = estimate_tempo(notes["start"], default_tempo)
+    melody = pitch_class_histogram(notes["pitch"])
+    melody_complexity = np.sum(melody > 0)
+    melody_range = np.max(melody) - np.min(melody)
+    features = np.empty(19)
+    features[:7] = [tempo, NUM_SIG_CHANGES, RESOLUTION, *TIME_SIGNATURE, melody_complexity, melody_range]
+    features[7:] = chroma_sum(note_array, fs)
+    return normalize_features(features)
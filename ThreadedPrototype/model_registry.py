@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from startup import STARTUP
+
+'''
+This class is a process-wide registry of the models the prototype uses (Basic Pitch, the feature selectors and
+regressors, the genre model). Each model is registered with a function that loads it, and is loaded the first
+time it is requested: exactly once, even when several threads ask for it at the same time. Models can be loaded
+ahead of time by a pool of loader threads, independent models concurrently, and the time every load took is
+recorded in the startup report and printed.
+'''
+
+
+class ModelRegistry:
+    def __init__(self, verbose=True):
+        """
+        Initializes an empty ModelRegistry.
+        Parameters: verbose: print every load and its duration
+        Returns: nothing
+        """
+        self.verbose = verbose
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}    # one lock per model, so different models can load at the same time
+        self._lock = threading.Lock()
+        self.load_times = {}    # seconds each loaded model took to load
+
+    def register(self, name, loader):
+        """
+        Registers a model. Registering a name again replaces its loader, unless the model is already loaded.
+        Parameters:
+            name: the name the model is requested by
+            loader: a function without arguments that loads and returns the model
+        Returns: nothing
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name, loader=None):
+        """
+        Returns a model, loading it first if this is the first request. Blocks while another thread loads it.
+        Parameters:
+            name: the name of the model
+            loader: registers this loader first if the name is not registered yet
+        Returns: the model
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if loader is not None and name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as {name!r}")
+            model_lock = self._locks[name]
+        with model_lock:
+            if name not in self._models:
+                start = time.time()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = time.time() - start
+                STARTUP.add("load", name, start, self.load_times[name])
+                if self.verbose:
+                    print(f"Loaded {name} in {self.load_times[name]:.2f} s")
+            return self._models[name]
+
+    def is_loaded(self, name):
+        """
+        Returns: True if the model has been loaded
+        """
+        return name in self._models
+
+    def preload(self, names=None, max_workers=4):
+        """
+        Loads models in a pool of background loader threads, so they are ready (or already loading) when they are
+        first requested. A model that fails to load is reported and left to its first request, which loads it again.
+        Parameters:
+            names: the names of the models to load, defaults to every registered model
+            max_workers: the number of models loaded at the same time
+        Returns: the (started, daemon) thread that waits for every load, it finishes once they are all done
+        """
+        if names is None:
+            with self._lock:
+                names = list(self._loaders)
+
+        def load(name):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Preloading {name} failed: {e!r}")
+
+        def load_all():
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names))),
+                                    thread_name_prefix="model_loader") as pool:
+                list(pool.map(load, names))
+
+        thread = threading.Thread(target=load_all, name="model_preload", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """
+        Returns: a one-line summary of the load time of every loaded model
+        """
+        total = sum(self.load_times.values())
+        loads = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.load_times.items())
+        return f"{loads} (total {total:.2f} s)"
+
+
+# the registry shared by every thread of the process
+MODELS = ModelRegistry()
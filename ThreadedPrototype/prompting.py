@@ -1,9 +1,8 @@
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
 import random
 import threading
 import time
 import random
+from versioned import VersionedValue
 
 # Create OpenAI client instance
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
@@ -240,20 +239,41 @@ class PromptGenerationThread(threading.Thread):
         self.emotion_thread = emotion_thread
         self.audio_thread = audio_thread
         self.stop_request = False
+        self.results = VersionedValue()     # versioned prompts, published whenever self.prompt changes
+        for stage in (genre_thread, emotion_thread):
+            if stage is not None:
+                stage.results.add_consumer(self.name, self.results)
 
     """
-    When the thread is started, this function is called which repeatedly generates new prompts.
+    When the thread is started, this function is called which generates a new prompt whenever
+    new emotion values or a new genre are published, and blanks the screen when the input stops.
     Parameters: nothing
     Returns: nothing
     """
 
     def run(self):
+        seq = 0
+        genre_seq = 0
         while not self.stop_request:
+            if self.emotion_thread is None:
+                new_seq = seq
+                time.sleep(0.5)
+            else:
+                # block until new emotion values arrive; the timeout keeps the input check responsive
+                new_seq, _, _ = self.emotion_thread.results.wait_newer(seq, timeout=0.5)
+            new_genre_seq = genre_seq if self.genre_thread is None else self.genre_thread.results.seq
+            prompt = self.prompt
             if (not self.audio_thread.input_on or
                     (self.genre_thread is None or self.genre_thread.genre_output is None or
                      self.emotion_thread is None or self.emotion_thread.emo_values is None)):
                 self.prompt = "Blank screen"
-            else:
+            elif new_seq != seq or new_genre_seq != genre_seq or self.prompt == "Blank screen":
                 self.prompt = get_prompt(self.genre_thread.genre_output, self.emotion_thread.emo_values[0],
                                            self.emotion_thread.emo_values[1])
-            time.sleep(0.2)
+            if self.prompt != prompt:
+                self.results.publish(self.prompt)
+            seq = new_seq
+            genre_seq = new_genre_seq
+            for stage, stage_seq in ((self.emotion_thread, seq), (self.genre_thread, genre_seq)):
+                if stage is not None:
+                    stage.results.consumed(self.name, stage_seq)
@@ -0,0 +1,135 @@
+import sys
+import threading
+import time
+import numpy as np
+
+'''
+This class replays an audio file (WAV/FLAC/MP3) or raw int16 PCM from stdin into an AudioThreadWithBufferPorted
+in place of a live PyAudio stream, so the whole threaded pipeline can run headless and faster than real time.
+'''
+
+
+class ReplaySource:
+    def __init__(self, path, speed=1.0):
+        """
+        Initializes a ReplaySource.
+        Parameters:
+            path: the audio file to replay, or "-" to read raw interleaved int16 PCM (at the capture rate) from stdin
+            speed: the playback speed relative to real time (1.0 = real time, 4.0 = four times faster).
+                If None or 0, chunks are fed as fast as the analysis worker and the stages after it (the
+                registered consumers of its results, see VersionedValue.add_consumer()) can consume them.
+        Returns: nothing
+        """
+        self.path = path
+        self.speed = speed if speed else None
+        self.done = threading.Event()   # set once the source is fed and its last analysis published
+        self.chunks_fed = 0
+        self.audio_seconds = 0.0    # seconds of audio fed
+        self.feed_start = None  # time the first chunk was fed
+        self.feed_end = None    # time the analysis of the last chunk was published
+
+    @property
+    def finished(self):
+        return self.done.is_set()
+
+    def wait_finished(self, timeout=None):
+        """
+        Blocks until the source is fed and its last analysis is published, or the timeout expires.
+        Parameters: timeout: the maximum number of seconds to wait, or None to wait forever
+        Returns: True if the replay finished
+        """
+        return self.done.wait(timeout)
+
+    def report(self):
+        """
+        Returns: a one-line summary of how fast the audio was replayed and analysed, from the first chunk fed to
+            the analysis of the last one (so decoding, thread startup and model loading are not counted)
+        """
+        wall_seconds = self.feed_end - self.feed_start if self.feed_start is not None else 0.0
+        speed = self.audio_seconds / wall_seconds if wall_seconds > 0 else float("inf")
+        return f"{self.audio_seconds:.1f} s of audio in {wall_seconds:.2f} s ({speed:.2f}x real time)"
+
+    def read_chunks(self, rate, chunk_size, channels):
+        """
+        Yields the audio as int16 byte strings of chunk_size frames, like PyAudio hands them to the callback.
+        Parameters:
+            rate: the sample rate to deliver the audio at
+            chunk_size: the number of frames per chunk
+            channels: the number of interleaved channels per frame
+        Returns: a generator of byte strings
+        """
+        chunk_bytes = chunk_size * channels * np.dtype(np.int16).itemsize
+        if self.path == "-":
+            stream = sys.stdin.buffer
+            while True:
+                data = stream.read(chunk_bytes)
+                if len(data) < chunk_bytes:
+                    return
+                yield data
+        else:
+            import librosa  # importing this here so the module loads faster
+
+            audio, _ = librosa.load(str(self.path), sr=rate, mono=True)
+            audio = np.clip(audio * 2**15, -2**15, 2**15 - 1).astype(np.int16)
+            if channels > 1:
+                audio = np.repeat(audio, channels)
+            frame_samples = chunk_size * channels
+            for start in range(0, len(audio) - frame_samples + 1, frame_samples):
+                yield audio[start:start + frame_samples].tobytes()
+
+    def wait_drained(self, audio_thread):
+        """
+        Blocks until every stage after the audio thread has consumed the latest analysis, or a stop is requested.
+        Parameters: audio_thread: the AudioThreadWithBufferPorted being fed
+        Returns: nothing
+        """
+        while not audio_thread.results.wait_drained(timeout=0.5):
+            if audio_thread.stop_request:
+                return
+
+    def feed(self, audio_thread):
+        """
+        Feeds the whole source into the given audio thread, paced according to speed, then waits for the analysis
+        of the last chunk. Unpaced, every hop of audio also waits until the downstream stages have consumed what
+        was published for the previous one, so none of their updates is skipped. Returns early if a stop is
+        requested on the audio thread.
+        Parameters: audio_thread: the AudioThreadWithBufferPorted to feed
+        Returns: nothing
+        """
+        chunk_size = audio_thread.starting_chunk_size
+        worker = audio_thread.analysis_worker
+        hop_samples = 0
+        if self.speed is None and worker is not None:
+            # In stream time the worker should analyse once per hop of audio, so wait for it
+            # here instead of letting it sleep in wall-clock time
+            hop_samples = int(worker.hop * audio_thread.RATE)
+            worker.hop = 0.0
+        last_waited = 0
+
+        for in_data in self.read_chunks(audio_thread.RATE, chunk_size, audio_thread.CHANNELS):
+            if audio_thread.stop_request:
+                break
+            if self.feed_start is None:
+                self.feed_start = time.time()  # start the clock only once the file is decoded
+            if self.speed is not None:
+                due = self.feed_start + self.chunks_fed * chunk_size / (audio_thread.RATE * self.speed)
+                wait = due - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+
+            audio_thread.ingest(in_data)
+            self.chunks_fed += 1
+            self.audio_seconds = self.chunks_fed * chunk_size / audio_thread.RATE
+
+            cursor = audio_thread.audio_buffer.write_cursor
+            if hop_samples > 0 and cursor - last_waited >= hop_samples:
+                worker.wait_processed(cursor)
+                self.wait_drained(audio_thread)
+                last_waited = cursor
+
+        if worker is not None and self.chunks_fed > 0:
+            worker.wait_processed(audio_thread.audio_buffer.write_cursor)
+            if hop_samples > 0:
+                self.wait_drained(audio_thread)
+        self.feed_end = time.time()
+        self.done.set()
@@ -0,0 +1,69 @@
+from math import gcd
+import numpy as np
+from scipy.signal import firwin, upfirdn
+
+'''
+This class is a stateful polyphase resampler. Audio is fed in chunk by chunk and the filter state carries
+over between chunks, so the concatenated output equals scipy.signal.resample_poly over the whole stream
+(up to the samples that still depend on future input).
+'''
+
+
+class StreamingResampler:
+    def __init__(self, orig_rate, target_rate):
+        """
+        Initializes a StreamingResampler with the same anti-aliasing filter resample_poly uses.
+        Parameters:
+            orig_rate: the sample rate of the input chunks
+            target_rate: the sample rate of the output
+        Returns: nothing
+        """
+        g = gcd(orig_rate, target_rate)
+        self.up = target_rate // g
+        self.down = orig_rate // g
+        if self.up == self.down:
+            return  # process() passes the audio through
+
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        # pad the filter so its delay is a whole number of output samples, which are then dropped
+        n_pre_pad = self.down - half_len % self.down
+        self.h = np.concatenate((np.zeros(n_pre_pad), h)).astype(np.float32)
+        self.n_delay = (half_len + n_pre_pad) // self.down
+
+        self._history = np.zeros(0, dtype=np.float32)  # retained input, starting at input sample self._history_start
+        self._history_start = 0
+        self._in_count = 0  # total input samples received
+        self._out_next = 0  # next filter output index to emit (before removing the delay)
+
+    def process(self, chunk):
+        """
+        Resamples the next chunk of the stream.
+        Parameters: chunk: a 1D numpy array of input samples
+        Returns: the output samples that could be completed with this chunk (float32 numpy array)
+        """
+        if self.up == self.down:
+            return np.asarray(chunk, dtype=np.float32)
+        self._history = np.concatenate((self._history, np.asarray(chunk, dtype=np.float32)))
+        self._in_count += len(chunk)
+
+        # output n depends on upsampled input up to index n * down
+        out_last = (self._in_count * self.up - 1) // self.down
+        if out_last < self._out_next:
+            return np.zeros(0, dtype=np.float32)
+        offset = self._history_start * self.up // self.down
+        y = upfirdn(self.h, self._history, self.up, self.down)
+        out = y[self._out_next - offset:out_last + 1 - offset]
+        if self._out_next < self.n_delay:
+            out = out[self.n_delay - self._out_next:]
+        self._out_next = out_last + 1
+
+        # drop input no longer reached by the filter; the kept history must start on a multiple of down
+        # so its output samples stay aligned with the stream's
+        start = (self._out_next * self.down - len(self.h) + 1) // self.up
+        start = start // self.down * self.down
+        if start > self._history_start:
+            self._history = self._history[start - self._history_start:]
+            self._history_start = start
+        return out.astype(np.float32)
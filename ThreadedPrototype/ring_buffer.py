@@ -0,0 +1,102 @@
+import numpy as np
+
+'''
+This class is a preallocated circular buffer of audio samples with a monotonically increasing write cursor.
+It is written to by a single writer (the PyAudio callback) and can be read from any number of threads.
+'''
+
+
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.int16):
+        """
+        Initializes a RingBuffer.
+        Parameters:
+            capacity: the number of samples the buffer can hold
+            dtype: the numpy dtype of the samples
+        Returns: nothing
+        """
+        self.capacity = capacity
+        self.dtype = dtype
+        self.buffer = np.zeros(self.capacity, dtype=self.dtype)
+        self.write_cursor = 0   # total number of samples ever written
+        self.max_write = 0  # largest chunk written so far, used to validate snapshots
+
+    def __len__(self):
+        """
+        Returns: the number of valid samples currently stored in the buffer
+        """
+        return min(self.write_cursor, self.capacity)
+
+    def write(self, data):
+        """
+        Appends samples to the buffer, overwriting the oldest samples once the buffer is full.
+        The write cursor is only advanced after the samples are in place, so readers never see
+        a half-written chunk.
+        Parameters: data: a 1D numpy array of samples
+        Returns: nothing
+        """
+        n = len(data)
+        if n > self.capacity:
+            data = data[n - self.capacity:]
+            self.write_cursor += n - self.capacity
+            n = self.capacity
+        self.max_write = max(self.max_write, n)
+
+        start = self.write_cursor % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        if first < n:
+            self.buffer[:n - first] = data[first:]
+        self.write_cursor += n
+
+    def get_last(self, n, cursor=None):
+        """
+        Returns the last n samples written before the given cursor position.
+        The result is a view into the buffer when the samples are contiguous, otherwise one
+        concatenation of the two wrapped parts. Views may be overwritten by later writes.
+        Parameters:
+            n: number of samples
+            cursor: the write cursor the samples end at (defaults to the current write cursor)
+        Returns: the samples (as a numpy array), fewer than n if not enough audio has been written yet
+        """
+        if cursor is None:
+            cursor = self.write_cursor
+        n = max(0, min(n, cursor, self.capacity))
+        end = cursor % self.capacity
+        if end == 0 and n > 0:
+            end = self.capacity
+        if n <= end:
+            return self.buffer[end - n:end]
+        return np.concatenate((self.buffer[self.capacity - (n - end):], self.buffer[:end]))
+
+    def snapshot(self, n):
+        """
+        Returns a consistent copy of the last n samples along with the write cursor they end at.
+        The copy is retried if the writer overwrote any of the copied samples while copying.
+        Parameters: n: number of samples (at most capacity minus the largest chunk size)
+        Returns:
+            samples: a numpy array owned by the caller
+            cursor: the write cursor position the samples end at
+        """
+        while True:
+            cursor = self.write_cursor
+            samples = self.snapshot_at(n, cursor)
+            if samples is not None:
+                return samples, cursor
+
+    def snapshot_at(self, n, cursor):
+        """
+        Returns a copy of the last n samples written before the given cursor position, unless the writer has
+        overwritten some of them in the meantime.
+        Parameters:
+            n: number of samples (at most capacity minus the largest chunk size)
+            cursor: the write cursor the samples end at
+        Returns: the samples (as a numpy array owned by the caller), or None if some were overwritten
+        """
+        n = min(n, self.capacity - self.max_write)
+        samples = np.array(self.get_last(n, cursor), copy=True)
+        # The oldest copied sample lives at cursor - len(samples). It is safe as long as the
+        # writer (possibly in the middle of a chunk) has not wrapped around to it.
+        if self.write_cursor + self.max_write <= cursor - len(samples) + self.capacity:
+            return samples
+        return None
@@ -0,0 +1,147 @@
+import numpy as np
+from multiprocessing import shared_memory
+from ring_buffer import RingBuffer
+
+'''
+This class is a RingBuffer whose samples and cursor live in multiprocessing.shared_memory, so analysis stages
+running in other processes can attach to the audio buffer and read the latest samples without copying or pickling.
+'''
+
+# Header layout (int64 slots) at the start of the shared memory block
+HEADER_SLOTS = 8
+WRITE_CURSOR = 0    # total number of samples ever written
+SAMPLE_RATE = 1
+SEQUENCE = 2    # number of chunks written
+CAPACITY = 3
+MAX_WRITE = 4   # largest chunk written so far
+DTYPE_CHAR = 5  # ord() of the numpy dtype character of the samples
+HEADER_BYTES = HEADER_SLOTS * np.dtype(np.int64).itemsize
+
+
+def _open_shared_memory(name):
+    """
+    Attaches to an existing shared memory block without letting this process's resource tracker
+    unlink it on exit (only the creating process owns the block).
+    Parameters: name: the name of the shared memory block
+    Returns: the SharedMemory object
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedRingBuffer(RingBuffer):
+    def __init__(self, capacity=None, dtype=np.int16, rate=0, name=None, create=True):
+        """
+        Creates a new shared ring buffer, or attaches to an existing one.
+        Parameters:
+            capacity: the number of samples the buffer can hold (ignored when attaching)
+            dtype: the numpy dtype of the samples (ignored when attaching)
+            rate: the sample rate of the audio, stored in the header for readers (ignored when attaching)
+            name: the name of the shared memory block (a random name is chosen when creating with None)
+            create: True to create the block (writer), False to attach to an existing one (reader)
+        Returns: nothing
+        """
+        self.owner = create
+        if create:
+            dtype = np.dtype(dtype)
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=HEADER_BYTES + capacity * dtype.itemsize)
+            self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+            self.header[:] = 0
+            self.header[SAMPLE_RATE] = rate
+            self.header[CAPACITY] = capacity
+            self.header[DTYPE_CHAR] = ord(dtype.char)
+        else:
+            self.shm = _open_shared_memory(name)
+            self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        self.name = self.shm.name
+        self.capacity = int(self.header[CAPACITY])
+        self.dtype = np.dtype(chr(self.header[DTYPE_CHAR]))
+        self.buffer = np.ndarray((self.capacity,), dtype=self.dtype, buffer=self.shm.buf, offset=HEADER_BYTES)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to a shared ring buffer created by another process.
+        Parameters: name: the name of the shared memory block
+        Returns: a SharedRingBuffer reading the same memory
+        """
+        return cls(name=name, create=False)
+
+    def _slots(self):
+        """
+        Returns: the header, after checking the buffer has not been closed
+        Raises: ValueError if the buffer has been closed
+        """
+        if self.header is None:
+            raise ValueError(f"The shared ring buffer {self.name} is closed")
+        return self.header
+
+    @property
+    def write_cursor(self):
+        return int(self._slots()[WRITE_CURSOR])
+
+    @write_cursor.setter
+    def write_cursor(self, value):
+        self._slots()[WRITE_CURSOR] = value
+
+    @property
+    def max_write(self):
+        return int(self._slots()[MAX_WRITE])
+
+    @max_write.setter
+    def max_write(self, value):
+        self._slots()[MAX_WRITE] = value
+
+    @property
+    def rate(self):
+        return int(self._slots()[SAMPLE_RATE])
+
+    @property
+    def seq(self):
+        return int(self._slots()[SEQUENCE])
+
+    def write(self, data):
+        """
+        Appends samples to the buffer (see RingBuffer.write) and increments the sequence number.
+        Only the creating process should write.
+        Parameters: data: a 1D numpy array of samples
+        Returns: nothing
+        """
+        super().write(data)
+        self.header[SEQUENCE] += 1
+
+    def close(self):
+        """
+        Detaches from the shared memory block, and removes it if this process created it.
+        Views returned by get_last must not be used afterwards; reads and writes raise a ValueError.
+        Parameters: nothing
+        Returns: nothing
+        """
+        self.header = None
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+if __name__ == "__main__":
+    # Example reader process: python shared_ring.py <name>
+    import sys
+    import time
+
+    ring = SharedRingBuffer.attach(sys.argv[1])
+    try:
+        while True:
+            samples, cursor = ring.snapshot(ring.rate // 10)
+            rms = np.sqrt(np.mean(samples.astype(np.float64) ** 2)) if len(samples) else 0.0
+            print(f"seq %d, cursor %d, rms of last 100 ms: %.1f" % (ring.seq, cursor, rms))
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        ring.close()
@@ -0,0 +1,61 @@
+'''
+This class decides whether the expensive analysis (Basic Pitch, openSMILE) of an audio thread should run.
+Once the input has stayed below the audio thread's on_threshold for longer than a timeout, analysis runs are
+skipped and a single SILENCE result is published instead; the first chunk above the threshold resumes them.
+Silence is measured in samples of the stream rather than wall-clock time, so replays at any speed are gated
+the same way as live input.
+'''
+
+
+class _Silence:
+    def __repr__(self):
+        return "SILENCE"
+
+
+# published in place of an analysis result when the input goes silent; consumers keep their last values
+SILENCE = _Silence()
+
+
+class SilenceGate:
+    def __init__(self, timeout=2.0):
+        """
+        Initializes a SilenceGate.
+        Parameters: timeout: the number of seconds the input has to be off before analysis runs are skipped
+        Returns: nothing
+        """
+        self.timeout = timeout
+        self.silent = False
+        self.analysed = 0   # number of analysis runs let through
+        self.skipped = 0    # number of analysis runs skipped
+        self.silent_periods = 0     # number of times the input went silent
+
+    def should_analyse(self, seconds_since_on):
+        """
+        Updates the gate before an analysis run.
+        Parameters: seconds_since_on: seconds of audio received since the last chunk above the threshold
+        Returns: True if the analysis should run, False if it should be skipped
+        """
+        if seconds_since_on <= self.timeout:
+            self.silent = False
+            self.analysed += 1
+            return True
+        if not self.silent:
+            self.silent = True
+            self.silent_periods += 1
+        self.skipped += 1
+        return False
+
+    @property
+    def skipped_fraction(self):
+        """
+        Returns: the fraction of analysis runs that were skipped
+        """
+        total = self.analysed + self.skipped
+        return self.skipped / total if total else 0.0
+
+    def report(self):
+        """
+        Returns: a one-line summary of the analysis runs skipped
+        """
+        return (f"{self.analysed} analysis runs, {self.skipped} skipped ({100 * self.skipped_fraction:.0f}%) "
+                f"in {self.silent_periods} silent period(s)")
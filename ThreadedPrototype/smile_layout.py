@@ -0,0 +1,120 @@
+import numpy as np
+from startup import lazy_import
+from streaming_smile import N_FEATURES, StreamingSmile, opensmile_mismatches
+
+'''
+This class lays out the openSMILE features the live path extracts, so only the features the models' feature
+selectors (SelectKBest over the 988 emobase functionals, followed by the MIDI features for the genre model) keep
+are computed: the union of the selectors' supports, as one dense vector in ascending feature order. For every
+selector it knows the columns of that vector (and of the extra, non-openSMILE features) its model takes, in the
+order the selector's transform() would give them, so the models are fed by indexing instead of transform().
+'''
+
+
+class SmileLayout:
+    def __init__(self, supports, n_features=N_FEATURES, reduced=True):
+        """
+        Initializes a SmileLayout.
+        Parameters:
+            supports: a dict of the selected feature indices of every selector, by name; indices from n_features
+                on select the extra features that follow the openSMILE features in the selector's input
+            n_features: the number of openSMILE features in the full extraction
+            reduced: extract only the selected features; if False, the layout is the full extraction
+        Returns: nothing
+        """
+        self.supports = {name: np.sort(np.asarray(support, dtype=np.int64)) for name, support in supports.items()}
+        self.n_features = n_features
+        self.reduced = reduced
+        if reduced:
+            selected = [support[support < n_features] for support in self.supports.values()]
+            self.indices = np.unique(np.concatenate(selected + [np.zeros(0, dtype=np.int64)]))
+        else:
+            self.indices = np.arange(n_features)
+        # the columns of the extracted vector, and of the extra features, every selector keeps
+        self.columns = {name: np.searchsorted(self.indices, support[support < n_features])
+                        for name, support in self.supports.items()}
+        self.extra_columns = {name: support[support >= n_features] - n_features
+                              for name, support in self.supports.items()}
+
+    @classmethod
+    def from_selectors(cls, selectors, n_features=N_FEATURES, reduced=True):
+        """
+        Parameters:
+            selectors: a dict of fitted sklearn feature selectors (with get_support()), by name
+            n_features: the number of openSMILE features in the full extraction
+            reduced: extract only the selected features
+        Returns: the SmileLayout of the selectors
+        """
+        return cls({name: selector.get_support(indices=True) for name, selector in selectors.items()},
+                   n_features, reduced)
+
+    def full(self):
+        """
+        Returns: the layout of the same selectors on the full extraction
+        """
+        return SmileLayout(self.supports, self.n_features, reduced=False)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def model_input(self, name, features, extra=None):
+        """
+        Selects the features a selector keeps, like its transform() on the full features followed by extra.
+        Parameters:
+            name: the name of the selector
+            features: a numpy array of shape (1, len(self)) laid out by this layout
+            extra: a numpy array of shape (1, number of extra features), if the selector takes any
+        Returns: a numpy array of shape (1, number of selected features)
+        """
+        selected = features[:, self.columns[name]]
+        if len(self.extra_columns[name]) == 0:
+            return selected
+        return np.concatenate([selected, extra[:, self.extra_columns[name]]], axis=1)
+
+
+def verification_signal(sampling_rate=44100, seconds=2.0):
+    """
+    Returns: a deterministic int16 test signal (a gliding harmonic tone over a little noise) to verify layouts with
+    """
+    t = np.arange(int(seconds * sampling_rate)) / sampling_rate
+    phase = 2 * np.pi * 220 * (t + t ** 2 / 4)
+    tone = sum(np.sin(k * phase) / k for k in range(1, 5)) * (0.3 + 0.2 * np.sin(2 * np.pi * t))
+    noise = np.random.default_rng(0).normal(scale=0.01, size=len(t))
+    return np.round(8000 * (tone + noise)).astype(np.int16)
+
+
+def verify_layout(layout, selectors, signal, sampling_rate=44100):
+    """
+    Extracts the features of a signal with the layout, and checks that the model input the layout gives every
+    selector matches the selector's transform() of openSMILE's emobase functionals of the same signal, within
+    streaming_smile.OPENSMILE_TOLERANCES.
+    Parameters:
+        layout: the SmileLayout
+        selectors: the selectors of the layout, by name
+        signal: the int16 audio to extract the features of
+        sampling_rate: its sampling rate
+    Returns: the number of openSMILE features compared
+    Raises: ValueError if a model input differs
+    """
+    opensmile = lazy_import("opensmile")
+    smile = opensmile.Smile(feature_set=opensmile.FeatureSet.emobase,
+                            feature_level=opensmile.FeatureLevel.Functionals, sampling_rate=sampling_rate)
+    reference = smile.process_signal(np.asarray(signal, dtype=np.float32) / 2 ** 15, sampling_rate).to_numpy()
+    reduced = StreamingSmile(sampling_rate, len(signal) / sampling_rate,
+                             features=layout.indices).update(signal, len(signal))
+    compared = 0
+    for name, selector in selectors.items():
+        n_extra = selector.n_features_in_ - layout.n_features
+        extra = np.linspace(-1, 1, n_extra).reshape(1, -1)
+        expected = selector.transform(np.concatenate([reference, extra], axis=1))
+        actual = layout.model_input(name, reduced, extra)
+        support = selector.get_support(indices=True)
+        support = support[support < layout.n_features]
+        if actual.shape != expected.shape or not np.array_equal(actual[:, len(support):], expected[:, len(support):]):
+            raise ValueError(f"The model input of {name} does not have the layout of its selector")
+        mismatches = opensmile_mismatches(actual[:, :len(support)], reference, indices=support)
+        if mismatches:
+            raise ValueError(f"The reduced openSMILE features of {name} do not match openSMILE: "
+                             f"{', '.join(mismatches[:5])}{', ...' if len(mismatches) > 5 else ''}")
+        compared += len(support)
+    return compared
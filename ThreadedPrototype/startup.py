@@ -0,0 +1,96 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+'''
+This class records how long each step of the prototype's startup takes: the imports of heavy libraries, which
+happen lazily inside the stages that need them, the model loads of the model registry, and the moment each stage
+comes online. report() breaks the startup time down by step.
+'''
+
+
+class StartupReport:
+    def __init__(self):
+        """
+        Initializes an empty StartupReport, timing from now.
+        Parameters: nothing
+        Returns: nothing
+        """
+        self.start_time = time.time()
+        self.steps = []     # (kind, name, start offset in seconds, duration in seconds, thread name)
+        self._lock = threading.Lock()
+
+    def add(self, kind, name, start, duration):
+        """
+        Records a step.
+        Parameters:
+            kind: the kind of step ("import", "load" or "online")
+            name: what was imported, loaded or came online
+            start: the time.time() the step started
+            duration: the number of seconds the step took
+        Returns: nothing
+        """
+        with self._lock:
+            self.steps.append((kind, name, start - self.start_time, duration, threading.current_thread().name))
+
+    @contextmanager
+    def step(self, kind, name):
+        """
+        Times the body of a with statement as a step.
+        Parameters:
+            kind: the kind of step
+            name: the name of the step
+        Returns: a context manager
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(kind, name, start, time.time() - start)
+
+    def mark(self, kind, name):
+        """
+        Records an instantaneous step, e.g. a stage coming online.
+        Parameters:
+            kind: the kind of step
+            name: the name of the step
+        Returns: nothing
+        """
+        self.add(kind, name, time.time(), 0.0)
+
+    def report(self):
+        """
+        Returns: a table of every step in the order they started, followed by the time spent per kind of step
+        """
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s[2])
+        lines = [f"{'step':<8} {'name':<32} {'start (s)':>10} {'took (s)':>9}  thread"]
+        for kind, name, start, duration, thread in steps:
+            lines.append(f"{kind:<8} {name:<32} {start:>10.2f} {duration:>9.2f}  {thread}")
+        totals = {}
+        for kind, _, _, duration, _ in steps:
+            totals[kind] = totals.get(kind, 0.0) + duration
+        end = max((start + duration for _, _, start, duration, _ in steps), default=0.0)
+        lines.append(", ".join(f"{kind} {total:.2f} s" for kind, total in totals.items() if total > 0)
+                     + f" (summed), {end:.2f} s wall clock")
+        return "\n".join(lines)
+
+
+# the report of this process's startup
+STARTUP = StartupReport()
+
+
+def lazy_import(module_name):
+    """
+    Imports a module when a stage first needs it, recording the import in STARTUP the first time.
+    Parameters: module_name: the full name of the module
+    Returns: the module
+    """
+    # always go through import_module: it waits on the module's import lock, so a module another thread is still
+    # importing is never returned half-initialized (sys.modules holds it from the start of its import)
+    if module_name in sys.modules:
+        return importlib.import_module(module_name)
+    with STARTUP.step("import", module_name):
+        return importlib.import_module(module_name)
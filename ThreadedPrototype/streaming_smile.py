@@ -0,0 +1,524 @@
+import numpy as np
+from startup import lazy_import
+
+'''
+This module computes openSMILE's emobase functionals incrementally for the live emotion and genre features.
+Instead of running the Functionals level of emobase on the whole analysis buffer on every update, the emobase
+low-level descriptors (LLDs) are extracted only for the audio received since the last update (plus a little
+context), their deltas are added, and the 19 functionals of every LLD and delta contour are maintained over the
+frames in the buffer: sums of powers and of frame-weighted values (means, moments, regression coefficients and
+quadratic regression error) and per-block extremes are updated in O(new frames). The percentiles and the
+absolute regression error have no running form and are computed in one vectorized pass over the window.
+The result has the layout of smile.process_signal() with emobase Functionals (988 values) and is close to it
+(see OPENSMILE_TOLERANCES).
+A reduced stream computes only a subset of the features (e.g. the ones the models' feature selectors keep): the
+contours no feature uses are not tracked, and the whole-window passes are skipped when no feature needs them.
+'''
+
+# the emobase LLDs (smoothed with a 3 frame moving average), in the order openSMILE outputs them
+EMOBASE_LLD_NAMES = (["pcm_intensity_sma", "pcm_loudness_sma"] + [f"mfcc_sma[{i}]" for i in range(1, 13)]
+                     + [f"lspFreq_sma[{i}]" for i in range(8)] + ["pcm_zcr_sma", "voiceProb_sma", "F0_sma", "F0env_sma"])
+# the emobase functionals of every contour, in the order openSMILE outputs them
+EMOBASE_FUNCTIONALS = ["max", "min", "range", "maxPos", "minPos", "amean",
+                       "linregc1", "linregc2", "linregerrA", "linregerrQ",
+                       "stddev", "skewness", "kurtosis",
+                       "quartile1", "quartile2", "quartile3", "iqr1-2", "iqr2-3", "iqr1-3"]
+N_FUNCTIONALS = len(EMOBASE_FUNCTIONALS)
+N_FEATURES = 2 * len(EMOBASE_LLD_NAMES) * N_FUNCTIONALS
+# the functionals that need a pass over every frame of the window
+ABSOLUTE_ERROR = [EMOBASE_FUNCTIONALS.index("linregerrA")]
+PERCENTILES = list(range(EMOBASE_FUNCTIONALS.index("quartile1"), N_FUNCTIONALS))
+
+FRAME_STEP = 0.010      # seconds between emobase LLD frames
+DELTA_WINDOW = 2        # frames on each side of openSMILE's delta regression
+# frames at the end of the extracted audio whose LLDs or deltas can still change once more audio arrives
+# (one frame for the moving average, DELTA_WINDOW for the deltas); they are recomputed on the next update
+HOLDBACK = 1 + DELTA_WINDOW
+# openSMILE's emobase functionals leave out the last LLD frames of their input (checked against
+# smile.process_signal() for many input lengths and both sampling rates)
+LEFT_OUT = 3
+
+
+def delta_name(lld_name):
+    """
+    Returns: the openSMILE name of the delta contour of an LLD, e.g. mfcc_sma[1] -> mfcc_sma_de[1]
+    """
+    if lld_name.endswith("]"):
+        base, index = lld_name.split("[")
+        return f"{base}_de[{index}"
+    return lld_name + "_de"
+
+
+def feature_names(lld_names=EMOBASE_LLD_NAMES):
+    """
+    Parameters: lld_names: the names of the LLDs
+    Returns: the names of the functionals, LLD contours first, then their deltas (the emobase layout)
+    """
+    contours = list(lld_names) + [delta_name(name) for name in lld_names]
+    return [f"{contour}_{functional}" for contour in contours for functional in EMOBASE_FUNCTIONALS]
+
+
+def deltas(contours, window=DELTA_WINDOW):
+    """
+    Computes openSMILE's delta regression coefficients, repeating the first and last frame at the edges.
+    Parameters:
+        contours: a numpy array of frames (rows) of LLDs (columns)
+        window: the number of frames on each side
+    Returns: a numpy array of the same shape
+    """
+    padded = np.concatenate([np.repeat(contours[:1], window, axis=0), contours,
+                             np.repeat(contours[-1:], window, axis=0)])
+    n = len(contours)
+    result = np.zeros_like(contours, dtype=np.float64)
+    for i in range(1, window + 1):
+        result += i * (padded[window + i:window + i + n] - padded[window - i:window - i + n])
+    return result / (2 * sum(i * i for i in range(1, window + 1)))
+
+
+# how close the functionals of StreamingSmile are to smile.process_signal() of the same audio, by functional: the
+# largest difference as a fraction of the range of the contour in the openSMILE features (its square for the
+# quadratic error, and per frame of the window for the slope), or in frames for the positions and absolute for the
+# skewness and kurtosis
+OPENSMILE_TOLERANCES = {"max": 0.03, "min": 0.03, "range": 0.05, "maxPos": 2, "minPos": 2, "amean": 0.01,
+                        "linregc1": 0.03, "linregc2": 0.02, "linregerrA": 0.01, "linregerrQ": 0.005,
+                        "stddev": 0.01, "skewness": 0.3, "kurtosis": 0.6,
+                        "quartile1": 0.015, "quartile2": 0.015, "quartile3": 0.015,
+                        "iqr1-2": 0.015, "iqr2-3": 0.015, "iqr1-3": 0.015}
+# a batch extraction starts every LLD over at the start of the audio, the stream has tracked them since long before:
+# - extremes in the first START_UP frames of either are start-up values (or the stream's frame grid starts later)
+# - the F0 envelope starts at 0 and takes about a second to reach the pitch, which moves all its functionals
+# - the pitch tracker takes a few frames to settle, which moves the functionals of F0 that weigh single frames
+START_UP = 5
+START_UP_CONTOURS = ["F0env_sma", "F0env_sma_de"]
+PITCH_CONTOURS = ["F0_sma", "F0_sma_de"]
+PITCH_START_UP_FUNCTIONALS = ["max", "min", "range", "maxPos", "minPos", "linregc1", "linregc2", "linregerrQ",
+                              "stddev", "skewness", "kurtosis"]
+
+
+def opensmile_mismatches(features, reference, indices=None, n_frames=None):
+    """
+    Compares features of a StreamingSmile with openSMILE's emobase functionals of the same audio.
+    Parameters:
+        features: a numpy array of shape (1, number of features) from StreamingSmile.update()
+        reference: a numpy array of shape (1, N_FEATURES) from smile.process_signal() with emobase Functionals
+        indices: the indices of the features in the full layout (StreamingSmile.features), all by default
+        n_frames: the number of LLD frames of the audio, to scale the slope with; from the reference by default
+    Returns: the names of the features that differ by more than OPENSMILE_TOLERANCES, leaving out the start-up
+    values of the extremes and of the pitch contours (see START_UP)
+    """
+    names = feature_names()
+    indices = np.arange(N_FEATURES) if indices is None else np.asarray(indices, dtype=np.int64)
+    reference = np.asarray(reference, dtype=np.float64).reshape(-1, N_FUNCTIONALS)
+    if n_frames is None:
+        n_frames = int(reference[:, 3:5].max()) + 1
+    mismatches = []
+    for value, index in zip(np.asarray(features, dtype=np.float64).reshape(-1).tolist(), indices.tolist()):
+        contour, functional = divmod(index, N_FUNCTIONALS)
+        name = EMOBASE_FUNCTIONALS[functional]
+        expected = reference[contour, functional]
+        contour_name = names[index][:-len(name) - 1]
+        if contour_name in START_UP_CONTOURS or (contour_name in PITCH_CONTOURS and name in PITCH_START_UP_FUNCTIONALS):
+            continue
+        start_up = {"max": reference[contour, 3] < START_UP, "min": reference[contour, 4] < START_UP}
+        start_up.update(maxPos=start_up["max"] or value < START_UP, minPos=start_up["min"] or value < START_UP,
+                        range=start_up["max"] or start_up["min"])
+        if start_up.get(name, False):
+            continue
+        scale = abs(reference[contour, 2])
+        if name in ("maxPos", "minPos", "skewness", "kurtosis"):
+            scale = 1.0
+        elif name == "linregc1":
+            scale /= n_frames
+        elif name == "linregerrQ":
+            scale **= 2
+        if not abs(value - expected) <= OPENSMILE_TOLERANCES[name] * scale:
+            mismatches.append(names[index])
+    return mismatches
+
+
+def _percentile_functionals(window, out):
+    """
+    Writes the quartiles and inter-quartile ranges of the window (frames x contours) into out (contours x 19).
+    """
+    q1, q2, q3 = np.quantile(window, [.25, .5, .75], axis=0)
+    out[:, 13], out[:, 14], out[:, 15] = q1, q2, q3
+    out[:, 16], out[:, 17], out[:, 18] = q2 - q1, q3 - q2, q3 - q1
+
+
+def batch_functionals(window):
+    """
+    Computes the 19 emobase functionals of every contour from scratch.
+    Parameters: window: a numpy array of frames (rows) of contours (columns)
+    Returns: a numpy array of the functionals, contour by contour
+    """
+    window = np.asarray(window, dtype=np.float64)
+    n, n_contours = window.shape
+    out = np.zeros((n_contours, N_FUNCTIONALS))
+    out[:, 0], out[:, 1] = window.max(axis=0), window.min(axis=0)
+    out[:, 2] = out[:, 0] - out[:, 1]
+    out[:, 3], out[:, 4] = window.argmax(axis=0), window.argmin(axis=0)
+    mean = window.mean(axis=0)
+    out[:, 5] = mean
+    x = np.arange(n) - (n - 1) / 2
+    sxx = np.dot(x, x)
+    slope = np.dot(x, window - mean) / sxx if sxx > 0 else np.zeros(n_contours)
+    out[:, 6], out[:, 7] = slope, mean - slope * (n - 1) / 2
+    residual = window - (mean + np.outer(x, slope))
+    out[:, 8], out[:, 9] = np.abs(residual).mean(axis=0), (residual ** 2).mean(axis=0)
+    centered = window - mean
+    variance = (centered ** 2).mean(axis=0)
+    _moment_functionals(variance, (centered ** 3).mean(axis=0), (centered ** 4).mean(axis=0), out)
+    _percentile_functionals(window, out)
+    return out.reshape(-1)
+
+
+def _moment_functionals(variance, m3, m4, out):
+    """
+    Writes the standard deviation, skewness and kurtosis from the central moments into out (0 for flat contours).
+    Needs the extremes in out; flatness is relative to them, as some contours (e.g. the intensity) are tiny.
+    """
+    variance = np.maximum(variance, 0)
+    flat = variance <= 1e-12 * np.maximum(np.abs(out[:, 0]), np.abs(out[:, 1])) ** 2
+    safe = np.where(flat, 1.0, variance)
+    out[:, 10] = np.sqrt(variance)
+    out[:, 11] = np.where(flat, 0.0, m3 / safe ** 1.5)
+    out[:, 12] = np.where(flat, 0.0, m4 / safe ** 2)
+
+
+class RunningFunctionals:
+    def __init__(self, n_contours, capacity, block=25, functionals=None):
+        """
+        Keeps the emobase functionals of a sliding window of frames up to date as frames are added and dropped.
+        Parameters:
+            n_contours: the number of contours (values per frame)
+            capacity: the maximum number of frames in the window
+            block: the number of frames per block of the running extremes
+            functionals: the indices of the functionals that are needed, all by default; the others may be
+                left at zero
+        Returns: nothing
+        """
+        needed = set(range(N_FUNCTIONALS) if functionals is None else np.asarray(functionals).tolist())
+        self.absolute_error = bool(needed.intersection(ABSOLUTE_ERROR))
+        self.percentiles = bool(needed.intersection(PERCENTILES))
+        self.n_contours = n_contours
+        self.capacity = capacity
+        self.block = block
+        self.frames = np.zeros((capacity, n_contours))     # frame k is stored at row k % capacity
+        self.n_blocks = capacity // block + 2
+        self.block_ids = np.full(self.n_blocks, -1, dtype=np.int64)
+        self.block_max = np.zeros((self.n_blocks, n_contours))
+        self.block_min = np.zeros((self.n_blocks, n_contours))
+        self.block_argmax = np.zeros((self.n_blocks, n_contours), dtype=np.int64)
+        self.block_argmin = np.zeros((self.n_blocks, n_contours), dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Empties the window.
+        Parameters: nothing
+        Returns: nothing
+        """
+        self.first = 0      # index of the first frame in the window
+        self.end = 0        # index one past the last frame in the window
+        self.block_ids[:] = -1
+        self._since_refresh = 0
+        self._set_sums(np.zeros(self.n_contours), 0)
+
+    def __len__(self):
+        return self.end - self.first
+
+    def _set_sums(self, shift, base):
+        # power sums of (value - shift) and the sum of (k - base) * (value - shift) over the frames k in the window
+        self.shift = shift
+        self.base = base
+        self.sums = np.zeros((4, self.n_contours))
+        self.weighted_sum = np.zeros(self.n_contours)
+
+    def _accumulate(self, indices, values, sign):
+        shifted = values - self.shift
+        power = shifted.copy()
+        for p in range(4):
+            self.sums[p] += sign * power.sum(axis=0)
+            power *= shifted
+        self.weighted_sum += sign * np.dot(indices - self.base, shifted)
+
+    def window(self, tail=None):
+        """
+        Parameters: tail: frames to append to the window without adding them (or None)
+        Returns: a numpy array of the frames in the window, oldest first
+        """
+        rows = self.frames[np.arange(self.first, self.end) % self.capacity]
+        return rows if tail is None or len(tail) == 0 else np.concatenate([rows, tail])
+
+    def push(self, start, values):
+        """
+        Appends frames to the window, dropping the oldest frames beyond the capacity.
+        Parameters:
+            start: the index of the first new frame; frames are consecutive, a gap empties the window first
+            values: a numpy array of the new frames (rows) of contours (columns)
+        Returns: nothing
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        if len(values) > self.capacity:
+            start += len(values) - self.capacity
+            values = values[-self.capacity:]
+        if len(self) == 0 or start != self.end:
+            self.reset()
+            self.first = self.end = start
+            self._set_sums(values.mean(axis=0), start)
+        self.drop_before(start + len(values) - self.capacity)
+        indices = np.arange(start, start + len(values))
+        self.frames[indices % self.capacity] = values
+        self._accumulate(indices, values, 1)
+        self._update_blocks(indices, values)
+        self.end = start + len(values)
+        self._since_refresh += len(values)
+        if self._since_refresh >= self.capacity:
+            self._refresh()
+
+    def drop_before(self, index):
+        """
+        Drops the frames before the given frame index from the window.
+        Parameters: index: the index of the first frame to keep
+        Returns: nothing
+        """
+        index = min(index, self.end)
+        if index <= self.first:
+            return
+        indices = np.arange(self.first, index)
+        self._accumulate(indices, self.frames[indices % self.capacity], -1)
+        self.first = index
+        if len(self) == 0:
+            self.reset()
+            self.first = self.end = index
+
+    def _refresh(self):
+        # adding and subtracting frames accumulates rounding errors: recompute the sums from the window now and then
+        self._since_refresh = 0
+        window = self.window()
+        self._set_sums(window.mean(axis=0), self.first)
+        self._accumulate(np.arange(self.first, self.end), window, 1)
+
+    def _update_blocks(self, indices, values):
+        for block_id in np.unique(indices // self.block).tolist():
+            rows = indices // self.block == block_id
+            block_indices, block_values = indices[rows], values[rows]
+            slot = block_id % self.n_blocks
+            maxima, minima = block_values.max(axis=0), block_values.min(axis=0)
+            argmax = block_indices[block_values.argmax(axis=0)]
+            argmin = block_indices[block_values.argmin(axis=0)]
+            if self.block_ids[slot] != block_id:
+                self.block_ids[slot] = block_id
+                self.block_max[slot], self.block_min[slot] = maxima, minima
+                self.block_argmax[slot], self.block_argmin[slot] = argmax, argmin
+                continue
+            # earlier frames of the block win ties, like the first occurrence in openSMILE
+            higher, lower = maxima > self.block_max[slot], minima < self.block_min[slot]
+            self.block_max[slot] = np.where(higher, maxima, self.block_max[slot])
+            self.block_argmax[slot] = np.where(higher, argmax, self.block_argmax[slot])
+            self.block_min[slot] = np.where(lower, minima, self.block_min[slot])
+            self.block_argmin[slot] = np.where(lower, argmin, self.block_argmin[slot])
+
+    def _extremes(self, tail):
+        """
+        Returns: the maxima, minima and their frame indices of the window and the tail, from the block extremes
+        (the first block may be partly dropped already, so it is scanned)
+        """
+        first_block = self.first // self.block
+        split = min((first_block + 1) * self.block, self.end)
+        head = np.arange(self.first, split)
+        head_values = self.frames[head % self.capacity]
+        maxima, minima = [head_values.max(axis=0)], [head_values.min(axis=0)]
+        argmax, argmin = [head[head_values.argmax(axis=0)]], [head[head_values.argmin(axis=0)]]
+        for block_id in range(first_block + 1, (self.end - 1) // self.block + 1):
+            slot = block_id % self.n_blocks
+            maxima.append(self.block_max[slot])
+            minima.append(self.block_min[slot])
+            argmax.append(self.block_argmax[slot])
+            argmin.append(self.block_argmin[slot])
+        if tail is not None and len(tail):
+            tail_indices = np.arange(self.end, self.end + len(tail))
+            maxima.append(tail.max(axis=0))
+            minima.append(tail.min(axis=0))
+            argmax.append(tail_indices[tail.argmax(axis=0)])
+            argmin.append(tail_indices[tail.argmin(axis=0)])
+        maxima, minima = np.array(maxima), np.array(minima)
+        columns = np.arange(self.n_contours)
+        best_max, best_min = maxima.argmax(axis=0), minima.argmin(axis=0)
+        return (maxima[best_max, columns], minima[best_min, columns],
+                np.array(argmax)[best_max, columns], np.array(argmin)[best_min, columns])
+
+    def functionals(self, tail=None):
+        """
+        Computes the 19 emobase functionals of every contour over the window.
+        Parameters: tail: provisional frames that follow the window and count as part of it, but are not added
+        Returns: a numpy array of the functionals, contour by contour (zeros for an empty window)
+        """
+        out = np.zeros((self.n_contours, N_FUNCTIONALS))
+        if len(self) == 0:
+            return out.reshape(-1)
+        sums, weighted_sum = self.sums.copy(), self.weighted_sum.copy()
+        n = len(self)
+        if tail is not None and len(tail):
+            tail = np.asarray(tail, dtype=np.float64)
+            shifted = tail - self.shift
+            power = shifted.copy()
+            for p in range(4):
+                sums[p] += power.sum(axis=0)
+                power *= shifted
+            weighted_sum += np.dot(np.arange(self.end, self.end + len(tail)) - self.base, shifted)
+            n += len(tail)
+
+        # extremes, with positions in frames from the start of the window
+        maxima, minima, argmax, argmin = self._extremes(tail)
+        out[:, 0], out[:, 1], out[:, 2] = maxima, minima, maxima - minima
+        out[:, 3], out[:, 4] = argmax - self.first, argmin - self.first
+
+        # mean and central moments from the power sums of the shifted values
+        mean = sums[0] / n
+        out[:, 5] = mean + self.shift
+        m2, m3, m4 = sums[1] / n, sums[2] / n, sums[3] / n
+        variance = m2 - mean ** 2
+        central3 = m3 - 3 * mean * m2 + 2 * mean ** 3
+        central4 = m4 - 4 * mean * m3 + 6 * mean ** 2 * m2 - 3 * mean ** 4
+        _moment_functionals(variance, central3, central4, out)
+
+        # linear regression over the frame positions 0 .. n - 1
+        sum_x = n * (n - 1) / 2
+        sxx = n * (n - 1) * (2 * n - 1) / 6 - sum_x ** 2 / n
+        sxy = weighted_sum - (self.first - self.base) * sums[0] - sum_x * sums[0] / n
+        slope = sxy / sxx if sxx > 0 else np.zeros(self.n_contours)
+        out[:, 6] = slope
+        out[:, 7] = out[:, 5] - slope * (n - 1) / 2
+        out[:, 9] = np.maximum(n * np.maximum(variance, 0) - slope * sxy, 0) / n
+
+        # the absolute regression error and the percentiles need every frame
+        if self.absolute_error or self.percentiles:
+            window = self.window(tail)
+            if self.absolute_error:
+                out[:, 8] = np.abs(window - out[:, 7] - np.outer(np.arange(n), slope)).mean(axis=0)
+            if self.percentiles:
+                _percentile_functionals(window, out)
+        return out.reshape(-1)
+
+
+class OpenSmileLLDs:
+    def __init__(self, sampling_rate=44100):
+        """
+        Extracts the emobase LLDs with openSMILE, imported when first used.
+        Parameters: sampling_rate: the sampling rate of the signals
+        Returns: nothing
+        """
+        self.sampling_rate = sampling_rate
+        self.smile = None
+
+    def __call__(self, signal, sampling_rate):
+        """
+        Parameters:
+            signal: the audio samples (integer samples are taken as int16 and scaled to [-1, 1])
+            sampling_rate: their sampling rate
+        Returns:
+            starts: a numpy array of the start time of every frame, in seconds from the start of the signal
+            llds: a numpy array of the frames (rows) of LLDs (columns, in the order of EMOBASE_LLD_NAMES)
+        """
+        if np.issubdtype(np.asarray(signal).dtype, np.integer):
+            # openSMILE takes samples in [-1, 1], like the audio files the models' features were extracted from
+            signal = np.asarray(signal, dtype=np.float32) / 2 ** 15
+        if self.smile is None:
+            opensmile = lazy_import("opensmile")
+            self.smile = opensmile.Smile(
+                feature_set=opensmile.FeatureSet.emobase,
+                feature_level=opensmile.FeatureLevel.LowLevelDescriptors,
+                sampling_rate=self.sampling_rate,
+            )
+        llds = self.smile.process_signal(signal, sampling_rate)
+        starts = llds.index.get_level_values("start").total_seconds().to_numpy()
+        return starts, llds.to_numpy(dtype=np.float64)
+
+
+class StreamingSmile:
+    def __init__(self, sampling_rate=44100, window_seconds=4, context_seconds=0.5, lld_func=None,
+                 lld_names=EMOBASE_LLD_NAMES, features=None):
+        """
+        Computes the emobase functionals of the last window_seconds of a stream of audio incrementally.
+        Parameters:
+            sampling_rate: the sampling rate of the stream
+            window_seconds: the longest signal passed to update()
+            context_seconds: the audio before the first new frame that is extracted again, so the LLDs that
+                smooth or track over time (moving averages, pitch, F0 envelope) settle before the new frames
+            lld_func: a function (signal, sampling_rate) -> (frame start times, LLDs), openSMILE's emobase LLDs
+                by default
+            lld_names: the names of the LLDs lld_func returns
+            features: the indices (in the full layout of feature_names(lld_names)) of the features to compute,
+                in the order update() returns them; all features by default
+        Returns: nothing
+        """
+        self.sampling_rate = sampling_rate
+        self.step = int(round(FRAME_STEP * sampling_rate))     # samples per frame
+        self.context = int(round(context_seconds * sampling_rate))
+        self.lld_func = OpenSmileLLDs(sampling_rate) if lld_func is None else lld_func
+        self.n_llds = len(lld_names)
+        all_names = feature_names(lld_names)
+        if features is None:
+            features = np.arange(len(all_names))
+        features = np.asarray(features, dtype=np.int64)
+        self.features = features
+        self.feature_names = [all_names[i] for i in features.tolist()]
+        # the contours (LLDs, then deltas) the features are functionals of, and where each feature is found
+        # in the functionals of the tracked contours
+        self.contours = np.unique(features // N_FUNCTIONALS)
+        self.delta_llds = self.contours[self.contours >= self.n_llds] - self.n_llds
+        self.output_index = (np.searchsorted(self.contours, features // N_FUNCTIONALS) * N_FUNCTIONALS
+                             + features % N_FUNCTIONALS)
+        self.running = RunningFunctionals(len(self.contours), int(np.ceil(window_seconds / FRAME_STEP)) + 1,
+                                          functionals=np.unique(features % N_FUNCTIONALS))
+        self.committed = None   # index of the next frame to add to the running functionals (None: start over)
+        self.extracted_frames = 0   # number of LLD frames extracted, context included
+
+    def update(self, signal, cursor):
+        """
+        Updates the functionals with the audio received since the last update.
+        Parameters:
+            signal: the last samples of the stream (at most window_seconds)
+            cursor: the total number of samples of the stream up to the end of signal
+        Returns: a numpy array of shape (1, number of features) with the functionals of the frames in signal
+        """
+        signal_start = cursor - len(signal)
+        first_frame = -(-signal_start // self.step)     # the first frame that starts inside the signal
+        if self.committed is None or self.committed < first_frame:
+            # first update, or the stream skipped ahead (e.g. while the input was gated): start over
+            self.running.reset()
+            self.committed = first_frame
+            chunk_frame = first_frame
+        else:
+            chunk_frame = max(first_frame, (self.committed * self.step - self.context) // self.step)
+        chunk = signal[chunk_frame * self.step - signal_start:]
+
+        starts, llds = self.lld_func(chunk, self.sampling_rate)
+        frames = self._contours(llds)
+        indices = chunk_frame + np.round(np.asarray(starts) / FRAME_STEP).astype(np.int64)
+        self.extracted_frames += len(frames)
+
+        # the last frames are provisional until the audio after them has arrived
+        final = len(frames) - HOLDBACK
+        new = (indices >= self.committed) & (np.arange(len(frames)) < final)
+        if new.any():
+            self.running.push(int(indices[new][0]), frames[new])
+            self.committed = int(indices[new][-1]) + 1
+        self.running.drop_before(first_frame)
+        # like openSMILE, the functionals leave out the last LEFT_OUT frames; provisional frames before them count
+        counted = (np.arange(len(frames)) >= max(final, 0)) & (np.arange(len(frames)) < len(frames) - LEFT_OUT)
+        tail = frames[counted & (indices >= self.committed)]
+        return self.running.functionals(tail)[self.output_index].reshape(1, -1)
+
+    def _contours(self, llds):
+        """
+        Returns: the tracked contours of the frames of LLDs: the needed LLDs followed by the needed deltas
+        """
+        llds = np.asarray(llds, dtype=np.float64).reshape(-1, self.n_llds)
+        plain = self.contours[self.contours < self.n_llds]
+        if len(llds) == 0 or len(self.delta_llds) == 0:
+            return llds[:, plain] if len(llds) else np.zeros((0, len(self.contours)))
+        return np.concatenate([llds[:, plain], deltas(llds[:, self.delta_llds])], axis=1)
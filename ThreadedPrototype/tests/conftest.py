@@ -0,0 +1,6 @@
+import pathlib
+import sys
+
+# The prototype imports its modules by their top-level names (e.g. "from AudioThreadWithBufferPorted import *"),
+# so make ThreadedPrototype importable when pytest is run from anywhere.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pytest
+
+from resampler import StreamingResampler
+
+CHUNK = 1024
+RATE = 44100
+
+
+def test_analysis_views_end_after_the_same_chunk() -> None:
+    pytest.importorskip("pyaudio")
+    from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+
+    rng = np.random.default_rng(0)
+    chunks = [rng.normal(scale=3000, size=CHUNK).astype(np.int16) for _ in range(4)]
+    seen = []
+
+    def process(signal):
+        seen.append(thread.analysis_snapshot)
+        # a chunk that arrives while the analysis runs does not change what it reads
+        thread.ingest(chunks[3].tobytes())
+        return len(signal)
+
+    thread = AudioThreadWithBufferPorted("snapshot_test", rate=RATE, starting_chunk_size=CHUNK, process_func=process,
+                                         analysis_hop=0.0, resample_rate=22050)
+    for chunk in chunks[:3]:
+        thread.ingest(chunk.tobytes())
+    thread.analysis_worker.analyse()
+
+    snapshot = seen[0]
+    assert snapshot.cursor == 3 * CHUNK
+    np.testing.assert_array_equal(snapshot.samples, np.concatenate(chunks[:3]))
+    # the resampled view is the resampled audio of exactly the same chunks
+    resampler = StreamingResampler(RATE, 22050)
+    expected = np.concatenate([resampler.process(chunk / np.float32(2**15)) for chunk in chunks[:3]])
+    assert snapshot.resampled_cursor == len(expected)
+    np.testing.assert_allclose(snapshot.resampled, expected, rtol=1e-6)
+    assert thread.results.get() == (1, snapshot.capture_time, 3 * CHUNK)
+    assert thread.analysis_worker.processed_cursor == 3 * CHUNK
+
+
+def test_snapshot_retries_are_bounded_and_yield(monkeypatch) -> None:
+    pytest.importorskip("pyaudio")
+    import AudioThreadWithBufferPorted as audio_thread_module
+
+    thread = audio_thread_module.AudioThreadWithBufferPorted("retry_test", rate=RATE, starting_chunk_size=CHUNK,
+                                                            process_func=len, analysis_hop=0.0)
+    thread.ingest(np.zeros(CHUNK, dtype=np.int16).tobytes())
+    copies, sleeps = [], []
+    # a writer that always overwrites the copy before it is validated
+    monkeypatch.setattr(thread.audio_buffer, "snapshot_at", lambda n, cursor: copies.append(cursor))
+    monkeypatch.setattr(audio_thread_module.time, "sleep", sleeps.append)
+    with pytest.raises(RuntimeError):
+        thread.take_analysis_snapshot()
+    assert len(copies) == audio_thread_module.SNAPSHOT_RETRIES + 1
+    assert sleeps == [0] * audio_thread_module.SNAPSHOT_RETRIES
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import time
+
+import numpy as np
+
+from analysis_worker import AnalysisSnapshot, AnalysisWorkerThread
+from ring_buffer import RingBuffer
+from versioned import VersionedValue
+
+RATE = 1000
+
+
+class FakeAudioThread:
+    """The parts of AudioThreadWithBufferPorted the worker uses, fed by hand instead of PyAudio."""
+
+    def __init__(self, hop, analysis_seconds=0.0):
+        self.RATE = RATE
+        self.pred_length = 1
+        self.audio_buffer = RingBuffer(2 * RATE)
+        self.results = VersionedValue()
+        self.last_chunk_time = 0.0
+        self.args_before = ()
+        self.args_after = ()
+        self.analysis_seconds = analysis_seconds
+        self.run_times = []
+        self.analysis_worker = AnalysisWorkerThread("analysis_test", self, hop=hop)
+
+    def process_func(self, samples):
+        self.run_times.append(time.time())
+        time.sleep(self.analysis_seconds)
+        return len(samples)
+
+    def take_analysis_snapshot(self):
+        samples, cursor = self.audio_buffer.snapshot(self.pred_length * self.RATE)
+        return AnalysisSnapshot(samples, cursor, None, 0, self.last_chunk_time)
+
+    def gate_analysis(self):
+        return False
+
+    def ingest(self, n):
+        self.audio_buffer.write(np.ones(n, dtype=np.int16))
+        self.last_chunk_time = time.time()
+        self.analysis_worker.notify()
+
+
+def test_callback_only_notifies_and_result_is_published() -> None:
+    audio = FakeAudioThread(hop=0.0, analysis_seconds=0.2)
+    audio.analysis_worker.start()
+    try:
+        start = time.time()
+        audio.ingest(100)
+        # ingesting does not wait for the analysis
+        assert time.time() - start < 0.1
+        audio.analysis_worker.wait_processed(100)
+        seq, timestamp, value = audio.results.get()
+        assert (seq, timestamp, value) == (1, audio.last_chunk_time, 100)
+        assert audio.analysis_worker.processed_cursor == 100
+    finally:
+        audio.analysis_worker.stop_request = True
+
+
+def test_runs_at_most_once_per_hop_on_the_latest_audio() -> None:
+    hop = 0.1
+    audio = FakeAudioThread(hop=hop)
+    audio.analysis_worker.start()
+    try:
+        deadline = time.time() + 0.6
+        while time.time() < deadline:
+            audio.ingest(10)
+            time.sleep(0.005)
+        audio.analysis_worker.wait_processed(audio.audio_buffer.write_cursor)
+    finally:
+        audio.analysis_worker.stop_request = True
+    gaps = np.diff(audio.run_times)
+    assert 3 <= len(audio.run_times) <= 8
+    assert np.all(gaps >= hop * 0.9)
+    # the last run saw all the audio, not the audio of the first notification
+    assert audio.results.value == min(audio.audio_buffer.write_cursor, RATE)
+
+
+def test_wait_processed_returns_when_the_worker_stops() -> None:
+    audio = FakeAudioThread(hop=0.0)
+    audio.analysis_worker.start()
+    audio.analysis_worker.stop_request = True
+    start = time.time()
+    audio.analysis_worker.wait_processed(10 ** 6)
+    assert time.time() - start < 0.5
+
+
+def test_a_failed_analysis_does_not_stop_the_worker(capsys) -> None:
+    audio = FakeAudioThread(hop=0.0)
+    calls = []
+
+    def fail_once(samples):
+        calls.append(len(samples))
+        if len(calls) == 1:
+            raise ValueError("bad snapshot")
+        return len(samples)
+    audio.process_func = fail_once
+    audio.analysis_worker.start()
+    try:
+        audio.ingest(100)
+        audio.analysis_worker.wait_processed(100)
+        assert audio.results.seq == 0
+        assert audio.analysis_worker.failures == 1
+        assert isinstance(audio.analysis_worker.last_error, ValueError)
+        audio.ingest(50)
+        audio.analysis_worker.wait_processed(150)
+        assert audio.analysis_worker.is_alive()
+        assert audio.results.get()[::2] == (1, 150)
+    finally:
+        audio.analysis_worker.stop_request = True
+    assert "bad snapshot" in capsys.readouterr().err
+
+
+def test_a_failed_snapshot_is_retried_on_the_next_hop() -> None:
+    audio = FakeAudioThread(hop=0.0)
+    take_analysis_snapshot = audio.take_analysis_snapshot
+    attempts = []
+
+    def overwritten_once():
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise RuntimeError("overwritten")
+        return take_analysis_snapshot()
+    audio.take_analysis_snapshot = overwritten_once
+    audio.analysis_worker.start()
+    try:
+        audio.ingest(100)
+        audio.analysis_worker.wait_processed(100)
+        assert len(attempts) == 2 and audio.analysis_worker.failures == 1
+        assert audio.results.get()[::2] == (1, 100)
+    finally:
+        audio.analysis_worker.stop_request = True
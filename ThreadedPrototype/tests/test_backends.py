@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pathlib
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from basic_pitch_modified import ICASSP_2022_MODEL_PATH
+from basic_pitch_modified.backends import OUTPUT_KEYS, benchmark, convert_to_onnx, convert_to_tflite, load_model
+from basic_pitch_modified.constants import AUDIO_N_SAMPLES
+
+# quantized weights change the outputs slightly; the posteriorgrams are probabilities in [0, 1]
+TOLERANCES = {None: 1e-4, "float16": 1e-2, "int8": 5e-2}
+
+
+@pytest.fixture(scope="module")
+def saved_model() -> Any:
+    pytest.importorskip("tensorflow")
+    return load_model(ICASSP_2022_MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def audio_windowed() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(AUDIO_N_SAMPLES) / 22050
+    # a chord plus some noise, so every output has non-trivial activations
+    tones = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.18, 329.63)) / 3
+    windows = [tones, tones * 0.3 + rng.normal(0, 0.05, AUDIO_N_SAMPLES), np.zeros(AUDIO_N_SAMPLES)]
+    return np.stack(windows).astype(np.float32)[:, :, np.newaxis]
+
+
+def to_numpy(output: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    return {key: np.asarray(output[key]) for key in OUTPUT_KEYS}
+
+
+@pytest.mark.parametrize("quantization", [None, "float16", "int8"])
+def test_tflite_matches_saved_model(
+    saved_model: Any, audio_windowed: np.ndarray, tmp_path: pathlib.Path, quantization: str
+) -> None:
+    path = convert_to_tflite(tmp_path / "nmp.tflite", quantization=quantization)
+    expected = to_numpy(saved_model(audio_windowed))
+    output = load_model(path)(audio_windowed)
+    for key in OUTPUT_KEYS:
+        assert output[key].shape == expected[key].shape
+        np.testing.assert_allclose(output[key], expected[key], atol=TOLERANCES[quantization])
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_onnx_matches_saved_model(
+    saved_model: Any, audio_windowed: np.ndarray, tmp_path: pathlib.Path, quantization: str
+) -> None:
+    pytest.importorskip("tf2onnx")
+    pytest.importorskip("onnxruntime")
+    path = convert_to_onnx(tmp_path / "nmp.onnx", quantization=quantization)
+    expected = to_numpy(saved_model(audio_windowed))
+    output = load_model(path)(audio_windowed)
+    for key in OUTPUT_KEYS:
+        assert output[key].shape == expected[key].shape
+        np.testing.assert_allclose(output[key], expected[key], atol=TOLERANCES[quantization])
+
+
+def test_latency_comparison(saved_model: Any, tmp_path: pathlib.Path) -> None:
+    latencies = {"savedmodel": benchmark(saved_model, n_runs=5)}
+    latencies["tflite"] = benchmark(load_model(convert_to_tflite(tmp_path / "nmp.tflite")), n_runs=5)
+    print("Basic Pitch latency per 3-window call:", ", ".join(f"{k} {v:.1f} ms" for k, v in latencies.items()))
+    assert all(np.isfinite(v) and v > 0 for v in latencies.values())
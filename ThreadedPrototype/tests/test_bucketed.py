@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from basic_pitch_modified.constants import AUDIO_N_SAMPLES
+
+
+class WindowMeanModel:
+    """Stand-in for the saved model whose outputs identify their window: each is the window's mean."""
+
+    def __call__(self, audio_windowed: Any) -> Dict[str, Any]:
+        import tensorflow as tf
+
+        mean = tf.reduce_mean(audio_windowed, axis=1)
+        return {"note": mean, "onset": mean * 2}
+
+
+def windows(n: int) -> np.ndarray:
+    return np.repeat(np.arange(1, n + 1, dtype=np.float32), AUDIO_N_SAMPLES).reshape(n, AUDIO_N_SAMPLES, 1)
+
+
+@pytest.mark.parametrize("n_windows", [1, 3, 4, 9])
+def test_padding_is_dropped_and_rows_keep_their_order(n_windows: int) -> None:
+    pytest.importorskip("tensorflow")
+    from basic_pitch_modified.bucketed import BucketedModel
+
+    model = BucketedModel(WindowMeanModel(), buckets=(1, 2, 4))
+    output = model(windows(n_windows))
+    expected = np.arange(1, n_windows + 1, dtype=np.float32).reshape(-1, 1)
+    np.testing.assert_allclose(output["note"], expected)
+    np.testing.assert_allclose(output["onset"], expected * 2)
+
+
+def test_calls_after_warm_up_do_not_trace_again() -> None:
+    pytest.importorskip("tensorflow")
+    from basic_pitch_modified.bucketed import BucketedModel
+
+    model = BucketedModel(WindowMeanModel(), buckets=(1, 2, 4))
+    assert set(model.warm_up()) == {1, 2, 4}
+    assert model.trace_counts == {1: 1, 2: 1, 4: 1}
+    for n_windows in (1, 2, 3, 5, 7, 9, 12):
+        model(windows(n_windows))
+    assert model.trace_counts == {1: 1, 2: 1, 4: 1}
+    assert "batch 4: 1 trace(s)" in model.report()
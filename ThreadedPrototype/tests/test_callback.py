@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pytest
+
+CHUNK = 256
+
+
+@pytest.mark.parametrize("channels", [1, 2, 4, 8])
+def test_vectorized_downmix_matches_the_legacy_callback(channels: int) -> None:
+    pytest.importorskip("pyaudio")
+    from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+    from benchmark_callback import legacy_callback
+
+    def audio_thread():
+        return AudioThreadWithBufferPorted("callback_test", rate=8000, starting_chunk_size=CHUNK, process_func=None,
+                                           analysis_hop=1.0, channels=channels)
+
+    vectorized, legacy = audio_thread(), audio_thread()
+    rng = np.random.default_rng(channels)
+    for scale in (3000, 20, 30000):
+        in_data = np.clip(rng.normal(scale=scale, size=CHUNK * channels), -2**15, 2**15 - 1).astype(np.int16)
+        vectorized.ingest(in_data.tobytes())
+        legacy_callback(legacy, in_data.tobytes())
+        assert vectorized.input_on == legacy.input_on
+
+    np.testing.assert_array_equal(vectorized.audio_buffer.get_last(3 * CHUNK), legacy.audio_buffer.get_last(3 * CHUNK))
+
+
+def test_stereo_is_averaged_and_truncated() -> None:
+    pytest.importorskip("pyaudio")
+    from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+
+    thread = AudioThreadWithBufferPorted("callback_test", rate=8000, starting_chunk_size=4, process_func=None,
+                                         analysis_hop=1.0, channels=2)
+    thread.ingest(np.array([1, 2, -3, -4, 100, 200, -7, 8], dtype=np.int16).tobytes())
+    np.testing.assert_array_equal(thread.audio_buffer.get_last(4), [1, -3, 150, 0])
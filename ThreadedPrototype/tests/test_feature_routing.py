@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+
+from feature_routing import FeatureRouter
+from smile_layout import SmileLayout
+from streaming_smile import N_FEATURES
+from test_smile_layout import fitted_selectors
+
+
+def test_model_inputs_match_selector_transform_without_allocating() -> None:
+    selectors = fitted_selectors(N_FEATURES, n_extra=18)
+    layout = SmileLayout.from_selectors(selectors)
+    router = FeatureRouter(layout)
+    rng = np.random.default_rng(3)
+    buffers = {}
+    for _ in range(3):
+        full = rng.normal(size=(1, N_FEATURES))
+        extra = rng.normal(size=(1, 18))
+        router.update(full[:, layout.indices], extra=extra)
+        for name, selector in selectors.items():
+            x = np.concatenate([full, extra], axis=1)[:, :selector.n_features_in_]
+            model_input = router.model_input(name)
+            np.testing.assert_array_equal(model_input, selector.transform(x))
+            # the same buffer is filled on every update
+            assert buffers.setdefault(name, model_input) is model_input
+
+
+def test_full_extraction_routes_from_the_selectors() -> None:
+    selectors = fitted_selectors(N_FEATURES, n_extra=18)
+    del selectors["with_extra"]
+    router = FeatureRouter.from_selectors(None, selectors)
+    assert router.n_extra == 0 and router.n_smile == N_FEATURES
+    full = np.random.default_rng(4).normal(size=(1, N_FEATURES))
+    router.update(full)
+    for name, selector in selectors.items():
+        np.testing.assert_array_equal(router.model_input(name), selector.transform(full))
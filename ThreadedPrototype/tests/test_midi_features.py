@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pretty_midi
+import pytest
+
+from basic_pitch_modified.constants import N_FREQ_BINS_CONTOURS
+from basic_pitch_modified.note_creation import NOTE_DTYPE, NoteArray, model_output_to_note_array
+from midi_features import estimate_tempo, get_midi_features, normalize_features
+from test_note_creation import synthetic_posteriorgram
+
+
+def prettymidi_features(midi_obj: pretty_midi.PrettyMIDI) -> np.ndarray:
+    """The PrettyMIDI features the live path extracted from note_array.to_midi() before it used note arrays.
+
+    The genre model was trained on the same features (src/genre/features/extract.get_midi_features), apart from the
+    tempo of a failed estimate.
+    """
+    try:
+        tempo = midi_obj.estimate_tempo()
+    except ValueError:
+        tempo = 120
+    ts_changes = midi_obj.time_signature_changes
+    ts_1, ts_2 = (ts_changes[0].numerator, ts_changes[0].denominator) if ts_changes else (4, 4)
+    melody = midi_obj.get_pitch_class_histogram()
+    pitch_class_hist = np.sum(midi_obj.get_chroma(), axis=1)
+    features = [tempo, len(ts_changes), midi_obj.resolution, ts_1, ts_2, np.sum(melody > 0),
+                np.max(melody) - np.min(melody)] + list(pitch_class_hist)
+    normalized = [(features[0] - 150) / 300, (features[1] - 2) / 10, (features[2] - 260) / 400,
+                  (features[3] - 3) / 8, (features[4] - 3) / 8, features[5] / 10, features[6] / 80]
+    return np.asarray(normalized + [f / 100 for f in features[7:-1]])
+
+
+def decoded_note_array(seed: int, include_pitch_bends: bool) -> NoteArray:
+    frames, onsets = synthetic_posteriorgram(seed)
+    contours = np.random.default_rng(seed).uniform(0, 1, size=(len(frames), N_FREQ_BINS_CONTOURS)).astype(np.float32)
+    return model_output_to_note_array(
+        {"note": frames, "onset": onsets, "contour": contours},
+        onset_thresh=0.5,
+        frame_thresh=0.3,
+        min_note_len=11,
+        include_pitch_bends=include_pitch_bends,
+    )
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("include_pitch_bends", [False, True])
+def test_features_match_prettymidi(seed: int, include_pitch_bends: bool) -> None:
+    note_array = decoded_note_array(seed, include_pitch_bends)
+    expected = prettymidi_features(note_array.to_midi())
+    features = get_midi_features(note_array)
+    assert features.shape == (18,)
+    np.testing.assert_allclose(features, expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_large_pitch_bends_match_prettymidi(seed: int) -> None:
+    # bends beyond a semitone in both directions, clipped at two semitones, shift whole piano roll rows
+    # a monophonic line (only non-overlapping notes keep their bends) with a few overlapping notes
+    rng = np.random.default_rng(seed)
+    n = 40
+    notes = np.zeros(n, dtype=NOTE_DTYPE)
+    gaps = rng.uniform(0.1, 0.6, n)
+    notes["start"] = np.cumsum(gaps)
+    notes["end"] = notes["start"] + gaps * np.where(rng.uniform(size=n) < 0.8, rng.uniform(0.3, 1.0, n), 2.5)
+    notes["pitch"] = rng.integers(30, 100, n)
+    notes["velocity"] = rng.integers(20, 127, n)
+    offsets = np.concatenate([[0], np.cumsum(rng.integers(0, 30, n))])
+    bends = rng.integers(-8, 9, offsets[-1])
+    note_array = NoteArray(notes, bends, offsets)
+    assert len(note_array.midi_pitch_bends()[0]) > 0
+    np.testing.assert_allclose(get_midi_features(note_array), prettymidi_features(note_array.to_midi()), rtol=1e-9)
+
+
+def test_tempo_matches_prettymidi() -> None:
+    rng = np.random.default_rng(1)
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(0)
+    onsets = np.cumsum(rng.choice([0.03, 0.125, 0.25, 0.5, 0.75], size=200))
+    instrument.notes = [pretty_midi.Note(100, 60, t, t + 0.1) for t in onsets.tolist()]
+    midi.instruments.append(instrument)
+    assert estimate_tempo(onsets) == midi.estimate_tempo()
+    assert estimate_tempo(onsets[:1], default_tempo=0) == 0
+
+
+def test_empty_note_array() -> None:
+    note_array = NoteArray(np.zeros(0, dtype=NOTE_DTYPE))
+    np.testing.assert_allclose(get_midi_features(note_array), prettymidi_features(note_array.to_midi()))
+    assert normalize_features(np.zeros(19)).shape == (18,)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+import time
+
+import pytest
+
+from model_registry import ModelRegistry
+
+
+def test_models_load_once_and_lazily() -> None:
+    registry = ModelRegistry(verbose=False)
+    calls = []
+
+    def slow_loader() -> object:
+        calls.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return object()
+
+    registry.register("slow", slow_loader)
+    assert calls == [] and not registry.is_loaded("slow")
+
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get("slow"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(model is models[0] for model in models)
+    assert registry.load_times["slow"] >= 0.05
+    assert "slow" in registry.report()
+
+
+def test_preload_and_ad_hoc_loaders() -> None:
+    registry = ModelRegistry(verbose=False)
+    registry.register("a", lambda: "model a")
+    registry.preload().join()
+    assert registry.is_loaded("a")
+    assert registry.get("b", lambda: "model b") == "model b"
+    assert registry.get("b", lambda: "ignored") == "model b"
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+def test_preload_loads_independent_models_concurrently() -> None:
+    registry = ModelRegistry(verbose=False)
+    barrier = threading.Barrier(3, timeout=5)
+    for name in "abc":
+        # each load only finishes once all three are loading at the same time
+        registry.register(name, lambda name=name: (barrier.wait(), name)[1])
+    registry.register("broken", lambda: 1 / 0)
+    registry.preload(["a", "b", "c", "broken"], max_workers=3).join(timeout=10)
+    assert all(registry.is_loaded(name) for name in "abc")
+    assert not registry.is_loaded("broken")
+    with pytest.raises(ZeroDivisionError):
+        registry.get("broken")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pretty_midi
+import pytest
+import scipy.signal
+
+from basic_pitch_modified.constants import ANNOTATIONS_N_SEMITONES, N_FREQ_BINS_CONTOURS
+from basic_pitch_modified.note_creation import (
+    MAX_FREQ_IDX,
+    MIDI_OFFSET,
+    _melodia_notes,
+    drop_overlapping_pitch_bends,
+    get_pitch_bends,
+    midi_pitch_to_contour_bin,
+    model_output_to_note_array,
+    model_output_to_notes,
+    output_to_notes_polyphonic,
+    overlapping_notes,
+)
+
+# same events as the upstream basic-pitch test: (start, end, pitch, amplitude, pitch_bend)
+NOTE_EVENTS_WITH_PITCH_BENDS = [
+    (0.0, 0.1, 60, 1.0, None),
+    (2.0, 2.1, 62, 1.0, [0, 1, 2]),  # οverlaps w next
+    (2.0, 2.1, 64, 1.0, [0, 1, 2]),  # overlaps w prev
+    (1.0, 1.1, 65, 1.0, [0, 1, 2]),
+    (1.1, 1.2, 67, 1.0, [0, 1, 2]),
+    (3.0, 3.2, 69, 1.0, [0, 1, 2]),  # overlaps w next
+    (3.1, 3.3, 71, 1.0, [0, 1, 2]),  # overlaps w prev
+    (5.0, 5.1, 72, 1.0, [0, 1, 2]),  # overlaps w next
+    (5.0, 5.2, 74, 1.0, [0, 1, 2]),  # overlaps w prev
+    (4.0, 4.2, 76, 1.0, [0, 1, 2]),  # overlaps w next
+    (4.1, 4.2, 77, 1.0, [0, 1, 2]),  # overlaps w prev
+]
+
+
+def synthetic_posteriorgram(seed: int, n_frames: int = 344, n_notes: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense, piano-like note and onset activations: decaying notes with bleed into neighbouring pitches."""
+    rng = np.random.default_rng(seed)
+    frames = rng.uniform(0, 0.35, size=(n_frames, ANNOTATIONS_N_SEMITONES))
+    onsets = rng.uniform(0, 0.3, size=(n_frames, ANNOTATIONS_N_SEMITONES))
+    for _ in range(n_notes):
+        start = rng.integers(0, n_frames - 1)
+        length = rng.integers(1, 80)
+        pitch = rng.integers(20, 70)
+        end = min(start + length, n_frames)
+        envelope = rng.uniform(0.5, 1.0) * np.exp(-np.arange(end - start) / rng.uniform(10, 60))
+        frames[start:end, pitch] = np.maximum(frames[start:end, pitch], envelope)
+        for neighbour in (pitch - 1, pitch + 1, pitch + 12):
+            frames[start:end, neighbour] = np.maximum(frames[start:end, neighbour], 0.5 * envelope)
+        onsets[start, pitch] = max(onsets[start, pitch], rng.uniform(0.4, 1.0))
+    return frames.astype(np.float32), onsets.astype(np.float32)
+
+
+def argmax_melodia_notes(
+    frames: np.ndarray, remaining_energy: np.ndarray, frame_thresh: float, min_note_len: int, energy_tol: int
+) -> List[Tuple[int, int, int, float]]:
+    """The original melodia trick, searching the whole matrix for the next peak on every note."""
+    n_frames = frames.shape[0]
+    note_events = []
+    while np.max(remaining_energy) > frame_thresh:
+        i_mid, freq_idx = np.unravel_index(np.argmax(remaining_energy), remaining_energy.shape)
+        remaining_energy[i_mid, freq_idx] = 0
+        i = i_mid + 1
+        k = 0
+        while i < n_frames - 1 and k < energy_tol:
+            k = k + 1 if remaining_energy[i, freq_idx] < frame_thresh else 0
+            remaining_energy[i, max(freq_idx - 1, 0) : min(freq_idx + 1, MAX_FREQ_IDX) + 1] = 0
+            i += 1
+        i_end = i - 1 - k
+        i = i_mid - 1
+        k = 0
+        while i > 0 and k < energy_tol:
+            k = k + 1 if remaining_energy[i, freq_idx] < frame_thresh else 0
+            remaining_energy[i, max(freq_idx - 1, 0) : min(freq_idx + 1, MAX_FREQ_IDX) + 1] = 0
+            i -= 1
+        i_start = i + 1 + k
+        if i_end - i_start <= min_note_len:
+            continue
+        note_events.append((i_start, i_end, freq_idx + MIDI_OFFSET, np.mean(frames[i_start:i_end, freq_idx])))
+    return note_events
+
+
+def per_note_pitch_bends(
+    contours: np.ndarray, note_events: List[Tuple[int, int, int, float]], n_bins_tolerance: int = 25
+) -> List[Tuple[int, int, int, float, List[int]]]:
+    """The original pitch bend estimation, one weighted submatrix per note."""
+    window_length = n_bins_tolerance * 2 + 1
+    freq_gaussian = scipy.signal.windows.gaussian(window_length, std=5)
+    note_events_with_pitch_bends = []
+    for start_idx, end_idx, pitch_midi, amplitude in note_events:
+        freq_idx = int(np.round(midi_pitch_to_contour_bin(pitch_midi)))
+        freq_start_idx = np.max([freq_idx - n_bins_tolerance, 0])
+        freq_end_idx = np.min([N_FREQ_BINS_CONTOURS, freq_idx + n_bins_tolerance + 1])
+        pitch_bend_submatrix = (
+            contours[start_idx:end_idx, freq_start_idx:freq_end_idx]
+            * freq_gaussian[
+                np.max([0, n_bins_tolerance - freq_idx]) : window_length
+                - np.max([0, freq_idx - (N_FREQ_BINS_CONTOURS - n_bins_tolerance - 1)])
+            ]
+        )
+        pb_shift = n_bins_tolerance - np.max([0, n_bins_tolerance - freq_idx])
+        bends = list(np.argmax(pitch_bend_submatrix, axis=1) - pb_shift)
+        note_events_with_pitch_bends.append((start_idx, end_idx, pitch_midi, amplitude, bends))
+    return note_events_with_pitch_bends
+
+
+def pairwise_drop_overlapping_pitch_bends(
+    note_events_with_pitch_bends: List[Tuple[float, float, int, float, Optional[List[int]]]]
+) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
+    """The original nested loop over every overlapping pair of notes."""
+    note_events = sorted(note_events_with_pitch_bends)
+    for i in range(len(note_events) - 1):
+        for j in range(i + 1, len(note_events)):
+            if note_events[j][0] >= note_events[i][1]:
+                break
+            note_events[i] = note_events[i][:-1] + (None,)
+            note_events[j] = note_events[j][:-1] + (None,)
+    return note_events
+
+
+def test_drop_overlapping_pitch_bends() -> None:
+    expected = [
+        (0.0, 0.1, 60, 1.0, None),
+        (2.0, 2.1, 62, 1.0, None),  # overlaps w next
+        (2.0, 2.1, 64, 1.0, None),  # overlaps w prev
+        (1.0, 1.1, 65, 1.0, [0, 1, 2]),
+        (1.1, 1.2, 67, 1.0, [0, 1, 2]),
+        (3.0, 3.2, 69, 1.0, None),  # overlaps w next
+        (3.1, 3.3, 71, 1.0, None),  # overlaps w prev
+        (5.0, 5.1, 72, 1.0, None),  # overlaps w next
+        (5.0, 5.2, 74, 1.0, None),  # overlaps w prev
+        (4.0, 4.2, 76, 1.0, None),  # overlaps w next
+        (4.1, 4.2, 77, 1.0, None),  # overlaps w prev
+    ]
+    result = drop_overlapping_pitch_bends(NOTE_EVENTS_WITH_PITCH_BENDS)
+    assert sorted(result) == sorted(expected)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("melodia_trick", [False, True])
+@pytest.mark.parametrize("frame_thresh,min_note_len,n_frames", [(0.3, 11, 344), (0.25, 3, 344), (0.3, 0, 30)])
+def test_vectorized_decoder_matches_loop(
+    seed: int, melodia_trick: bool, frame_thresh: float, min_note_len: int, n_frames: int
+) -> None:
+    frames, onsets = synthetic_posteriorgram(seed, n_frames=n_frames, n_notes=n_frames // 5)
+    kwargs = dict(
+        onset_thresh=0.5,
+        frame_thresh=frame_thresh,
+        min_note_len=min_note_len,
+        infer_onsets=True,
+        max_freq=None,
+        min_freq=None,
+        melodia_trick=melodia_trick,
+    )
+    # constrain_frequency works in place, so each decoder gets its own copy
+    expected = output_to_notes_polyphonic(frames.copy(), onsets.copy(), **kwargs)
+    result = output_to_notes_polyphonic(frames.copy(), onsets.copy(), vectorized=True, **kwargs)
+    assert len(expected) > 0
+    assert result == expected
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("frame_thresh,min_note_len", [(0.3, 11), (0.25, 3), (0.5, 0)])
+def test_melodia_matches_argmax_search(seed: int, frame_thresh: float, min_note_len: int) -> None:
+    frames, _ = synthetic_posteriorgram(seed)
+    # quantized activations, so some peaks tie and the argmax tie-breaking order matters
+    frames = np.round(frames * 20) / 20
+    remaining_energy = frames.astype(np.float64)
+    expected_energy = remaining_energy.copy()
+    expected = argmax_melodia_notes(frames, expected_energy, frame_thresh, min_note_len, 11)
+    result = _melodia_notes(frames, remaining_energy, frame_thresh, min_note_len, 11)
+    assert len(expected) > 0
+    assert result == expected
+    np.testing.assert_array_equal(remaining_energy, expected_energy)
+
+
+def test_melodia_frame_budget() -> None:
+    frames, _ = synthetic_posteriorgram(0)
+    unlimited = _melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11)
+    assert _melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11, frame_budget=0) == []
+    assert _melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11, frame_budget=10**9) == unlimited
+    # a budget stops tracing early: the notes found are the first ones of the unlimited run
+    limited = _melodia_notes(frames, frames.astype(np.float64), 0.3, 11, 11, frame_budget=200)
+    assert 0 < len(limited) < len(unlimited)
+    assert limited == unlimited[: len(limited)]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_batched_pitch_bends_match_per_note(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    n_frames = 344
+    contours = rng.uniform(0, 1, size=(n_frames, N_FREQ_BINS_CONTOURS)).astype(np.float32)
+    # every pitch, including the lowest and highest where the window is cut off, plus empty and 1-frame notes
+    starts = rng.integers(0, n_frames - 80, 88)
+    lengths = rng.integers(1, 80, 88)
+    note_events = [(int(s), int(s + n), p, 0.5) for s, n, p in zip(starts, lengths, range(21, 109))]
+    note_events += [(10, 10, 60, 0.5), (n_frames - 1, n_frames, 108, 0.5), (0, 5, 21, 0.5)]
+    assert get_pitch_bends(contours, note_events) == per_note_pitch_bends(contours, note_events)
+    assert get_pitch_bends(contours, note_events, 10) == per_note_pitch_bends(contours, note_events, 10)
+    assert get_pitch_bends(contours, []) == []
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sweep_line_drop_overlapping_pitch_bends_matches_pairwise(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    n = 200
+    # coarse times so there are ties in start and end times, and some zero-length notes
+    start = np.round(rng.uniform(0, 20, n), 1)
+    end = start + np.round(rng.choice([0, 0.1, 0.2, 0.5, 1.0], n) * rng.uniform(0, 1.5, n), 1)
+    note_events = [
+        (float(s), float(e), int(p), 0.5, [0, 1, int(p)]) for s, e, p in zip(start, end, rng.integers(21, 109, n))
+    ]
+    expected = pairwise_drop_overlapping_pitch_bends(note_events)
+    assert drop_overlapping_pitch_bends(note_events) == expected
+    assert drop_overlapping_pitch_bends(NOTE_EVENTS_WITH_PITCH_BENDS) == pairwise_drop_overlapping_pitch_bends(
+        NOTE_EVENTS_WITH_PITCH_BENDS
+    )
+
+    # on compact arrays the mask is in the original order; index the events by their "pitch" to compare
+    indexed_events = [(s, e, i, 0.5, [i]) for i, (s, e) in enumerate(zip(start.tolist(), end.tolist()))]
+    dropped = {event[2] for event in pairwise_drop_overlapping_pitch_bends(indexed_events) if event[-1] is None}
+    assert overlapping_notes(start, end).tolist() == [i in dropped for i in range(n)]
+
+
+def midi_contents(midi: pretty_midi.PrettyMIDI) -> List[Tuple[list, list]]:
+    return [
+        (
+            [(n.start, n.end, n.pitch, n.velocity) for n in instrument.notes],
+            [(b.pitch, b.time) for b in instrument.pitch_bends],
+        )
+        for instrument in midi.instruments
+    ]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("include_pitch_bends", [False, True])
+@pytest.mark.parametrize("multiple_pitch_bends", [False, True])
+def test_note_array_matches_midi(seed: int, include_pitch_bends: bool, multiple_pitch_bends: bool) -> None:
+    frames, onsets = synthetic_posteriorgram(seed)
+    contours = np.random.default_rng(seed).uniform(0, 1, size=(len(frames), N_FREQ_BINS_CONTOURS)).astype(np.float32)
+    kwargs = dict(onset_thresh=0.5, frame_thresh=0.3, min_note_len=11, include_pitch_bends=include_pitch_bends)
+    # output_to_notes_polyphonic works in place, so each call gets its own copy
+    midi, note_events = model_output_to_notes(
+        {"note": frames.copy(), "onset": onsets.copy(), "contour": contours},
+        multiple_pitch_bends=multiple_pitch_bends,
+        **kwargs,
+    )
+    note_array = model_output_to_note_array(
+        {"note": frames.copy(), "onset": onsets.copy(), "contour": contours}, **kwargs
+    )
+
+    assert len(note_array) == len(note_events)
+    assert note_array.notes["start"].tolist() == [event[0] for event in note_events]
+    assert note_array.notes["pitch"].tolist() == [event[2] for event in note_events]
+    if include_pitch_bends:
+        assert [note_array.note_bends(i).tolist() for i in range(len(note_array))] == [e[4] for e in note_events]
+    else:
+        assert note_array.bends is None
+    assert midi_contents(note_array.to_midi(multiple_pitch_bends)) == midi_contents(midi)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from basic_pitch_modified.constants import ANNOTATIONS_N_SEMITONES, N_FREQ_BINS_CONTOURS
+from basic_pitch_modified.note_creation import NoteArray, output_to_notes_polyphonic
+from basic_pitch_modified.note_tracking import StreamingNoteTracker
+from basic_pitch_modified.streaming import stream_frames_to_time
+from test_note_creation import synthetic_posteriorgram
+
+WINDOW_FRAMES = 344  # the 4 s analysis window
+HOP_FRAMES = 22  # updates every 0.25 s
+
+
+def stream_updates(
+    tracker: StreamingNoteTracker, frames: np.ndarray, onsets: np.ndarray, contours: np.ndarray
+) -> List[NoteArray]:
+    """Feed the posteriorgram to the tracker like the live analysis does: the last 4 s, every 0.25 s."""
+    new_notes = []
+    for end in range(HOP_FRAMES, len(frames) + HOP_FRAMES, HOP_FRAMES):
+        end = min(end, len(frames))
+        start = max(0, end - WINDOW_FRAMES)
+        output = {"note": frames[start:end].copy(), "onset": onsets[start:end].copy(), "contour": contours[start:end]}
+        new_notes.append(tracker.update(output, start))
+    return new_notes
+
+
+def note_keys(notes: np.ndarray) -> List[Tuple[float, float, int]]:
+    return [(round(s, 6), round(e, 6), p) for s, e, p in zip(notes["start"], notes["end"], notes["pitch"].tolist())]
+
+
+@pytest.mark.parametrize("infer_onsets", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_tracked_notes_are_emitted_once(seed: int, infer_onsets: bool) -> None:
+    frames, onsets = synthetic_posteriorgram(seed, n_frames=2000, n_notes=300)
+    contours = np.random.default_rng(seed).uniform(0, 1, size=(2000, N_FREQ_BINS_CONTOURS)).astype(np.float32)
+    tracker = StreamingNoteTracker(melodia_trick=False, infer_onsets=infer_onsets)
+    new_notes = stream_updates(tracker, frames, onsets, contours)
+
+    emitted = np.concatenate([n.notes for n in new_notes])
+    assert len(emitted) == len(tracker)
+    # never the same note twice: notes of one pitch do not overlap
+    for pitch in np.unique(emitted["pitch"]):
+        same_pitch = np.sort(emitted[emitted["pitch"] == pitch], order="start")
+        assert np.all(same_pitch["start"][1:] >= same_pitch["end"][:-1])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_tracked_notes_match_offline_decoding(seed: int) -> None:
+    # without infer_onsets: inferred onsets are scaled by the largest frame difference in the window, so they
+    # differ between a window and the whole stream
+    frames, onsets = synthetic_posteriorgram(seed, n_frames=2000, n_notes=300)
+    contours = np.zeros((2000, N_FREQ_BINS_CONTOURS), dtype=np.float32)
+    tracker = StreamingNoteTracker(melodia_trick=False, infer_onsets=False)
+    new_notes = stream_updates(tracker, frames, onsets, contours)
+
+    offline = output_to_notes_polyphonic(
+        frames.copy(), onsets.copy(), 0.5, 0.3, 11, infer_onsets=False, max_freq=None, min_freq=None,
+        melodia_trick=False,
+    )
+    expected = {(int(s), int(e), int(p)) for s, e, p, _ in offline}
+    # the only notes not emitted are the ones not finalized when the stream ends: the open notes, and the later
+    # notes of their pitches, which are only taken once the open note is finalized
+    pending = {note for note in expected if note[2] in tracker.open and note[0] >= tracker.open[note[2]][0]}
+    assert {(start, pitch) for pitch, (start, _, _) in tracker.open.items()} <= {(s, p) for s, _, p in pending}
+
+    expected_keys = {
+        (round(float(stream_frames_to_time(s)), 6), round(float(stream_frames_to_time(e)), 6), p)
+        for s, e, p in expected - pending
+    }
+    emitted = note_keys(np.concatenate([n.notes for n in new_notes]))
+    assert len(emitted) == len(set(emitted))
+    assert set(emitted) == expected_keys
+
+
+def test_long_note_is_emitted_once() -> None:
+    n_frames = 1200
+    rng = np.random.default_rng(0)
+    frames = rng.uniform(0, 0.1, size=(n_frames, ANNOTATIONS_N_SEMITONES)).astype(np.float32)
+    onsets = rng.uniform(0, 0.1, size=(n_frames, ANNOTATIONS_N_SEMITONES)).astype(np.float32)
+    frames[100:900, 39] = 0.8  # a 9 s note, longer than two analysis windows
+    onsets[100, 39] = 0.9
+    contours = np.zeros((n_frames, N_FREQ_BINS_CONTOURS), dtype=np.float32)
+    tracker = StreamingNoteTracker(melodia_trick=False)
+    new_notes = stream_updates(tracker, frames, onsets, contours)
+
+    notes, index = tracker.notes_since(0)
+    assert index == len(notes) == 1
+    np.testing.assert_allclose([notes.notes["start"][0], notes.notes["end"][0]], stream_frames_to_time([100, 900]))
+    assert notes.notes["pitch"][0] == 39 + 21
+    assert sum(len(n) for n in new_notes) == 1
+    assert tracker.notes_since(index)[0].notes.size == 0
+
+
+def test_recent_notes_include_open_notes() -> None:
+    frames, onsets = synthetic_posteriorgram(0, n_frames=1000, n_notes=150)
+    contours = np.zeros((1000, N_FREQ_BINS_CONTOURS), dtype=np.float32)
+    tracker = StreamingNoteTracker(melodia_trick=False)
+    stream_updates(tracker, frames, onsets, contours)
+
+    recent = tracker.recent_notes(4.0)
+    now = stream_frames_to_time(tracker.frame_end)
+    assert np.all(recent.notes["end"] >= now - 4.0)
+    assert np.all(np.diff(recent.notes["start"]) >= 0)
+    assert len(recent.bend_offsets) == len(recent) + 1
+    assert sum(pitch in recent.notes["pitch"] for pitch in tracker.open) == len(tracker.open)
+
+
+def test_old_notes_are_dropped() -> None:
+    frames, onsets = synthetic_posteriorgram(1, n_frames=3000, n_notes=400)
+    contours = np.random.default_rng(1).uniform(0, 1, size=(3000, N_FREQ_BINS_CONTOURS)).astype(np.float32)
+    kept = StreamingNoteTracker(melodia_trick=False, history=1000.0)
+    bounded = StreamingNoteTracker(melodia_trick=False, history=5.0)
+    seen, index = [], 0
+    for end in range(HOP_FRAMES, len(frames) + HOP_FRAMES, HOP_FRAMES):
+        end = min(end, len(frames))
+        start = max(0, end - WINDOW_FRAMES)
+        for tracker in (kept, bounded):
+            output = {"note": frames[start:end].copy(), "onset": onsets[start:end].copy(),
+                      "contour": contours[start:end]}
+            tracker.update(output, start)
+        new, index = bounded.notes_since(index)
+        seen.extend(note_keys(new.notes))
+        for duration in (2.0, 4.0):
+            expected, recent = kept.recent_notes(duration), bounded.recent_notes(duration)
+            assert note_keys(recent.notes) == note_keys(expected.notes)
+            np.testing.assert_array_equal(recent.bends, expected.bends)
+    assert len(bounded) == len(kept) == index
+    assert seen == note_keys(kept.notes_since(0)[0].notes)
+    # only the notes finalized since the oldest one that ended in the last 5 s are kept
+    assert len(bounded._notes) < len(kept._notes) / 3
+    assert bounded._notes["end"][0] >= stream_frames_to_time(bounded.frame_end) - 5.0
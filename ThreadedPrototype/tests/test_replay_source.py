@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import io
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from analysis_worker import AnalysisSnapshot, AnalysisWorkerThread
+from replay_source import ReplaySource
+from ring_buffer import RingBuffer
+from versioned import VersionedValue
+
+RATE = 1000
+CHUNK = 100
+
+
+class FakeAudioThread:
+    """The parts of AudioThreadWithBufferPorted a ReplaySource feeds, recording when every chunk arrives."""
+
+    def __init__(self, analysis_hop=None, analysis_seconds=0.0):
+        self.RATE = RATE
+        self.CHANNELS = 1
+        self.starting_chunk_size = CHUNK
+        self.pred_length = 1
+        self.stop_request = False
+        self.audio_buffer = RingBuffer(2 * RATE)
+        self.results = VersionedValue()
+        self.last_chunk_time = 0.0
+        self.args_before = ()
+        self.args_after = ()
+        self.analysis_seconds = analysis_seconds
+        self.ingest_times = []
+        self.analysis_worker = None
+        if analysis_hop is not None:
+            self.analysis_worker = AnalysisWorkerThread("replay_test", self, hop=analysis_hop)
+            self.analysis_worker.start()
+
+    def process_func(self, samples):
+        time.sleep(self.analysis_seconds)
+        return len(samples)
+
+    def take_analysis_snapshot(self):
+        samples, cursor = self.audio_buffer.snapshot(self.pred_length * self.RATE)
+        return AnalysisSnapshot(samples, cursor, None, 0, self.last_chunk_time)
+
+    def gate_analysis(self):
+        return False
+
+    def ingest(self, in_data):
+        self.audio_buffer.write(np.frombuffer(in_data, dtype=np.int16))
+        self.last_chunk_time = time.time()
+        self.ingest_times.append(self.last_chunk_time)
+        if self.analysis_worker is not None:
+            self.analysis_worker.notify()
+
+
+@pytest.fixture
+def pcm_stdin(monkeypatch):
+    """Replaces stdin with n_chunks of raw int16 PCM (plus a partial chunk that is dropped)."""
+    def feed(n_chunks):
+        pcm = np.arange(n_chunks * CHUNK + CHUNK // 2, dtype=np.int16).tobytes()
+        monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(pcm)))
+    return feed
+
+
+def test_paced_replay_feeds_chunks_at_speed(pcm_stdin) -> None:
+    pcm_stdin(8)
+    audio = FakeAudioThread()
+    replay = ReplaySource("-", speed=4.0)
+    replay.feed(audio)
+    assert replay.finished and replay.chunks_fed == 8
+    assert replay.audio_seconds == pytest.approx(0.8)
+    # chunk k is due k * CHUNK / (RATE * speed) seconds after the first, and is never fed early
+    due = replay.feed_start + np.arange(8) * CHUNK / (RATE * 4.0)
+    assert np.all(np.array(audio.ingest_times) >= due - 1e-3)
+    assert replay.feed_end - replay.feed_start == pytest.approx(7 * 0.025, abs=0.05)
+    np.testing.assert_array_equal(audio.audio_buffer.get_last(8 * CHUNK), np.arange(8 * CHUNK))
+
+
+def test_unpaced_replay_finishes_after_the_last_analysis(pcm_stdin) -> None:
+    pcm_stdin(10)
+    audio = FakeAudioThread(analysis_hop=0.2, analysis_seconds=0.05)
+    replay = ReplaySource("-", speed=0)
+    try:
+        replay.feed(audio)
+    finally:
+        audio.analysis_worker.stop_request = True
+    assert replay.finished
+    assert audio.analysis_worker.processed_cursor == 10 * CHUNK
+    # in stream time the worker analysed once per 0.2 s hop of audio (200 samples), not once per 0.2 s of wall time
+    assert audio.analysis_worker.runs >= 5
+    assert replay.feed_end >= audio.results.timestamp
+    assert "1.0 s of audio" in replay.report() and "x real time" in replay.report()
+
+
+def test_stop_request_ends_the_replay_early(pcm_stdin) -> None:
+    pcm_stdin(10)
+    audio = FakeAudioThread()
+    replay = ReplaySource("-", speed=None)
+    original_ingest = audio.ingest
+
+    def ingest_then_stop(in_data):
+        original_ingest(in_data)
+        audio.stop_request = len(audio.ingest_times) == 3
+    audio.ingest = ingest_then_stop
+    replay.feed(audio)
+    assert replay.finished and replay.chunks_fed == 3
+
+
+def test_unpaced_replay_waits_for_the_downstream_stages(pcm_stdin) -> None:
+    pcm_stdin(10)
+    audio = FakeAudioThread(analysis_hop=0.2)
+    stage_results = VersionedValue()
+    audio.results.add_consumer("stage", stage_results)
+    stage_results.add_consumer("sink")
+    seen = []
+
+    def stage():
+        seq = 0
+        while not audio.stop_request:
+            new_seq, _, value = audio.results.wait_newer(seq, timeout=0.1)
+            if new_seq == seq:
+                continue
+            seq = new_seq
+            time.sleep(0.02)    # slower than the analysis
+            seen.append(stage_results.publish(value))
+            audio.results.consumed("stage", seq)
+
+    def sink():
+        seq = 0
+        while not audio.stop_request:
+            seq, _, _ = stage_results.wait_newer(seq, timeout=0.1)
+            stage_results.consumed("sink", seq)
+
+    threads = [threading.Thread(target=stage), threading.Thread(target=sink)]
+    for thread in threads:
+        thread.start()
+    replay = ReplaySource("-", speed=0)
+    try:
+        replay.feed(audio)
+    finally:
+        audio.analysis_worker.stop_request = True
+        audio.stop_request = True
+    for thread in threads:
+        thread.join()
+    # the slow stage got every analysis of the replay instead of only the latest one
+    assert audio.analysis_worker.runs >= 5
+    assert len(seen) == audio.results.seq
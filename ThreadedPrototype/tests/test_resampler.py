@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from resampler import StreamingResampler
+
+
+def stream(resampler, signal, chunk_sizes):
+    out, start, i = [], 0, 0
+    while start < len(signal):
+        size = chunk_sizes[i % len(chunk_sizes)]
+        out.append(resampler.process(signal[start:start + size]))
+        start += size
+        i += 1
+    return np.concatenate(out)
+
+
+@pytest.mark.parametrize("orig_rate,target_rate", [(44100, 22050), (48000, 22050), (16000, 22050)])
+def test_streamed_output_matches_resample_poly(orig_rate: int, target_rate: int) -> None:
+    rng = np.random.default_rng(0)
+    t = np.arange(orig_rate) / orig_rate
+    signal = (0.5 * np.sin(2 * np.pi * 440 * t) + 0.1 * rng.normal(size=len(t))).astype(np.float32)
+    streamed = stream(StreamingResampler(orig_rate, target_rate), signal, [1024, 333, 4096, 7])
+    expected = resample_poly(signal.astype(np.float64), target_rate, orig_rate)
+
+    # every output that does not depend on input after the end of the stream is produced, and equals resample_poly
+    assert len(expected) - 30 < len(streamed) <= len(expected)
+    np.testing.assert_allclose(streamed, expected[:len(streamed)], atol=1e-5)
+
+
+def test_chunking_does_not_change_the_output() -> None:
+    signal = np.random.default_rng(1).normal(size=20000).astype(np.float32)
+    whole = StreamingResampler(44100, 22050).process(signal)
+    chunked = stream(StreamingResampler(44100, 22050), signal, [1, 100, 1024])
+    np.testing.assert_array_equal(chunked, whole)
+
+
+def test_equal_rates_pass_through() -> None:
+    chunk = np.arange(10, dtype=np.float32)
+    np.testing.assert_array_equal(StreamingResampler(22050, 22050).process(chunk), chunk)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+
+def test_wrap_around_keeps_the_latest_samples_in_order() -> None:
+    ring = RingBuffer(10)
+    ring.write(np.arange(7, dtype=np.int16))
+    assert len(ring) == 7
+    ring.write(np.arange(7, 13, dtype=np.int16))
+    assert (len(ring), ring.write_cursor) == (10, 13)
+    np.testing.assert_array_equal(ring.get_last(10), np.arange(3, 13))
+    np.testing.assert_array_equal(ring.get_last(4), np.arange(9, 13))
+    # the samples before an earlier cursor, across the wrap
+    np.testing.assert_array_equal(ring.get_last(5, cursor=11), np.arange(6, 11))
+    # more than was written gives what there is
+    np.testing.assert_array_equal(RingBuffer(10).get_last(5), [])
+
+
+def test_contiguous_reads_are_views() -> None:
+    ring = RingBuffer(10)
+    ring.write(np.arange(6, dtype=np.int16))
+    assert np.shares_memory(ring.get_last(6), ring.buffer)
+
+
+def test_chunk_larger_than_the_buffer_keeps_its_tail() -> None:
+    ring = RingBuffer(10)
+    ring.write(np.arange(25, dtype=np.int16))
+    assert ring.write_cursor == 25
+    np.testing.assert_array_equal(ring.get_last(10), np.arange(15, 25))
+
+
+class RacingRingBuffer(RingBuffer):
+    """Lets a writer write a whole buffer of new samples while the first snapshot copy is being taken."""
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.copies = 0
+
+    def get_last(self, n, cursor=None):
+        samples = super().get_last(n, cursor)
+        self.copies += 1
+        if self.copies == 1:
+            for _ in range(3):
+                self.write(np.full(4, -1, dtype=np.int16))
+        return samples
+
+
+def test_snapshot_retries_when_the_copy_was_overwritten() -> None:
+    ring = RacingRingBuffer(16)
+    ring.write(np.arange(4, dtype=np.int16))
+    ring.write(np.arange(4, 8, dtype=np.int16))
+    samples, cursor = ring.snapshot(8)
+    assert ring.copies == 2
+    assert cursor == 20
+    np.testing.assert_array_equal(samples, np.full(8, -1))
+    # the snapshot is a copy, so later writes do not change it
+    ring.write(np.zeros(16, dtype=np.int16))
+    np.testing.assert_array_equal(samples, np.full(8, -1))
+
+
+def test_snapshot_at_an_earlier_cursor_until_it_is_overwritten() -> None:
+    ring = RingBuffer(16)
+    ring.write(np.arange(4, dtype=np.int16))
+    ring.write(np.arange(4, 8, dtype=np.int16))
+    ring.write(np.arange(8, 12, dtype=np.int16))
+    np.testing.assert_array_equal(ring.snapshot_at(8, 8), np.arange(8))
+    ring.write(np.arange(12, 16, dtype=np.int16))
+    # the writer may be in the middle of the next chunk, which would overwrite the oldest samples
+    assert ring.snapshot_at(8, 8) is None
+    np.testing.assert_array_equal(ring.snapshot_at(8, 16), np.arange(8, 16))
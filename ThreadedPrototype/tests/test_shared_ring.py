@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from shared_ring import SharedRingBuffer
+
+PROTOTYPE_DIR = pathlib.Path(__file__).parent.parent
+
+
+# a reader in another process, like an analysis stage would be
+READER = """
+import sys
+from shared_ring import SharedRingBuffer
+reader = SharedRingBuffer.attach(sys.argv[1])
+samples, cursor = reader.snapshot(50)
+print(reader.capacity, reader.dtype, reader.rate, reader.seq, reader.max_write, cursor, samples[0], samples[-1])
+reader.close()
+"""
+
+
+def test_reader_process_attaches_to_header_and_samples() -> None:
+    ring = SharedRingBuffer(100, dtype=np.int16, rate=8000)
+    try:
+        for start in range(0, 230, 23):
+            ring.write(np.arange(start, start + 23, dtype=np.int16))
+        output = subprocess.run([sys.executable, "-c", READER, ring.name], cwd=PROTOTYPE_DIR, check=True,
+                                capture_output=True, text=True).stdout
+        assert output.split() == ["100", "int16", "8000", "10", "23", "230", "180", "229"]
+        # closing a reader leaves the block to its owner
+        np.testing.assert_array_equal(ring.get_last(3), [227, 228, 229])
+    finally:
+        ring.close()
+
+
+def test_closed_ring_fails_cleanly() -> None:
+    ring = SharedRingBuffer(100, dtype=np.int16, rate=8000)
+    ring.write(np.ones(10, dtype=np.int16))
+    ring.close()
+    with pytest.raises(ValueError, match="closed"):
+        ring.snapshot(10)
+    with pytest.raises(ValueError, match="closed"):
+        ring.write(np.ones(10, dtype=np.int16))
+
+
+def test_stop_waits_for_the_running_analysis_before_closing() -> None:
+    pytest.importorskip("pyaudio")
+    from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+
+    analysing = threading.Event()
+    finished = []
+
+    def slow_analysis(samples):
+        analysing.set()
+        time.sleep(0.3)
+        finished.append(len(samples))
+        return len(samples)
+
+    chunk = 512
+    thread = AudioThreadWithBufferPorted("shared_stop_test", rate=8000, starting_chunk_size=chunk,
+                                         process_func=slow_analysis, analysis_hop=0.0,
+                                         shared_name=f"stop_test_{time.time_ns()}")
+    thread.analysis_worker.start()
+    thread.ingest(np.ones(chunk, dtype=np.int16).tobytes())
+    assert analysing.wait(timeout=5.0)
+    thread.stop()
+    assert finished == [chunk]
+    assert not thread.analysis_worker.is_alive()
+    assert thread.audio_buffer.header is None
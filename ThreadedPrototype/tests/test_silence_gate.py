@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pytest
+
+from silence_gate import SILENCE, SilenceGate
+
+
+def test_gate_skips_after_timeout_and_resumes() -> None:
+    gate = SilenceGate(timeout=2.0)
+    decisions = [gate.should_analyse(t) for t in (0.0, 1.0, 2.0, 2.5, 3.0, 0.0, 5.0)]
+    assert decisions == [True, True, True, False, False, True, False]
+    assert (gate.analysed, gate.skipped, gate.silent_periods) == (4, 3, 2)
+    assert gate.silent
+    assert gate.skipped_fraction == pytest.approx(3 / 7)
+    assert "3 skipped" in gate.report()
+
+
+def test_audio_thread_publishes_silence_once() -> None:
+    pytest.importorskip("pyaudio")
+    from AudioThreadWithBufferPorted import AudioThreadWithBufferPorted
+
+    calls = []
+    chunk = 1024
+    thread = AudioThreadWithBufferPorted(
+        "gate_test", rate=8000, starting_chunk_size=chunk, process_func=lambda s: calls.append(len(s)) or len(calls),
+        silence_gate=SilenceGate(timeout=0.5)
+    )
+    loud = (np.sin(np.arange(chunk)) * 8000).astype(np.int16).tobytes()
+    quiet = np.zeros(chunk, dtype=np.int16).tobytes()
+
+    # silent before any input: nothing is analysed
+    thread.ingest(quiet)
+    assert calls == [] and thread.data is SILENCE
+    seq = thread.results.seq
+    for _ in range(10):
+        thread.ingest(quiet)
+    assert thread.results.seq == seq  # SILENCE is published once per silent period
+
+    # the first loud chunk is analysed right away, then 0.5 s of silence is still analysed
+    thread.ingest(loud)
+    assert len(calls) == 1
+    for _ in range(3):
+        thread.ingest(quiet)
+    assert len(calls) == 4
+    for _ in range(5):
+        thread.ingest(quiet)
+    assert len(calls) == 4 and thread.data is SILENCE
+    assert thread.silence_gate.silent_periods == 2
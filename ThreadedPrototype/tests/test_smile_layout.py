@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_selection import SelectKBest, f_regression
+
+from smile_layout import SmileLayout, verification_signal, verify_layout
+from streaming_smile import N_FEATURES, N_FUNCTIONALS, StreamingSmile
+from test_streaming_smile import RATE, frame_llds
+
+LLD_NAMES = ["energy", "zcr", "mean"]
+N_TEST_FEATURES = 2 * len(LLD_NAMES) * N_FUNCTIONALS
+UTILS_DIR = os.path.join(os.path.dirname(__file__), "..", "utils")
+
+
+def fitted_selectors(n_features, n_extra=0, k=20, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(60, n_features + n_extra))
+    selectors = {}
+    for i, name in enumerate(["a", "b", "with_extra"]):
+        width = n_features + (n_extra if name == "with_extra" else 0)
+        selectors[name] = SelectKBest(f_regression, k=k).fit(x[:, :width], x[:, i] + x[:, -1])
+    return selectors
+
+
+def test_model_inputs_match_selector_transform() -> None:
+    selectors = fitted_selectors(N_FEATURES, n_extra=18)
+    layout = SmileLayout.from_selectors(selectors)
+    union = np.unique(np.concatenate([s.get_support(indices=True) for s in selectors.values()]))
+    assert np.array_equal(layout.indices, union[union < N_FEATURES])
+    full = np.random.default_rng(1).normal(size=(1, N_FEATURES))
+    extra = np.random.default_rng(2).normal(size=(1, 18))
+    reduced = full[:, layout.indices]
+    for name, selector in selectors.items():
+        x = np.concatenate([full, extra], axis=1)[:, :selector.n_features_in_]
+        np.testing.assert_array_equal(layout.model_input(name, reduced, extra), selector.transform(x))
+        np.testing.assert_array_equal(layout.full().model_input(name, full, extra), selector.transform(x))
+
+
+def test_reduced_stream_computes_the_selected_features() -> None:
+    signal = verification_signal(RATE, seconds=3)
+    features = np.array([5, 3 * N_FUNCTIONALS + 14, 2, 100, N_TEST_FEATURES - 1])
+    full = StreamingSmile(RATE, lld_func=frame_llds, lld_names=LLD_NAMES)
+    reduced = StreamingSmile(RATE, lld_func=frame_llds, lld_names=LLD_NAMES, features=features)
+    assert reduced.feature_names == [full.feature_names[i] for i in features]
+    for cursor in range(RATE // 4, len(signal) + 1, RATE // 4):
+        expected = full.update(signal[:cursor], cursor)[:, features]
+        np.testing.assert_allclose(reduced.update(signal[:cursor], cursor), expected, rtol=1e-9, atol=1e-12)
+
+
+def prototype_selectors():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return {name: joblib.load(os.path.join(UTILS_DIR, f"{name}.selector"))
+                for name in ["fcnn_valence_lb", "fcnn_arousal_lb", "genre_features"]}
+
+
+def test_verify_layout_against_opensmile() -> None:
+    pytest.importorskip("opensmile")
+    selectors = fitted_selectors(N_FEATURES, n_extra=4)
+    layout = SmileLayout.from_selectors(selectors)
+    signal = verification_signal(RATE)
+    assert verify_layout(layout, selectors, signal, RATE) == sum(len(layout.columns[name]) for name in selectors)
+    # a layout of other selectors with the same names gives the models the wrong columns
+    other = SmileLayout.from_selectors(fitted_selectors(N_FEATURES, n_extra=4, seed=1))
+    with pytest.raises(ValueError):
+        verify_layout(other, selectors, signal, RATE)
+
+
+def test_verify_prototype_layout_against_opensmile() -> None:
+    pytest.importorskip("opensmile")
+    selectors = prototype_selectors()
+    layout = SmileLayout.from_selectors(selectors)
+    assert verify_layout(layout, selectors, verification_signal(44100), 44100) > 0
+
+
+def test_prototype_selectors_share_a_reduced_layout() -> None:
+    selectors = prototype_selectors()
+    layout = SmileLayout.from_selectors(selectors)
+    assert 256 <= len(layout) < N_FEATURES
+    assert all(len(layout.columns[name]) + len(layout.extra_columns[name]) == 256 for name in selectors)
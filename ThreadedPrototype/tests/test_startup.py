@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import sys
+import threading
+import time
+
+from startup import STARTUP, StartupReport, lazy_import
+
+
+def test_report_breaks_startup_down_by_step() -> None:
+    report = StartupReport()
+    with report.step("import", "heavy_library"):
+        time.sleep(0.02)
+    with report.step("load", "model"):
+        time.sleep(0.01)
+    report.mark("online", "stage")
+    assert [step[:2] for step in report.steps] == [("import", "heavy_library"), ("load", "model"), ("online", "stage")]
+    assert report.steps[0][3] >= 0.02
+    text = report.report()
+    assert "heavy_library" in text and "model" in text and "stage" in text
+    assert "wall clock" in text.splitlines()[-1]
+
+
+def test_lazy_import_records_first_import_only() -> None:
+    sys.modules.pop("colorsys", None)
+    module = lazy_import("colorsys")
+    assert module is sys.modules["colorsys"]
+    assert lazy_import("colorsys") is module
+    assert [step[:2] for step in STARTUP.steps].count(("import", "colorsys")) == 1
+
+
+def test_lazy_import_waits_for_an_import_in_another_thread(tmp_path, monkeypatch) -> None:
+    (tmp_path / "slow_startup_module.py").write_text("import time\ntime.sleep(0.5)\nVALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.modules.pop("slow_startup_module", None)
+    first = threading.Thread(target=lazy_import, args=("slow_startup_module",))
+    first.start()
+    while "slow_startup_module" not in sys.modules:
+        time.sleep(0.001)
+    module = lazy_import("slow_startup_module")
+    assert hasattr(module, "VALUE")
+    first.join()
+    sys.modules.pop("slow_startup_module", None)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from typing import Dict
+
+import numpy as np
+
+from basic_pitch_modified.constants import (
+    ANNOT_N_FRAMES,
+    ANNOTATIONS_N_SEMITONES,
+    AUDIO_N_SAMPLES,
+    AUDIO_SAMPLE_RATE,
+)
+from basic_pitch_modified.streaming import (
+    FRAMES_PER_WINDOW,
+    HOP_SIZE,
+    N_OLAP,
+    OVERLAP_LEN,
+    StreamingInference,
+    stream_frames_to_samples,
+)
+
+
+class FakeModel:
+    """Deterministic stand-in for the saved model: each output frame depends on its slice of the window."""
+
+    def __init__(self) -> None:
+        self.windows_seen = 0
+
+    def __call__(self, audio_windowed: np.ndarray) -> Dict[str, np.ndarray]:
+        self.windows_seen += audio_windowed.shape[0]
+        n_per_frame = AUDIO_N_SAMPLES // ANNOT_N_FRAMES
+        frames = audio_windowed[:, : n_per_frame * ANNOT_N_FRAMES, 0].reshape(-1, ANNOT_N_FRAMES, n_per_frame)
+        energy = np.mean(frames**2, axis=2, keepdims=True)
+        note = energy * np.linspace(0.5, 1.5, ANNOTATIONS_N_SEMITONES)
+        return {"note": note, "onset": note * 0.5, "contour": np.repeat(note, 3, axis=2)}
+
+
+def full_stream_reference(stream: np.ndarray, frame_start: int, frame_end: int) -> Dict[str, np.ndarray]:
+    """Infer every window of the whole stream at once and cut out the requested frames."""
+    n_windows = frame_end // FRAMES_PER_WINDOW + 1
+    padded = np.concatenate([np.zeros(OVERLAP_LEN // 2, dtype=np.float32), stream])
+    padded = np.concatenate([padded, np.zeros(n_windows * HOP_SIZE + AUDIO_N_SAMPLES, dtype=np.float32)])
+    windows = [padded[k * HOP_SIZE : k * HOP_SIZE + AUDIO_N_SAMPLES] for k in range(n_windows)]
+    output = FakeModel()(np.stack(windows)[:, :, np.newaxis])
+    return {
+        k: v[:, N_OLAP:-N_OLAP, :].reshape(-1, v.shape[2])[frame_start:frame_end] for k, v in output.items()
+    }
+
+
+def test_streaming_matches_full_inference() -> None:
+    rng = np.random.default_rng(0)
+    stream = rng.uniform(-1, 1, size=12 * AUDIO_SAMPLE_RATE).astype(np.float32)
+    history = 4 * AUDIO_SAMPLE_RATE
+    model = FakeModel()
+    engine = StreamingInference(model, history_samples=history)
+
+    hop = AUDIO_SAMPLE_RATE // 4
+    for cursor in range(hop, len(stream) + 1, hop):
+        output = engine.update(stream[max(0, cursor - history) : cursor], cursor)
+        frame_end = engine.frame_offset + output["note"].shape[0]
+        expected = full_stream_reference(stream[:cursor], engine.frame_offset, frame_end)
+        assert set(output.keys()) == {"note", "onset", "contour"}
+        for key in output:
+            np.testing.assert_allclose(output[key], expected[key], rtol=1e-6)
+
+    n_updates = len(stream) // hop
+    # only the windows still receiving audio are recomputed, instead of every window in the buffer
+    assert engine.windows_reused > 0
+    assert model.windows_seen <= 2 * n_updates
+
+
+def test_frames_stay_on_the_stream_after_30_minutes() -> None:
+    history = 4 * AUDIO_SAMPLE_RATE
+    hop = AUDIO_SAMPLE_RATE // 4
+    start = 30 * 60 * AUDIO_SAMPLE_RATE + 123
+    rng = np.random.default_rng(0)
+    stream = rng.uniform(0.5, 1, size=8 * AUDIO_SAMPLE_RATE).astype(np.float32)  # stream[i] is at start + i
+    gap = (5 * AUDIO_SAMPLE_RATE, 6 * AUDIO_SAMPLE_RATE)
+    stream[gap[0] : gap[1]] = 0
+    margin = 4 * 256  # the fake model frames are not exactly FFT_HOP apart
+    engine = StreamingInference(FakeModel(), history_samples=history)
+
+    for cursor in range(history, len(stream) + 1, hop):
+        output = engine.update(stream[cursor - history : cursor], start + cursor)
+        positions = stream_frames_to_samples(engine.frame_offset + np.arange(output["note"].shape[0])) - start
+        # the frames cover the buffer, one every FFT_HOP or so
+        assert cursor - history <= positions[0] < cursor - history + 256
+        assert cursor - 256 <= positions[-1] < cursor
+        assert np.all(np.diff(positions) <= 256)
+        # and hold the audio at their positions: silent exactly in the gap, never zero-filled elsewhere
+        energy = output["note"][:, 0]
+        in_gap = (positions >= gap[0] + margin) & (positions < gap[1] - margin)
+        in_buffer = (positions >= cursor - history + margin) & (positions < cursor - margin)
+        outside = in_buffer & ((positions < gap[0] - margin) | (positions >= gap[1] + margin))
+        assert np.all(energy[in_gap] == 0)
+        assert np.all(energy[outside] > 0)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import numpy as np
+import pytest
+
+from smile_layout import verification_signal
+from streaming_smile import (
+    EMOBASE_LLD_NAMES,
+    LEFT_OUT,
+    N_FEATURES,
+    N_FUNCTIONALS,
+    RunningFunctionals,
+    StreamingSmile,
+    batch_functionals,
+    deltas,
+    feature_names,
+    opensmile_mismatches,
+)
+
+RATE = 16000
+STEP = RATE // 100
+FRAME = 400     # 25 ms
+
+
+def frame_llds(signal, sampling_rate):
+    # frame-wise stand-ins for LLDs: energy, zero-crossing rate and mean of 25 ms frames every 10 ms
+    n = max(0, (len(signal) - FRAME) // STEP + 1)
+    frames = np.stack([signal[i * STEP:i * STEP + FRAME] for i in range(n)]) if n else np.zeros((0, FRAME))
+    llds = np.stack([
+        (frames ** 2).mean(axis=1),
+        (np.diff(np.sign(frames), axis=1) != 0).mean(axis=1),
+        frames.mean(axis=1),
+    ], axis=1) if n else np.zeros((0, 3))
+    return np.arange(n) * STEP / sampling_rate, llds
+
+
+def test_feature_layout_matches_emobase() -> None:
+    names = feature_names()
+    assert len(names) == 988
+    assert names[0] == "pcm_intensity_sma_max"
+    assert names[N_FUNCTIONALS * len(EMOBASE_LLD_NAMES)] == "pcm_intensity_sma_de_max"
+    assert "mfcc_sma_de[12]_iqr1-3" in names
+
+
+def test_running_functionals_match_batch_over_sliding_window() -> None:
+    rng = np.random.default_rng(0)
+    data = rng.normal(5, 2, size=(600, 4)).cumsum(axis=0) / 10
+    data[:, 3] = np.round(data[:, 3])   # ties for the extreme positions
+    running = RunningFunctionals(4, capacity=120, block=7)
+    start = 0
+    for hop in [1, 13, 25, 40, 7, 90, 25, 3, 130, 25, 25, 60, 25, 30]:
+        running.push(start, data[start:start + hop])
+        start += hop
+        running.drop_before(start - 100)
+        first = max(0, start - 100)
+        assert len(running) == start - first
+        expected = batch_functionals(data[first:start])
+        np.testing.assert_allclose(running.functionals(), expected, rtol=1e-7, atol=1e-7)
+        tail = data[start:start + 3]
+        np.testing.assert_allclose(running.functionals(tail), batch_functionals(data[first:start + 3]),
+                                   rtol=1e-7, atol=1e-7)
+
+
+def test_streaming_updates_match_batch_functionals_of_the_window() -> None:
+    rng = np.random.default_rng(1)
+    t = np.arange(12 * RATE) / RATE
+    audio = np.sin(2 * np.pi * 220 * t * (1 + t / 20)) * (0.5 + 0.4 * np.sin(t)) + 0.05 * rng.normal(size=len(t))
+    stream = StreamingSmile(sampling_rate=RATE, window_seconds=4, context_seconds=0.1, lld_func=frame_llds,
+                            lld_names=["energy", "zcr", "mean"])
+    window = 4 * RATE
+    cursor = 0
+    for hop in [RATE // 4] * 20 + [1234, 5 * STEP, RATE, RATE // 4, 777] + [RATE // 4] * 8:
+        cursor += hop
+        signal = audio[max(0, cursor - window):cursor]
+        features = stream.update(signal, cursor)
+        _, llds = frame_llds(audio[:cursor], RATE)
+        contours = np.concatenate([llds, deltas(llds)], axis=1)
+        first = -(-(cursor - len(signal)) // STEP)
+        expected = batch_functionals(contours[first:-LEFT_OUT])
+        assert features.shape == (1, 6 * N_FUNCTIONALS)
+        np.testing.assert_allclose(features[0], expected, rtol=1e-6, atol=1e-9)
+    # only the new audio and a little context is extracted, not the whole window on every update
+    assert stream.extracted_frames < 0.4 * (len(audio) // STEP) * 4
+
+
+def test_streaming_starts_over_after_a_jump() -> None:
+    audio = np.random.default_rng(2).normal(size=10 * RATE)
+    stream = StreamingSmile(sampling_rate=RATE, window_seconds=4, lld_func=frame_llds,
+                            lld_names=["energy", "zcr", "mean"])
+    stream.update(audio[:RATE], RATE)
+    features = stream.update(audio[6 * RATE:10 * RATE], 10 * RATE)
+    _, llds = frame_llds(audio[6 * RATE:10 * RATE], RATE)
+    expected = batch_functionals(np.concatenate([llds, deltas(llds)], axis=1)[:-LEFT_OUT])
+    np.testing.assert_allclose(features[0], expected, rtol=1e-6, atol=1e-9)
+
+
+@pytest.mark.parametrize("sampling_rate, hop", [(44100, 0.25), (16000, 0.25), (44100, 0.1)])
+def test_close_to_opensmile_batch_functionals(sampling_rate, hop) -> None:
+    opensmile = pytest.importorskip("opensmile")
+    smile = opensmile.Smile(feature_set=opensmile.FeatureSet.emobase,
+                            feature_level=opensmile.FeatureLevel.Functionals, sampling_rate=sampling_rate)
+    audio = verification_signal(sampling_rate, seconds=7)
+    window = 4 * sampling_rate
+    stream = StreamingSmile(sampling_rate=sampling_rate)
+    for cursor in range(int(hop * sampling_rate), len(audio) + 1, int(hop * sampling_rate)):
+        features = stream.update(audio[max(0, cursor - window):cursor], cursor)
+    batch = smile.process_signal(audio[cursor - window:cursor].astype(np.float32) / 2 ** 15, sampling_rate)
+    assert list(batch.columns) == stream.feature_names
+    assert features.shape == (1, N_FEATURES)
+    # all 988 functionals, within OPENSMILE_TOLERANCES apart from the named start-up differences
+    assert opensmile_mismatches(features, batch.to_numpy()) == []
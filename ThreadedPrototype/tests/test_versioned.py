@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+import time
+
+from versioned import VersionedValue
+
+
+def test_publish_increments_the_version() -> None:
+    value = VersionedValue()
+    assert value.get() == (0, None, None)
+    assert value.publish("a", timestamp=1.5) == 1
+    assert value.publish("b", timestamp=2.5) == 2
+    assert value.get() == (2, 2.5, "b")
+
+
+def test_wait_newer_returns_at_once_when_a_newer_version_exists() -> None:
+    value = VersionedValue()
+    value.publish("a", timestamp=1.0)
+    start = time.time()
+    assert value.wait_newer(0, timeout=5.0) == (1, 1.0, "a")
+    assert time.time() - start < 0.1
+
+
+def test_wait_newer_times_out_with_the_same_version() -> None:
+    value = VersionedValue()
+    value.publish("a", timestamp=1.0)
+    start = time.time()
+    assert value.wait_newer(1, timeout=0.1) == (1, 1.0, "a")
+    assert time.time() - start >= 0.09
+
+
+def test_wait_newer_wakes_on_publish_from_another_thread() -> None:
+    value = VersionedValue()
+    seen = []
+    waiting = threading.Event()
+
+    def consumer():
+        waiting.set()
+        seen.append(value.wait_newer(0, timeout=5.0))
+        seen.append(time.time())
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    waiting.wait()
+    time.sleep(0.05)
+    published = time.time()
+    value.publish("result", timestamp=3.0)
+    thread.join()
+    assert seen[0] == (1, 3.0, "result")
+    # woken by the publish, not by a polling interval
+    assert seen[1] - published < 0.05
+
+
+def test_wait_drained_follows_the_consumers_downstream() -> None:
+    source, middle = VersionedValue(), VersionedValue()
+    source.add_consumer("middle", middle)
+    middle.add_consumer("sink")
+    assert source.wait_drained(timeout=0.01)
+    source.publish("a")
+    assert not source.wait_drained(timeout=0.01)
+    middle.publish("a'")
+    source.consumed("middle", 1)
+    # the middle stage is done with the source, but its own result has not been consumed yet
+    assert not source.wait_drained(timeout=0.01)
+    middle.consumed("sink", 1)
+    assert source.wait_drained(timeout=0.01)
+    # unregistered consumers are not waited for
+    source.consumed("other", 5)
+    assert source.wait_drained(timeout=0.01)
@@ -4,10 +4,16 @@ from genre_prediction import *
 from image_generation import *
 from prompting import *
 from img_display_thread_amp import *
+from replay_source import ReplaySource
+from model_registry import MODELS
+from startup import STARTUP
+import argparse
 import time
 import os
 
 STARTING_CHUNK = 1024
+# the feature selectors of the models that take openSMILE features
+SMILE_SELECTORS = ("valence_selector", "arousal_selector", "genre_selector")
 
 new_image = False
 
@@ -17,11 +23,45 @@ def display_images_old(pipe):
         name = f"image_output_cache/image%d.png" % int(round(time.time() * 10, 1))
         image.save(name)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Mus2Vid threaded prototype.")
+    parser.add_argument("--replay", default=None,
+                        help="Replay an audio file (WAV/FLAC/MP3), or raw int16 PCM from stdin with '-', "
+                             "instead of capturing from the PyAudio input device.")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed relative to real time. 0 feeds audio as fast as the analysis keeps up.")
+    parser.add_argument("--basic-pitch-model", default=None,
+                        help="Basic Pitch model to use: a SavedModel directory, or a converted .tflite / .onnx file "
+                             "to run on the TFLite / ONNX Runtime CPU backend (see basic_pitch_modified/backends.py).")
+    parser.add_argument("--silence-timeout", type=float, default=2.0,
+                        help="Seconds of input below the on-threshold after which Basic Pitch and openSMILE are "
+                             "skipped until the input comes back. Negative to always analyse.")
+    parser.add_argument("--streaming-smile", action="store_true",
+                        help="Compute the openSMILE emobase functionals incrementally (streaming_smile.py) instead of "
+                             "running openSMILE on the whole buffer on every update. Close to openSMILE, but not "
+                             "within tolerance for some of the pitch features the models use.")
+    parser.add_argument("--full-smile", action="store_true",
+                        help="With --streaming-smile, compute all 988 openSMILE emobase features instead of only the "
+                             "ones the emotion and genre feature selectors keep.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     dir = 'image_output_cache'
     for f in os.listdir(dir):
         os.remove(os.path.join(dir, f))
-    SPA_Thread = SinglePyAudioThread(name="SPA_Thread", starting_chunk_size=STARTING_CHUNK)
+    # the models load concurrently in the background while the threads start; each stage comes online as soon
+    # as its own models are ready, the slowest loads go first
+    preload = MODELS.preload([*image_models(), basic_pitch_model_name(args.basic_pitch_model), *GENRE_MODELS,
+                              *EMOTION_MODELS])
+    replay = None
+    if args.replay is not None:
+        replay = ReplaySource(args.replay, speed=args.speed)
+    SPA_Thread = SinglePyAudioThread(name="SPA_Thread", starting_chunk_size=STARTING_CHUNK, replay=replay,
+                                     basic_pitch_model_path=args.basic_pitch_model,
+                                     silence_timeout=None if args.silence_timeout < 0 else args.silence_timeout,
+                                     feature_selectors=None if args.full_smile else SMILE_SELECTORS,
+                                     streaming_smile=args.streaming_smile)
     MMF_Thread = ModifiedMIDIFeatureThread(name="MMF_Thread", SinglePyAudioThread=SPA_Thread)
     Emo_Thread = EmotionClassificationThreadSPA(name='Emo_Thread',
                                                 SPA_Thread=SPA_Thread)
@@ -44,6 +84,7 @@ def main():
                                         SPA_Thread=SPA_Thread)
 
     print("All threads init'ed")
+    startup_reported = False
     try:
 
         Display_Thread.start()
@@ -60,14 +101,26 @@ def main():
         print("============== Prompt started")
         Img_Thread.start()
         print("============== Img started")
-        while True:
+        while replay is None or not replay.finished:
             print("\n\n")
+            if not startup_reported and not preload.is_alive():
+                print("Startup:\n" + STARTUP.report())
+                startup_reported = True
             print("Prompt: ", Prompt_Thread.prompt)
             print("Buffer size: ", SPA_Thread.buffer_index)
             if Emo_Thread.emo_values is not None:
                 print(f"Valence: %.2f, Arousal: %.2f" % (Emo_Thread.emo_values[0], Emo_Thread.emo_values[1]))
-            time.sleep(2)
+            if replay is None:
+                time.sleep(2)
+            else:
+                replay.wait_finished(timeout=2)
+        print(f"Replay finished: {replay.report()}, {SPA_Thread.analysis_worker.runs} analysis runs")
+        if SPA_Thread.silence_gate is not None:
+            print("Silence gate:", SPA_Thread.silence_gate.report())
+        print("Startup:\n" + STARTUP.report())
     except KeyboardInterrupt:
+        pass
+    finally:
         SPA_Thread.stop_request = True
         MMF_Thread.stop_request = True
         GP_Thread.stop_request = True
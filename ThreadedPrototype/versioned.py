@@ -0,0 +1,98 @@
+import threading
+import time
+
+'''
+This class holds the latest result published by a pipeline stage together with a monotonically increasing
+sequence number and the capture time of the audio it was computed from. Consumer threads block on it until
+a newer version is published instead of polling on a fixed sleep. Consumers that register report the versions
+they have finished with, so an offline replay can wait for the whole pipeline before it feeds more audio.
+'''
+
+
+class VersionedValue:
+    def __init__(self):
+        """
+        Initializes an empty VersionedValue (sequence number 0, value None).
+        Parameters: nothing
+        Returns: nothing
+        """
+        self.value = None
+        self.seq = 0
+        self.timestamp = None
+        # the last version every registered consumer has finished with, and the results it publishes, by name
+        self._consumed = {}
+        self._downstream = {}
+        self._condition = threading.Condition()
+
+    def publish(self, value, timestamp=None):
+        """
+        Stores a new value and wakes up every thread waiting for a newer version.
+        Parameters:
+            value: the new value
+            timestamp: the capture time (time.time()) of the audio the value was computed from, defaults to now
+        Returns: the sequence number of the new value
+        """
+        with self._condition:
+            self.value = value
+            self.timestamp = time.time() if timestamp is None else timestamp
+            self.seq += 1
+            self._condition.notify_all()
+            return self.seq
+
+    def get(self):
+        """
+        Returns: the current (seq, timestamp, value) tuple
+        """
+        with self._condition:
+            return self.seq, self.timestamp, self.value
+
+    def wait_newer(self, seq, timeout=None):
+        """
+        Blocks until a version newer than seq has been published or the timeout expires.
+        Parameters:
+            seq: the last sequence number the caller has seen
+            timeout: the maximum number of seconds to wait, or None to wait forever
+        Returns: the current (seq, timestamp, value) tuple; its seq equals the given seq on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.seq > seq, timeout=timeout)
+            return self.seq, self.timestamp, self.value
+
+    def add_consumer(self, name, results=None):
+        """
+        Registers a consumer that reports the versions it has finished with through consumed().
+        Parameters:
+            name: the name of the consumer
+            results: the VersionedValue the consumer publishes its own results in, if any
+        Returns: nothing
+        """
+        with self._condition:
+            self._consumed[name] = 0
+            self._downstream[name] = results
+
+    def consumed(self, name, seq):
+        """
+        Records that a consumer has finished with a version (and published whatever it computed from it).
+        Parameters:
+            name: the name of the consumer
+            seq: the sequence number of the version
+        Returns: nothing
+        """
+        with self._condition:
+            if name in self._consumed:
+                self._consumed[name] = max(self._consumed[name], seq)
+                self._condition.notify_all()
+
+    def wait_drained(self, timeout=None):
+        """
+        Blocks until every registered consumer has finished with the current version, and in turn every consumer of
+        their results with the versions they published for it, or the timeout of a stage expires.
+        Parameters: timeout: the maximum number of seconds to wait for each stage, or None to wait forever
+        Returns: True if the pipeline after this value is drained
+        """
+        with self._condition:
+            seq = self.seq
+            if not self._condition.wait_for(lambda: all(c >= seq for c in self._consumed.values()), timeout=timeout):
+                return False
+            downstream = [results for results in self._downstream.values() if results is not None]
+        return all(results.wait_drained(timeout) for results in downstream)
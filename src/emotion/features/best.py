@@ -3,7 +3,8 @@ import os
 import pandas as pd
 from sklearn.feature_selection import SelectKBest
 from sklearn.feature_selection import f_regression
-from utils.util import get_valence_targets, get_arousal_targets, FEATURES_DIR, FEATURES_EXT, SELECTOR_EXT
+from utils.util import get_valence_targets, get_arousal_targets, get_audio_filepaths, FEATURES_DIR, SELECTOR_EXT
+from src.emotion.features.extract import extract_opensmile_features
 
 
 def _save_opensmile_feature_selectors():
@@ -17,7 +18,7 @@ def _save_opensmile_feature_selectors():
     -------
     None
     """
-    opensmile_features = joblib.load(f"{FEATURES_DIR}/opensmile_lb.{FEATURES_EXT}")
+    opensmile_features = extract_opensmile_features(get_audio_filepaths())
     valence_targets = get_valence_targets()
     arousal_targets = get_arousal_targets()
 
@@ -1,8 +1,6 @@
-import os
 import pandas as pd
-import opensmile
-import joblib 
-from utils.util import FEATURES_DIR, FEATURES_EXT, CHUNK_SIZE
+from src.shared.batch_extract import smile_features
+from src.shared.feature_store import opensmile_matrix
 
 
 def extract_opensmile_features(audio_filepaths: list[str]):
@@ -14,27 +12,26 @@ def extract_opensmile_features(audio_filepaths: list[str]):
     audio_filepaths
         A list of audio filepaths relative to repository root.
     """
-    # if os.path.exists(f"{FEATURES_DIR}/opensmile.{FEATURES_EXT}"):
-    #     return joblib.load(f"{FEATURES_DIR}/opensmile.{FEATURES_EXT}")
+    # from the feature store: only songs whose audio changed (or that are new) are extracted, in parallel
+    opensmile_features = opensmile_matrix(audio_filepaths)
 
-    smile = opensmile.Smile(
-        feature_set=opensmile.FeatureSet.emobase,
-        feature_level=opensmile.FeatureLevel.Functionals,
-    )
-    opensmile_features_list = []
+    return pd.DataFrame(data=opensmile_features)
 
-    size = len(audio_filepaths)
-    for i, audio_filepath in enumerate(audio_filepaths):
-        if i % CHUNK_SIZE == 0:
-            print(f"{i}/{size}")
 
-        # Get smile features, convert from df to list, and convert from 2D list to 1D list
-        opensmile_features_list.append(sum(smile.process_file(audio_filepath).values.tolist(), []))
+def extract_file_opensmile_features(audio_filepath: str):
+    """Return a one-row pandas.DataFrame of the openSMILE features
+    of a single audio file, for inference.
 
-    if not os.path.exists(FEATURES_DIR): os.mkdir(FEATURES_DIR)
-    joblib.dump(opensmile_features_list, f"{FEATURES_DIR}/opensmile_lb.{FEATURES_EXT}")
+    The features are extracted in this process with its openSMILE
+    extractor (created once), without the worker pool and the
+    feature store of extract_opensmile_features.
 
-    return pd.DataFrame(data=opensmile_features_list)
+    Parameters
+    ----------
+    audio_filepath
+        An audio filepath relative to repository root.
+    """
+    return pd.DataFrame(data=smile_features(audio_filepath).reshape(1, -1))
 
 
 if __name__ == "__main__":
@@ -1,10 +1,33 @@
-from src.emotion.features.extract import extract_opensmile_features
+from src.emotion.features.extract import extract_file_opensmile_features
 from src.emotion.features.best import get_best_opensmile_features
+import threading
 import keras
 
 MODEL_DIR = "models/emotion"
 MODEL_EXT = "keras"
 
+_regressors = {}
+_regressors_lock = threading.Lock()
+
+
+def load_regressor(name: str) -> keras.Model:
+    """Return the keras regressor for "valence" or "arousal", loading it on the first call only.
+
+    Parameters
+    ----------
+    name
+        "valence" or "arousal".
+
+    Returns
+    -------
+    regressor: keras.Model
+        The loaded model, shared by every later call.
+    """
+    with _regressors_lock:
+        if name not in _regressors:
+            _regressors[name] = keras.models.load_model(f"{MODEL_DIR}/{name}.{MODEL_EXT}")
+        return _regressors[name]
+
 def get_va_values(audio_filepath: str) -> tuple[float, float]:
     """Process audio at given filepath and return valence and arousal values.
 
@@ -20,11 +43,11 @@ def get_va_values(audio_filepath: str) -> tuple[float, float]:
     arousal: float
         A float between 1 and 9.
     """
-    valence_regressor = keras.models.load_model(f"{MODEL_DIR}/valence.{MODEL_EXT}")
-    arousal_regressor = keras.models.load_model(f"{MODEL_DIR}/arousal.{MODEL_EXT}")
+    valence_regressor = load_regressor("valence")
+    arousal_regressor = load_regressor("arousal")
 
 
-    opensmile_features = extract_opensmile_features([audio_filepath])
+    opensmile_features = extract_file_opensmile_features(audio_filepath)
     opensmile_valence_features, opensmile_arousal_features = get_best_opensmile_features(opensmile_features)
     
     valence = valence_regressor.predict(opensmile_valence_features)[0]
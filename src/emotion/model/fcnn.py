@@ -16,23 +16,19 @@ def get_test_feats():
     pass
 
 def get_matrix(type):
-    features = get_features("opensmile_lb")
+    features = get_features(OPENSMILE_FEATURES)
     if (type == "valence"):
         targets = get_valence_targets()
         selector = get_valence_selector()
-        features = selector.transform(features).tolist()
     elif (type == "arousal"):
         targets = get_arousal_targets()
         selector = get_arousal_selector()
-        features = selector.transform(features).tolist()
     else:
         print("invalid type")
         return
 
-    for i in range(len(features)):
-        features[i].append(targets[i])
-
-    return features
+    # selected features with the target as the last column
+    return np.column_stack([selector.transform(features), targets])
 
 def plot_loss(history):
     plt.plot(history.history['loss'], label='loss')
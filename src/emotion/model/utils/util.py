@@ -1,5 +1,7 @@
 import joblib
 import pandas as pd
+from src.emotion.features.utils.util import get_audio_filepaths
+from src.shared.feature_store import opensmile_matrix
 
 # ANNOTATIONS_PATH = "./data/processed/annotations/static_annotations_averaged_songs_1_2000.csv"
 ANNOTATIONS_PATH = "./data/processed/annotations/static_annotations_averaged_songs_all.csv"
@@ -10,6 +12,8 @@ FEATURES_EXT = "features"
 SELECTOR_EXT = "selector"
 TARGETS_EXT = "targets"
 MODEL_EXT = "model"
+# the openSMILE features of the songs, kept in the feature store
+OPENSMILE_FEATURES = "opensmile_lb"
 
 
 def get_valence_selector():
@@ -21,7 +25,13 @@ def get_arousal_selector():
 
 
 def get_features(filename) -> pd.DataFrame:
-    """Return a pandas.DataFrame of features loaded from a file."""
+    """Return a pandas.DataFrame of features loaded from a file.
+
+    The openSMILE features come from the feature store instead, which loads them memory-mapped and extracts
+    only the songs whose audio changed.
+    """
+    if filename == OPENSMILE_FEATURES:
+        return pd.DataFrame(opensmile_matrix(get_audio_filepaths()))
     return joblib.load(f"{FEATURES_DIR}/{filename}.{FEATURES_EXT}")
 
 
@@ -7,19 +7,24 @@ import pickle, lzma
 from src.genre.features.util import INTERIM_DATA_DIR, SELECTOR_EXT
 from src.genre.features.extract import get_features
 
-def select_features():
-    if(not(os.path.exists(f"{INTERIM_DATA_DIR}labeled_features.xz"))):
-        get_features()
-    
-    with lzma.open(f"{INTERIM_DATA_DIR}labeled_features.xz", "rb") as f:
-        labeled_features = pickle.load(f)
+def select_features(labeled_features=None) -> np.array:
+    """Select the 256 features with the strongest relationships to the genre and save the selector.
+
+    Parameters
+    ----------
+    labeled_features: np.array
+        The labeled feature matrix, with the genre in the last column. If None, it is loaded from the feature store
+        (see get_features) and the selected features are saved to the interim data folder.
+
+    Returns
+    -------
+    labeled_selected_features: np.array
+        The selected features, with the genre in the last column.
+    """
+    save = labeled_features is None
+    if save:
+        labeled_features = get_features()
 
-    labeled_selected_features = select_features(labeled_features)
-
-    with lzma.open(f"{INTERIM_DATA_DIR}labeled_selected_features.xz", "rb") as f:
-        pickle.dump(labeled_selected_features, f)
-
-def select_features(labeled_features) -> np.array():
     num_cols = labeled_features.shape[1] - 1
     print(num_cols)
 
@@ -35,6 +40,10 @@ def select_features(labeled_features) -> np.array():
 
     selected_features = selector.transform(X) # Narrows feature matrix
 
-    labeled_selected_features = np.column_stack([features, Y]) # Add labels back to feature matrix
+    labeled_selected_features = np.column_stack([selected_features, Y]) # Add labels back to feature matrix
+
+    if save:
+        with lzma.open(f"{INTERIM_DATA_DIR}labeled_selected_features.xz", "wb") as f:
+            pickle.dump(labeled_selected_features, f)
 
-    return labeled_selected_features
\ No newline at end of file
+    return labeled_selected_features
@@ -1,4 +1,3 @@
-import opensmile
 import numpy as np
 import pandas as pd
 import pickle, lzma
@@ -6,8 +5,45 @@ import pretty_midi as pm
 import os
 from src.features.util import *
 from src.data.process import process_audio
+from src.shared.feature_store import FeatureStore, opensmile_matrix, opensmile_params
+
+# the name of the MIDI feature extractor (extract_midi_features) in the keys of the feature store
+MIDI_EXTRACTOR = "genre_midi_features"
+# normalize_features: (feature - offset) / scale of every MIDI feature
+MIDI_FEATURE_NORMALIZATION = {
+    "tempo": (150, 300),
+    "num_sig_changes": (2, 10),
+    "resolution": (260, 400),
+    "time_sig_1": (3, 8),
+    "time_sig_2": (3, 8),
+    "melody_complexity": (0, 10),
+    "melody_range": (0, 80),
+    "pitch_class_hist": (0, 100),
+}
+
+
+def midi_params() -> dict:
+    """Return the parameters of the MIDI feature extraction that go into the key of the labeled features."""
+    # pretty_midi estimates the tempo and the pitch class histogram, so its version is part of the extraction
+    return {"normalization": MIDI_FEATURE_NORMALIZATION, "pretty_midi": getattr(pm, "__version__", None)}
+
+def get_features(store=None) -> np.ndarray:
+    """Return the labeled feature matrix of the audio clips: the openSMILE features, then the MIDI features, then the genre.
+
+    The matrix is kept in the feature store under a key of the clips' openSMILE features, the matched MIDI and the
+    MIDI feature extractor and its parameters, so it loads memory-mapped unless one of them changed.
 
-def get_features() -> None:
+    Parameters
+    ----------
+    store: FeatureStore
+        The feature store, the default one if None.
+
+    Returns
+    -------
+    labeled_features: np.array
+        One row per audio clip, with the genre in the last column.
+    """
+    store = FeatureStore() if store is None else store
     if(not(os.path.exists(f"{INTERIM_DATA_DIR}audio_clips.xz") and os.path.exists(f"{INTERIM_DATA_DIR}clip_genres.xz"))):
         process_audio()
     
@@ -16,11 +52,19 @@ def get_features() -> None:
     with lzma.open(f"{INTERIM_DATA_DIR}clip_genres.xz", "rb") as f:
         clip_genres = pickle.load(f)
 
-    smile_features = get_smile_feats(audio_clips)
+    smile_features = get_smile_feats(audio_clips, store)
 
     if(not(os.path.exists(f"{INTERIM_DATA_DIR}matched_midi.xz"))):
         get_matched_midi(audio_clips, clip_genres)
 
+    smile_key = store.matrix_key(clip_paths(audio_clips), "opensmile", opensmile_params())
+    key = store.key("genre_labeled_features", {"midi_extractor": MIDI_EXTRACTOR, "midi_params": midi_params()},
+                    smile_key, store.file_digest(f"{INTERIM_DATA_DIR}matched_midi.xz"))
+    store.save_digest_index()
+    labeled_features = store.load(key)
+    if labeled_features is not None:
+        return labeled_features
+
     with lzma.open(f"{INTERIM_DATA_DIR}matched_midi.xz", "rb") as f:
         matched_midi = pickle.load(f)
 
@@ -28,46 +72,29 @@ def get_features() -> None:
 
     labeled_features = np.concatenate((smile_features, midi_features), axis=1) # smile features don't have genre labels, midis do. This way the last column is genre
 
-    # Save feature matrix using pickle for easier access later
-    with lzma.open(f"{INTERIM_DATA_DIR}labeled_features.xz", "wb") as f:
-        pickle.dump(labeled_features, f)
+    return store.save(key, labeled_features)
 
-    return 
+def clip_paths(audio):
+    """Return the filepaths of the processed audio clips."""
+    return [PROCESSED_AUDIO_FOLDER + file for file in audio]
 
-def get_smile_feats(audio):
+def get_smile_feats(audio, store=None):
     """Create a feature matrix of openSMILE features from the emobase set (988 total features) for all of the audio clips
 
     Parameters
     ----------
     audio: list
         filepaths to audio clips
+    store: FeatureStore
+        The feature store, the default one if None.
 
     Returns
     -------
     feature_array: np.array
-        array of features for each audio clip. 988 columns for each of 988 features. len(audio) rows (one row for every audio clip).
+        float32 array of features for each audio clip. 988 columns for each of 988 features. len(audio) rows (one row for every audio clip).
     """
-    # create smile object for feature extraction
-    smile = opensmile.Smile(
-        feature_set=opensmile.FeatureSet.emobase,
-        feature_level=opensmile.FeatureLevel.Functionals,
-    )
-
-    all_smiles = [] # list of smile features for each clip
-    iters = 0
-    for file in audio:
-        iters += 1
-        print(str(iters) + "/" + str(len(audio)))
-        
-        # get smile features
-        smile_feats = smile.process_file(PROCESSED_AUDIO_FOLDER + file)
-        # convert from df to list
-        smile_feats = smile_feats.values.tolist()
-        # convert from 2d list to 1d list
-        smile_feats = sum(smile_feats, [])
-        all_smiles.append(smile_feats)
-
-    feature_array = np.asarray(all_smiles)
+    # from the feature store: only clips that changed (or are new) are extracted, in parallel
+    feature_array = opensmile_matrix(clip_paths(audio), store=store)
     
     return feature_array
 
@@ -84,17 +111,21 @@ def normalize_features(features):
     list of floats
         normalized features
     """
+    def scaled(value, name):
+        offset, scale = MIDI_FEATURE_NORMALIZATION[name]
+        return (value - offset) / scale
+
     # Normalize each feature based on its specific range
-    tempo = (features[0] - 150) / 300
-    num_sig_changes = (features[1] - 2) / 10
-    resolution = (features[2] - 260) / 400
-    time_sig_1 = (features[3] - 3) / 8
-    time_sig_2 = (features[4] - 3) / 8
-    melody_complexity = (features[5] - 0) / 10
-    melody_range = (features[6] - 0) / 80
+    tempo = scaled(features[0], "tempo")
+    num_sig_changes = scaled(features[1], "num_sig_changes")
+    resolution = scaled(features[2], "resolution")
+    time_sig_1 = scaled(features[3], "time_sig_1")
+    time_sig_2 = scaled(features[4], "time_sig_2")
+    melody_complexity = scaled(features[5], "melody_complexity")
+    melody_range = scaled(features[6], "melody_range")
 
     # Normalize pitch class histogram
-    pitch_class_hist = [((f - 0) / 100) for f in features[7:-1]]
+    pitch_class_hist = [scaled(f, "pitch_class_hist") for f in features[7:-1]]
 
     # Return the normalized feature vector
     return [tempo, num_sig_changes, resolution, time_sig_1, time_sig_2, melody_complexity, melody_range] + pitch_class_hist
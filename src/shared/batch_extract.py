@@ -0,0 +1,211 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import numpy as np
+
+
+DEFAULT_FEATURE_SET = "emobase"
+DEFAULT_FEATURE_LEVEL = "Functionals"
+SHARD_EXT = "npy"
+
+# the openSMILE extractor of each worker process, created once by _init_worker
+_smile = None
+
+
+def _init_worker(feature_set: str, feature_level: str) -> None:
+    """Create the openSMILE extractor of a worker process."""
+    global _smile
+    import opensmile
+    _smile = opensmile.Smile(
+        feature_set=opensmile.FeatureSet[feature_set],
+        feature_level=opensmile.FeatureLevel[feature_level],
+    )
+
+
+def smile_features(audio_filepath: str) -> np.ndarray:
+    """Return the openSMILE features of an audio file as a flat float32 array.
+
+    Runs in a worker process initialized by _init_worker (or initializes the calling process on first use).
+    """
+    if _smile is None:
+        _init_worker(DEFAULT_FEATURE_SET, DEFAULT_FEATURE_LEVEL)
+    return _smile.process_file(audio_filepath).to_numpy(dtype=np.float32).reshape(-1)
+
+
+def extractor_name(extract_file=None, feature_set: str = DEFAULT_FEATURE_SET,
+                   feature_level: str = DEFAULT_FEATURE_LEVEL) -> str:
+    """Return a name of an extractor and its parameters, which goes into the names of its shards."""
+    if extract_file is None:
+        return f"opensmile:{feature_set}:{feature_level}"
+    return f"{extract_file.__module__}.{extract_file.__qualname__}"
+
+
+def shard_path(shard_dir: str, audio_filepath: str, extractor: str = extractor_name()) -> str:
+    """Return the path of the shard that holds the features an extractor computes from an audio file.
+
+    Shards are named after the file name and a hash of the full path, the extractor (see extractor_name) and the
+    file's size and modification time, so files with the same name in different directories do not collide, and
+    a changed file or extractor gets a new shard instead of reusing a stale one.
+    """
+    stat = os.stat(audio_filepath)
+    signature = f"{os.path.abspath(audio_filepath)}\n{extractor}\n{stat.st_size}\n{stat.st_mtime_ns}"
+    digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(audio_filepath))[0]
+    return os.path.join(shard_dir, f"{name}-{digest}.{SHARD_EXT}")
+
+
+def _extract_to_shard(extract_file, audio_filepath: str, path: str) -> int:
+    """Extract the features of one file and write them to its shard atomically.
+
+    Returns
+    -------
+    n_features: int
+        The number of features of the file.
+    """
+    features = np.ascontiguousarray(extract_file(audio_filepath), dtype=np.float32).reshape(-1)
+    # a shard is complete or absent: write to a temporary file first, then rename it
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        np.save(f, features)
+    os.replace(temporary, path)
+    return len(features)
+
+
+class Progress:
+    """Report how many files are done, the throughput and the estimated time left, at most every interval seconds.
+
+    Parameters
+    ----------
+    total
+        The number of files to extract.
+    skipped
+        The number of files already extracted by an earlier run.
+    interval
+        The minimum number of seconds between two reports.
+    """
+
+    def __init__(self, total: int, skipped: int = 0, interval: float = 10.0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.interval = interval
+        self.start = time.time()
+        self.last_report = self.start
+
+    def update(self, failed: bool = False) -> None:
+        """Count a finished file and report if the interval has passed."""
+        self.done += 1
+        self.failed += failed
+        now = time.time()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            print(self.report())
+
+    def report(self) -> str:
+        """Return a one-line summary of the progress."""
+        elapsed = time.time() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        left = (self.total - self.done) / rate if rate > 0 else float("inf")
+        return (f"{self.skipped + self.done}/{self.skipped + self.total} files ({self.skipped} from earlier runs, "
+                f"{self.failed} failed), {rate:.2f} files/s, {elapsed:.0f} s elapsed, {left:.0f} s left")
+
+
+def extract_batch(
+    audio_filepaths: list[str],
+    shard_dir: str,
+    extract_file=None,
+    feature_set: str = DEFAULT_FEATURE_SET,
+    feature_level: str = DEFAULT_FEATURE_LEVEL,
+    n_workers: Optional[int] = None,
+    report_interval: float = 10.0,
+    shard_paths: Optional[list[str]] = None,
+) -> np.ndarray:
+    """Return a matrix of openSMILE features of the audio files, extracted in parallel and resumable.
+
+    Files are fanned out over a process pool and the features of every file are written to their own shard in
+    shard_dir as soon as they are extracted. Files that already have a shard (from an earlier, possibly
+    interrupted, run) are not extracted again. The shards are assembled into one matrix at the end.
+
+    Parameters
+    ----------
+    audio_filepaths
+        The audio files, in the order of the rows of the matrix.
+    shard_dir
+        The directory of the per-file shards.
+    extract_file
+        A picklable function that returns the features of an audio file as a flat array, openSMILE by default.
+    feature_set, feature_level
+        The names of the opensmile.FeatureSet and opensmile.FeatureLevel of the default extractor.
+    n_workers
+        The number of worker processes, the number of CPUs by default.
+    report_interval
+        The minimum number of seconds between two progress reports.
+    shard_paths
+        The shard of every file, by default named after the file and the extractor in shard_dir (see shard_path).
+
+    Returns
+    -------
+    features: numpy.ndarray
+        A contiguous float32 matrix with one row per audio file.
+
+    Raises
+    ------
+    RuntimeError
+        If some files could not be extracted; the others are kept in their shards, so a rerun only retries those.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    if shard_paths is None:
+        extractor = extractor_name(extract_file, feature_set, feature_level)
+        shard_paths = [shard_path(shard_dir, audio_filepath, extractor) for audio_filepath in audio_filepaths]
+    paths = shard_paths
+    todo = [(audio_filepath, path) for audio_filepath, path in zip(audio_filepaths, paths) if not os.path.exists(path)]
+    progress = Progress(len(todo), len(audio_filepaths) - len(todo), report_interval)
+
+    failed = []
+    if todo:
+        if extract_file is None:
+            extract_file, initializer, initargs = smile_features, _init_worker, (feature_set, feature_level)
+        else:
+            initializer, initargs = None, ()
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer, initargs=initargs) as pool:
+            futures = {pool.submit(_extract_to_shard, extract_file, audio_filepath, path): audio_filepath
+                       for audio_filepath, path in todo}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.append(futures[future])
+                    print(f"Extracting {futures[future]} failed: {e!r}")
+                    progress.update(failed=True)
+                else:
+                    progress.update()
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(audio_filepaths)} files could not be extracted, e.g. {failed[0]}")
+
+    return assemble_shards(paths, audio_filepaths)
+
+
+def assemble_shards(paths: list[str], audio_filepaths: Optional[list[str]] = None) -> np.ndarray:
+    """Return the features of the shards as one contiguous float32 matrix, one row per shard.
+
+    Raises
+    ------
+    ValueError
+        If a shard does not have as many features as the first one; the error names its audio file (or shard).
+    """
+    if not paths:
+        return np.zeros((0, 0), dtype=np.float32)
+    sources = paths if audio_filepaths is None else audio_filepaths
+    first = np.load(paths[0], mmap_mode="r")
+    features = np.empty((len(paths), len(first)), dtype=np.float32)
+    for row, path in enumerate(paths):
+        shard = np.load(path, mmap_mode="r")
+        if shard.shape != first.shape:
+            raise ValueError(f"{sources[row]} has {shard.size} features but {sources[0]} has {first.size} "
+                             f"(shard {path})")
+        features[row] = shard
+    return features
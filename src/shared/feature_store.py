@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+from src.shared.batch_extract import DEFAULT_FEATURE_LEVEL, DEFAULT_FEATURE_SET, extract_batch
+
+
+FEATURE_STORE_DIR = "./data/interim/feature_store"
+# bump when a change to the feature extraction code changes the features, so every cached entry is recomputed
+CODE_VERSION = "1"
+ENTRY_EXT = "npy"
+
+
+class FeatureStore:
+    """A content-addressed on-disk cache of features, shared by the emotion and genre pipelines.
+
+    Every entry is keyed by a hash of the content of its inputs (e.g. an audio file), the name and parameters of
+    the extractor that computed it and the code version, so a changed audio file, feature set or sample rate gets
+    a new key instead of stale features. Entries are .npy files, loaded memory-mapped. The content hash of a file
+    is computed once and remembered with its size and modification time, so unchanged files are not read again.
+
+    Parameters
+    ----------
+    root
+        The directory of the store.
+    code_version
+        The version of the feature extraction code, part of every key.
+    """
+
+    def __init__(self, root: str = FEATURE_STORE_DIR, code_version: str = CODE_VERSION):
+        self.root = root
+        self.code_version = code_version
+        self.entry_dir = os.path.join(root, "entries")
+        self.digest_index_path = os.path.join(root, "digests.json")
+        self._lock = threading.Lock()
+        self._digests = None
+
+    def file_digest(self, path: str) -> str:
+        """Return the SHA-256 digest of the content of a file, hashing it only if it changed since the last time."""
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        absolute = os.path.abspath(path)
+        with self._lock:
+            if self._digests is None:
+                self._digests = self._load_digest_index()
+            known = self._digests.get(absolute)
+            if known is not None and known[0] == signature:
+                return known[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self._digests[absolute] = [signature, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _load_digest_index(self) -> dict:
+        if not os.path.exists(self.digest_index_path):
+            return {}
+        with open(self.digest_index_path) as f:
+            return json.load(f)
+
+    def save_digest_index(self) -> None:
+        """Write the remembered file digests to the store."""
+        with self._lock:
+            if self._digests is None:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            temporary = f"{self.digest_index_path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(self._digests, f)
+            os.replace(temporary, self.digest_index_path)
+
+    def key(self, extractor: str, params: dict, *inputs: str) -> str:
+        """Return the key of the features an extractor computes from inputs.
+
+        Parameters
+        ----------
+        extractor
+            The name of the extractor.
+        params
+            The parameters of the extractor (JSON-serializable).
+        inputs
+            The digests or keys of the inputs.
+        """
+        description = json.dumps({"extractor": extractor, "params": params, "code_version": self.code_version,
+                                  "inputs": list(inputs)}, sort_keys=True)
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def file_keys(self, paths: list[str], extractor: str, params: dict) -> list[str]:
+        """Return the key of the features an extractor computes from each file."""
+        keys = [self.key(extractor, params, self.file_digest(path)) for path in paths]
+        self.save_digest_index()
+        return keys
+
+    def path(self, key: str) -> str:
+        """Return the path of the entry of a key."""
+        return os.path.join(self.entry_dir, f"{key}.{ENTRY_EXT}")
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """Return the memory-mapped entry of a key, or None if it is not in the store."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def save(self, key: str, features: np.ndarray) -> np.ndarray:
+        """Store features under a key (atomically) and return the memory-mapped entry."""
+        os.makedirs(self.entry_dir, exist_ok=True)
+        temporary = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, np.ascontiguousarray(features))
+        os.replace(temporary, self.path(key))
+        return self.load(key)
+
+    def matrix_key(self, paths: list[str], extractor: str, params: dict) -> str:
+        """Return the key of the matrix of the features an extractor computes from each file."""
+        return self.key("matrix", {}, *self.file_keys(paths, extractor, params))
+
+    def matrix(
+        self,
+        paths: list[str],
+        extractor: str,
+        params: dict,
+        extract_file=None,
+        n_workers: Optional[int] = None,
+    ) -> np.ndarray:
+        """Return the matrix of the features of the files, one row per file, extracting only the missing rows.
+
+        Every row is stored under the key of its file, and the assembled matrix under a key of all the rows, so
+        a matrix that has not changed loads memory-mapped without touching the rows.
+
+        Parameters
+        ----------
+        paths
+            The files, in the order of the rows.
+        extractor
+            The name of the extractor.
+        params
+            The parameters of the extractor; with the default openSMILE extractor, "feature_set" and
+            "feature_level" are the names of its opensmile.FeatureSet and opensmile.FeatureLevel.
+        extract_file
+            A picklable function that returns the features of a file as a flat array, openSMILE by default.
+        n_workers
+            The number of worker processes of the extraction.
+
+        Returns
+        -------
+        features: numpy.ndarray
+            A memory-mapped float32 matrix.
+        """
+        keys = self.file_keys(paths, extractor, params)
+        matrix_key = self.key("matrix", {}, *keys)
+        features = self.load(matrix_key)
+        if features is not None:
+            return features
+        features = extract_batch(
+            paths,
+            self.entry_dir,
+            extract_file=extract_file,
+            feature_set=params.get("feature_set", DEFAULT_FEATURE_SET),
+            feature_level=params.get("feature_level", DEFAULT_FEATURE_LEVEL),
+            n_workers=n_workers,
+            shard_paths=[self.path(key) for key in keys],
+        )
+        return self.save(matrix_key, features)
+
+
+def opensmile_params(feature_set: str = DEFAULT_FEATURE_SET, feature_level: str = DEFAULT_FEATURE_LEVEL) -> dict:
+    """Return the parameters of openSMILE extraction that go into the keys of its features."""
+    # openSMILE extracts at the native sample rate of each file, which is part of the file's content
+    return {"feature_set": feature_set, "feature_level": feature_level, "sampling_rate": "native"}
+
+
+def opensmile_matrix(
+    audio_filepaths: list[str],
+    feature_set: str = DEFAULT_FEATURE_SET,
+    feature_level: str = DEFAULT_FEATURE_LEVEL,
+    store: Optional[FeatureStore] = None,
+    n_workers: Optional[int] = None,
+) -> np.ndarray:
+    """Return the openSMILE features of the audio files from the feature store, extracting only what changed.
+
+    Parameters
+    ----------
+    audio_filepaths
+        The audio files, in the order of the rows.
+    feature_set, feature_level
+        The names of the opensmile.FeatureSet and opensmile.FeatureLevel.
+    store
+        The feature store, the one in FEATURE_STORE_DIR by default.
+    n_workers
+        The number of worker processes of the extraction.
+
+    Returns
+    -------
+    features: numpy.ndarray
+        A memory-mapped float32 matrix with one row per audio file.
+    """
+    store = FeatureStore() if store is None else store
+    return store.matrix(audio_filepaths, "opensmile", opensmile_params(feature_set, feature_level),
+                        n_workers=n_workers)
@@ -0,0 +1,6 @@
+import pathlib
+import sys
+
+# The pipelines import their modules rooted at the repository (e.g. "from src.shared.batch_extract import ..."),
+# so make the repository root importable when pytest is run from anywhere.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+import numpy as np
+import pytest
+
+from src.shared.batch_extract import assemble_shards, extract_batch, extractor_name, shard_path
+
+
+def fake_features(audio_filepath):
+    """Return the numbers written in a fake audio file, failing on a file that says so."""
+    with open(audio_filepath) as f:
+        text = f.read()
+    if text == "fail":
+        raise OSError("unreadable audio")
+    return [float(value) for value in text.split()]
+
+
+def write_files(directory, contents):
+    paths = []
+    for i, content in enumerate(contents):
+        path = directory / f"song_{i}.txt"
+        path.write_text(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_rows_follow_input_order(tmp_path) -> None:
+    paths = write_files(tmp_path, [f"{i} {i + 0.5}" for i in range(8)])
+    features = extract_batch(paths, str(tmp_path / "shards"), extract_file=fake_features, n_workers=3)
+    assert features.dtype == np.float32 and features.flags.c_contiguous
+    np.testing.assert_array_equal(features, [[i, i + 0.5] for i in range(8)])
+
+
+def test_resumed_run_skips_existing_shards(tmp_path) -> None:
+    paths = write_files(tmp_path, ["1 2", "3 4", "5 6"])
+    shard_dir = str(tmp_path / "shards")
+    os.makedirs(shard_dir)
+    # a shard left by an earlier run holds something extraction would not give, so it shows if it was reused
+    np.save(shard_path(shard_dir, paths[1], extractor_name(fake_features)), np.array([-1, -1], dtype=np.float32))
+    features = extract_batch(paths, shard_dir, extract_file=fake_features, n_workers=2)
+    np.testing.assert_array_equal(features, [[1, 2], [-1, -1], [5, 6]])
+
+
+def test_failed_file_raises_and_keeps_the_other_shards(tmp_path) -> None:
+    paths = write_files(tmp_path, ["1 2", "fail", "5 6"])
+    shard_dir = str(tmp_path / "shards")
+    with pytest.raises(RuntimeError, match="1 of 3 files"):
+        extract_batch(paths, shard_dir, extract_file=fake_features, n_workers=2)
+    extractor = extractor_name(fake_features)
+    assert os.path.exists(shard_path(shard_dir, paths[0], extractor))
+    assert not os.path.exists(shard_path(shard_dir, paths[1], extractor))
+    assert os.path.exists(shard_path(shard_dir, paths[2], extractor))
+
+    # a rerun extracts only the file that failed
+    with open(paths[1], "w") as f:
+        f.write("3 4")
+    features = extract_batch(paths, shard_dir, extract_file=fake_features, n_workers=2)
+    np.testing.assert_array_equal(features, [[1, 2], [3, 4], [5, 6]])
+
+
+def test_changed_file_or_extractor_gets_a_new_shard(tmp_path) -> None:
+    path = write_files(tmp_path, ["1 2"])[0]
+    shard = shard_path(str(tmp_path), path)
+    assert shard_path(str(tmp_path), path, extractor_name(feature_set="ComParE_2016")) != shard
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert shard_path(str(tmp_path), path) != shard
+
+
+def test_shard_of_wrong_length_names_its_file(tmp_path) -> None:
+    shards = []
+    for i, length in enumerate([3, 3, 2]):
+        shards.append(str(tmp_path / f"{i}.npy"))
+        np.save(shards[-1], np.zeros(length, dtype=np.float32))
+    with pytest.raises(ValueError, match="song_2.mp3 has 2 features"):
+        assemble_shards(shards, ["song_0.mp3", "song_1.mp3", "song_2.mp3"])
+
+
+def test_single_file_inference_extracts_in_process(tmp_path, monkeypatch) -> None:
+    pytest.importorskip("opensmile")
+    soundfile = pytest.importorskip("soundfile")
+    from src.emotion.features.extract import extract_file_opensmile_features
+
+    t = np.arange(16000) / 16000
+    path = tmp_path / "tone.wav"
+    soundfile.write(str(path), (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), 16000)
+    monkeypatch.chdir(tmp_path)
+    features = extract_file_opensmile_features(str(path))
+    assert features.shape == (1, 988)
+    # nothing is written to the feature store (or anywhere else)
+    assert sorted(os.listdir(tmp_path)) == ["tone.wav"]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+
+import numpy as np
+
+from src.shared.feature_store import FeatureStore
+
+PARAMS = {"scale": 1}
+
+
+def logged_features(audio_filepath):
+    """Return the numbers written in a fake audio file, logging the call next to the file."""
+    with open(f"{audio_filepath}.calls", "a") as f:
+        f.write("x")
+    with open(audio_filepath) as f:
+        return [float(value) for value in f.read().split()]
+
+
+def calls(path):
+    if not os.path.exists(f"{path}.calls"):
+        return 0
+    with open(f"{path}.calls") as f:
+        return len(f.read())
+
+
+def write_files(directory, contents):
+    paths = []
+    for i, content in enumerate(contents):
+        path = directory / f"song_{i}.txt"
+        path.write_text(content)
+        paths.append(str(path))
+    return paths
+
+
+def matrix(store, paths, params=PARAMS):
+    return store.matrix(paths, "logged", params, extract_file=logged_features, n_workers=2)
+
+
+def test_changed_content_or_params_gives_a_new_key(tmp_path) -> None:
+    store = FeatureStore(str(tmp_path / "store"))
+    path = write_files(tmp_path, ["1 2"])[0]
+    key = store.file_keys([path], "logged", PARAMS)[0]
+    assert store.file_keys([path], "logged", {"scale": 2})[0] != key
+    assert store.file_keys([path], "other", PARAMS)[0] != key
+    assert FeatureStore(str(tmp_path / "store"), code_version="2").file_keys([path], "logged", PARAMS)[0] != key
+
+    with open(path, "w") as f:
+        f.write("1 3")
+    assert store.file_keys([path], "logged", PARAMS)[0] != key
+
+
+def test_unchanged_files_load_the_matrix_entry_without_extracting(tmp_path) -> None:
+    store = FeatureStore(str(tmp_path / "store"))
+    paths = write_files(tmp_path, ["1 2", "3 4"])
+    first = matrix(store, paths)
+    np.testing.assert_array_equal(first, [[1, 2], [3, 4]])
+
+    second = matrix(FeatureStore(str(tmp_path / "store")), paths)
+    assert isinstance(second, np.memmap)
+    assert second.filename == first.filename
+    np.testing.assert_array_equal(second, first)
+    assert [calls(path) for path in paths] == [1, 1]
+
+
+def test_only_missing_rows_are_extracted(tmp_path) -> None:
+    store = FeatureStore(str(tmp_path / "store"))
+    paths = write_files(tmp_path, ["1 2", "3 4", "5 6"])
+    matrix(store, paths[:2])
+    with open(paths[1], "w") as f:
+        f.write("7 8")
+
+    features = matrix(store, paths)
+    np.testing.assert_array_equal(features, [[1, 2], [7, 8], [5, 6]])
+    assert [calls(path) for path in paths] == [1, 2, 1]
+
+    # the old row of the changed file is still in the store, under its old key
+    with open(paths[1], "w") as f:
+        f.write("3 4")
+    np.testing.assert_array_equal(matrix(store, paths[:2]), [[1, 2], [3, 4]])
+    assert calls(paths[1]) == 2
+
+
+def test_digest_index_is_reused_until_size_or_mtime_change(tmp_path) -> None:
+    root = str(tmp_path / "store")
+    path = write_files(tmp_path, ["1 2"])[0]
+    FeatureStore(root).file_keys([path], "logged", PARAMS)
+
+    # a digest the store could not have computed shows it was taken from the index instead of the file
+    index_path = os.path.join(root, "digests.json")
+    with open(index_path) as f:
+        index = json.load(f)
+    index[os.path.abspath(path)][1] = "remembered"
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+    assert FeatureStore(root).file_digest(path) == "remembered"
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert FeatureStore(root).file_digest(path) != "remembered"